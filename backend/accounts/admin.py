@@ -1,3 +1,17 @@
 from django.contrib import admin
+from .models import OutboundEmail, UserToken
 
-# Register your models here.
+
+@admin.register(OutboundEmail)
+class OutboundEmailAdmin(admin.ModelAdmin):
+    list_display = ("subject", "status", "attempts", "next_attempt_at", "created_at", "sent_at")
+    list_filter = ("status",)
+    search_fields = ("subject", "to")
+
+
+@admin.register(UserToken)
+class UserTokenAdmin(admin.ModelAdmin):
+    list_display = ("user", "purpose", "created_at", "expires_at")
+    list_filter = ("purpose",)
+    search_fields = ("user__email",)
+    readonly_fields = ("key_hash",)
@@ -0,0 +1,9 @@
+"""Async endpoints served when ``ASYNC_VIEWS`` is on; see ``quiz.async_views``"""
+from django.http import JsonResponse
+from django.views.decorators.http import require_GET
+
+
+@require_GET
+async def health_check(request):
+    """Health check endpoint"""
+    return JsonResponse({'status': 'ok', 'message': 'Backend is running'})
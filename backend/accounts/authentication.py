@@ -0,0 +1,92 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import BaseAuthentication, TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from ai_tutor_sg.caching import TTLCache
+from .identity import resolve_parent, user_data_email
+
+_MISSING = object()
+_local_tokens = TTLCache(maxsize=4096, ttl=settings.AUTH_TOKEN_LOCAL_TTL)
+
+
+def _token_cache_key(key):
+    return f'authtoken:{key}'
+
+
+def _user_token_cache_key(user_id):
+    return f'usertoken:{user_id}'
+
+
+def invalidate_token(key, user_id=None):
+    """Evict a token from the local and shared tiers"""
+    _local_tokens.delete(key)
+    cache.delete(_token_cache_key(key))
+    if user_id is not None:
+        cache.delete(_user_token_cache_key(user_id))
+
+
+def token_for_user(user):
+    """The user's auth token key, created on first use and cached afterwards.
+
+    Also primes the token -> user cache so the client's next request
+    authenticates without a query.
+    """
+    key = cache.get(_user_token_cache_key(user.pk))
+    if key is None:
+        key = Token.objects.get_or_create(user=user)[0].key
+        cache.set(_user_token_cache_key(user.pk), key, settings.AUTH_TOKEN_CACHE_TTL)
+        cache.set(_token_cache_key(key), user, settings.AUTH_TOKEN_CACHE_TTL)
+    return key
+
+
+def invalidate_user_tokens(user):
+    for key in Token.objects.filter(user=user).values_list('key', flat=True):
+        invalidate_token(key, user.pk)
+
+
+class UserDataAuthentication(BaseAuthentication):
+    """Authenticates as the parent named by the frontend's X-User-Data header.
+
+    Without a header the demo parent is used, matching the development
+    fallback the views have always had. Lookups go through the identity
+    cache, so a warm request resolves its parent without touching the DB.
+    """
+
+    def authenticate(self, request):
+        parent = resolve_parent(user_data_email(request))
+        if parent is None:
+            return None
+        return (parent, None)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication that skips the Token + User join on cache hits.
+
+    Users are looked up in a short-lived per-process tier first, then in the
+    shared Django cache; only a miss in both reaches the database.
+    ``accounts.signals`` evicts entries when tokens or users change.
+    """
+
+    def authenticate_credentials(self, key):
+        user = None
+        if settings.AUTH_TOKEN_LOCAL_TTL > 0:
+            user = _local_tokens.get(key)
+        if user is None:
+            user = cache.get(_token_cache_key(key))
+            if user is None:
+                try:
+                    token = Token.objects.select_related('user').get(key=key)
+                except Token.DoesNotExist:
+                    raise exceptions.AuthenticationFailed(_('Invalid token.'))
+                user = token.user
+                cache.set(_token_cache_key(key), user, settings.AUTH_TOKEN_CACHE_TTL)
+            if settings.AUTH_TOKEN_LOCAL_TTL > 0:
+                _local_tokens.set(key, user)
+
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+
+        return (user, Token(key=key, user=user))
@@ -0,0 +1,96 @@
+"""Resolution of the parent account named by the frontend's X-User-Data header.
+
+Lookups by email are cached in two tiers, like token authentication: a
+short-lived bounded cache per process, then the shared Django cache.
+``accounts.signals`` drops a user's emails from both when the user is saved
+or deleted; other workers' local tier expires within IDENTITY_CACHE_LOCAL_TTL.
+"""
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+
+from ai_tutor_sg.caching import TTLCache
+from .models import User
+
+DEFAULT_PARENT_EMAIL = 'demo@example.com'
+
+_MISSING = object()
+# Cached for emails without a user, since the shared cache cannot tell a stored None from a miss
+_NO_USER = False
+_parents = TTLCache(maxsize=settings.IDENTITY_CACHE_SIZE, ttl=settings.IDENTITY_CACHE_LOCAL_TTL)
+
+
+def _cache_key(email):
+    # Hashed, as the header's email may hold characters cache keys cannot
+    return 'identity:' + hashlib.sha256(email.encode('utf-8')).hexdigest()
+
+
+def user_data(request):
+    """The decoded X-User-Data header, or an empty dict when missing or malformed"""
+    raw = request.META.get('HTTP_X_USER_DATA')
+    if not raw:
+        return {}
+    try:
+        data = json.loads(raw)
+    except ValueError:
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def user_data_email(request):
+    return user_data(request).get('email', DEFAULT_PARENT_EMAIL)
+
+
+def resolve_parent(email):
+    """The user with ``email`` (or None), served from the caches when possible"""
+    parent = _parents.get(email, _MISSING)
+    if parent is _MISSING:
+        parent = cache.get(_cache_key(email))
+        if parent is None:
+            parent = User.objects.filter(email=email).first() or _NO_USER
+            cache.set(_cache_key(email), parent, settings.IDENTITY_CACHE_TTL)
+        _parents.set(email, parent)
+    return parent or None
+
+
+async def aresolve_parent(email):
+    parent = _parents.get(email, _MISSING)
+    if parent is _MISSING:
+        parent = await cache.aget(_cache_key(email))
+        if parent is None:
+            parent = await User.objects.filter(email=email).afirst() or _NO_USER
+            await cache.aset(_cache_key(email), parent, settings.IDENTITY_CACHE_TTL)
+        _parents.set(email, parent)
+    return parent or None
+
+
+def default_parent():
+    return resolve_parent(DEFAULT_PARENT_EMAIL)
+
+
+def parent_from_user_data(request):
+    """The parent for the X-User-Data email, falling back to the demo parent.
+
+    The result is memoised on the request so validators and the view share it.
+    """
+    if not hasattr(request, '_user_data_parent'):
+        request._user_data_parent = resolve_parent(user_data_email(request)) or default_parent()
+    return request._user_data_parent
+
+
+async def aparent_from_user_data(request):
+    if not hasattr(request, '_user_data_parent'):
+        request._user_data_parent = (
+            await aresolve_parent(user_data_email(request)) or await aresolve_parent(DEFAULT_PARENT_EMAIL)
+        )
+    return request._user_data_parent
+
+
+def forget_parent(*emails):
+    """Drop the cached lookups of ``emails`` in this process and the shared cache"""
+    emails = {email for email in emails if email}
+    for email in emails:
+        _parents.delete(email)
+    cache.delete_many([_cache_key(email) for email in emails])
@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+from accounts.outbox import drain_outbox
+
+
+class Command(BaseCommand):
+    help = 'Send queued emails from the outbox, retrying failures with backoff'
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50)
+        parser.add_argument('--loop', action='store_true', help='Keep polling the outbox instead of exiting when empty')
+        parser.add_argument('--interval', type=float, default=2.0, help='Seconds between polls with --loop')
+
+    def handle(self, *args, **opts):
+        while True:
+            sent, failed = drain_outbox(batch_size=opts['batch_size'])
+            if sent or failed or not opts['loop']:
+                self.stdout.write(self.style.SUCCESS(f'Sent {sent} emails, {failed} failed'))
+            if not opts['loop']:
+                return
+            time.sleep(opts['interval'])
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from accounts.tokens import purge_expired_tokens
+
+
+class Command(BaseCommand):
+    help = 'Delete expired email verification and password reset tokens'
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **opts):
+        purged = purge_expired_tokens(batch_size=opts['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Purged {purged} expired tokens'))
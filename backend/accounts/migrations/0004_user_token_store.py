@@ -0,0 +1,68 @@
+# Generated by Django 5.2.7 on 2026-10-19 14:56
+
+from datetime import timedelta
+import hashlib
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def copy_user_tokens(apps, schema_editor):
+    """Move outstanding tokens off the users table, hashed, with a fresh expiry"""
+    User = apps.get_model('accounts', 'User')
+    UserToken = apps.get_model('accounts', 'UserToken')
+    db_alias = schema_editor.connection.alias
+    now = timezone.now()
+    ttls = {
+        'verify_email': timedelta(hours=getattr(settings, 'EMAIL_VERIFICATION_TOKEN_TTL_HOURS', 48)),
+        'reset_password': timedelta(hours=getattr(settings, 'PASSWORD_RESET_TOKEN_TTL_HOURS', 2)),
+    }
+    tokens = []
+    for user_id, verification, reset in User.objects.using(db_alias).exclude(
+        email_verification_token__isnull=True, password_reset_token__isnull=True
+    ).values_list('id', 'email_verification_token', 'password_reset_token').iterator():
+        for purpose, raw in (('verify_email', verification), ('reset_password', reset)):
+            if raw:
+                tokens.append(UserToken(
+                    user_id=user_id,
+                    purpose=purpose,
+                    key_hash=hashlib.sha256(raw.encode('utf-8')).hexdigest(),
+                    expires_at=now + ttls[purpose],
+                ))
+    UserToken.objects.using(db_alias).bulk_create(tokens, batch_size=500, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_outbound_email'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('purpose', models.CharField(choices=[('verify_email', 'Email verification'), ('reset_password', 'Password reset')], max_length=20)),
+                ('key_hash', models.CharField(max_length=64, unique=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('expires_at', models.DateTimeField(db_index=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tokens', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'User Token',
+                'verbose_name_plural': 'User Tokens',
+            },
+        ),
+        migrations.RunPython(copy_user_tokens, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='user',
+            name='email_verification_token',
+        ),
+        migrations.RemoveField(
+            model_name='user',
+            name='password_reset_token',
+        ),
+    ]
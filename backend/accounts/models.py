@@ -1,14 +1,65 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+from django.utils import timezone
 
 
 class User(AbstractUser):
     is_parent = models.BooleanField(default=False)
     google_id = models.CharField(max_length=100, null=True, blank=True)
-    email_verification_token = models.CharField(max_length=100, null=True, blank=True)
-    password_reset_token = models.CharField(max_length=100, null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
-        return f"{self.username} ({'Parent' if self.is_parent else 'Student'})"
\ No newline at end of file
+        return f"{self.username} ({'Parent' if self.is_parent else 'Student'})"
+
+
+class OutboundEmail(models.Model):
+    """Email written in the request's transaction and sent later by `manage.py drain_outbox`"""
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('sending', 'Sending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    ]
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=254)
+    to = models.JSONField(default=list)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.IntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.subject} -> {', '.join(self.to)} ({self.status})"
+
+    class Meta:
+        verbose_name = "Outbound Email"
+        verbose_name_plural = "Outbound Emails"
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+        ]
+
+
+class UserToken(models.Model):
+    """Single-use email verification or password reset token, stored as a SHA-256 hash"""
+    PURPOSE_CHOICES = [
+        ('verify_email', 'Email verification'),
+        ('reset_password', 'Password reset'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='tokens')
+    purpose = models.CharField(max_length=20, choices=PURPOSE_CHOICES)
+    key_hash = models.CharField(max_length=64, unique=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"{self.get_purpose_display()} token for {self.user}"
+
+    class Meta:
+        verbose_name = "User Token"
+        verbose_name_plural = "User Tokens"
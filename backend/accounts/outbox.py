@@ -0,0 +1,158 @@
+"""Transactional email outbox.
+
+Views call ``enqueue_email`` inside their own transaction, so an email exists
+exactly when the change that triggered it was committed, and the request
+never waits on SMTP. ``drain_outbox`` (run by `manage.py drain_outbox`) sends
+due emails in batches over one reused connection, retrying failures with
+exponential backoff.
+
+A batch is claimed in a short transaction that marks its rows ``sending``
+until a lease of EMAIL_OUTBOX_LEASE seconds expires, then sent with no
+transaction or row lock held, so concurrent drainers skip it and a drainer
+that dies mid-batch only delays it. Delivery is at least once: a batch whose
+send fails is retried message by message, and messages the failed call had
+already handed over may go out twice.
+"""
+from datetime import timedelta
+import logging
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import Count, Min, Q
+from django.utils import timezone
+
+from .models import OutboundEmail
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue_email(subject, body, to, from_email=None):
+    return OutboundEmail.objects.create(
+        subject=subject,
+        body=body,
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+        to=list(to),
+    )
+
+
+def _due(now=None):
+    """Pending emails whose next attempt is due, and claimed ones whose lease has run out"""
+    now = now or timezone.now()
+    return OutboundEmail.objects.filter(Q(status='pending') | Q(status='sending'), next_attempt_at__lte=now)
+
+
+def pending_count():
+    """Number of emails due to be sent now"""
+    return _due().count()
+
+
+def backlog():
+    """``(count, oldest)`` of the emails due now; ``oldest`` is None when there are none"""
+    state = _due().aggregate(count=Count('id'), oldest=Min('next_attempt_at'))
+    return state['count'], state['oldest']
+
+
+def retry_delay(attempts):
+    base = settings.EMAIL_OUTBOX_RETRY_BASE
+    return timedelta(seconds=min(base * 2 ** (attempts - 1), settings.EMAIL_OUTBOX_RETRY_MAX))
+
+
+def claim_batch(batch_size=50):
+    """Mark up to ``batch_size`` due emails ``sending`` for one lease and return them"""
+    now = timezone.now()
+    with transaction.atomic():
+        batch = list(
+            _due(now).select_for_update(skip_locked=True).order_by('next_attempt_at', 'id')[:batch_size]
+        )
+        for email in batch:
+            email.status = 'sending'
+            email.next_attempt_at = now + timedelta(seconds=settings.EMAIL_OUTBOX_LEASE)
+        OutboundEmail.objects.bulk_update(batch, ['status', 'next_attempt_at'])
+    return batch
+
+
+def _message(email, connection):
+    return EmailMessage(email.subject, email.body, email.from_email, email.to, connection=connection)
+
+
+def _send(connection, batch):
+    """Send ``batch``; returns ``{email id: error}`` for the emails that failed"""
+    try:
+        connection.send_messages([_message(email, connection) for email in batch])
+        return {}
+    except Exception as e:
+        if len(batch) == 1:
+            return {batch[0].id: e}
+        logger.warning("[EMAIL] Batch of %s failed (%s); sending one by one", len(batch), e)
+    errors = {}
+    for email in batch:
+        # The connection may be unusable after an SMTP error; the backend
+        # reopens it on the next send
+        connection.close()
+        try:
+            connection.send_messages([_message(email, connection)])
+        except Exception as e:
+            errors[email.id] = e
+    return errors
+
+
+def _record(batch, errors):
+    now = timezone.now()
+    for email in batch:
+        email.attempts += 1
+        error = errors.get(email.id)
+        if error is None:
+            email.status = 'sent'
+            email.sent_at = now
+            email.last_error = ''
+        elif email.attempts >= settings.EMAIL_OUTBOX_MAX_ATTEMPTS:
+            email.status = 'failed'
+            email.last_error = str(error)
+            logger.error("[EMAIL] Giving up on email id=%s to %s after %s attempts: %s",
+                         email.id, email.to, email.attempts, error)
+        else:
+            email.status = 'pending'
+            email.next_attempt_at = now + retry_delay(email.attempts)
+            email.last_error = str(error)
+            logger.warning("[EMAIL] Send failed for email id=%s (attempt %s): %s", email.id, email.attempts, error)
+    OutboundEmail.objects.bulk_update(
+        batch, ['status', 'attempts', 'next_attempt_at', 'last_error', 'sent_at']
+    )
+
+
+def drain_batch(connection, batch_size=50):
+    """Send one batch of due emails; returns ``(sent, failed)``"""
+    batch = claim_batch(batch_size)
+    if not batch:
+        return 0, 0
+    errors = _send(connection, batch)
+    _record(batch, errors)
+    if errors:
+        connection.close()
+    return len(batch) - len(errors), len(errors)
+
+
+def drain_outbox(batch_size=50, max_batches=None):
+    """Send due emails until none are left; returns ``(sent, failed)``"""
+    total_sent = total_failed = 0
+    batches = 0
+    connection = get_connection(fail_silently=False)
+    try:
+        connection.open()
+    except Exception as e:
+        # Each send retries the connection and records the failure
+        logger.warning("[EMAIL] Could not open mail connection: %s", e)
+    try:
+        while max_batches is None or batches < max_batches:
+            sent, failed = drain_batch(connection, batch_size)
+            if not sent and not failed:
+                break
+            total_sent += sent
+            total_failed += failed
+            batches += 1
+    finally:
+        connection.close()
+    if total_sent or total_failed:
+        logger.info("[EMAIL] Outbox drained: sent=%s failed=%s", total_sent, total_failed)
+    return total_sent, total_failed
@@ -0,0 +1,59 @@
+"""Bounded password verification.
+
+Password hashing is deliberately slow. Checks run on the calling thread,
+but at most PASSWORD_HASH_WORKERS at a time per process and with only a
+bounded number waiting for a turn, so a burst of logins cannot tie up every
+request thread (or every core) with hashing; callers beyond that get
+``PasswordCheckBusy`` and can answer 503 straight away.
+"""
+import threading
+
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, make_password
+from django.utils.crypto import get_random_string
+
+
+class PasswordCheckBusy(Exception):
+    pass
+
+
+_running = threading.BoundedSemaphore(settings.PASSWORD_HASH_WORKERS)
+_admitted = threading.BoundedSemaphore(settings.PASSWORD_HASH_WORKERS + settings.PASSWORD_HASH_MAX_PENDING)
+_dummy_hash = None
+
+
+def _dummy_password_hash():
+    global _dummy_hash
+    if _dummy_hash is None:
+        _dummy_hash = make_password(get_random_string(32))
+    return _dummy_hash
+
+
+def verify_password(user, raw_password):
+    """Check ``raw_password`` for ``user`` with exactly one hash computation.
+
+    When ``user`` is None a dummy hash is checked instead, so unknown emails
+    take as long as wrong passwords. Raises ``PasswordCheckBusy`` when the
+    queue is full or no turn comes within ``PASSWORD_HASH_QUEUE_TIMEOUT`` seconds.
+    """
+    encoded = user.password if user is not None else _dummy_password_hash()
+    if not _admitted.acquire(blocking=False):
+        raise PasswordCheckBusy()
+    try:
+        if not _running.acquire(timeout=settings.PASSWORD_HASH_QUEUE_TIMEOUT):
+            raise PasswordCheckBusy()
+        try:
+            needs_upgrade = []
+            valid = check_password(raw_password, encoded, lambda raw: needs_upgrade.append(True))
+        finally:
+            _running.release()
+    finally:
+        _admitted.release()
+
+    if user is None:
+        return False
+    if valid and needs_upgrade:
+        # Re-hash with the current preferred hasher, on the request thread
+        user.set_password(raw_password)
+        user.save(update_fields=['password'])
+    return valid
@@ -0,0 +1,44 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .authentication import invalidate_token, invalidate_user_tokens
+from .identity import forget_parent
+from .models import User
+
+# Saves touching only these fields leave cached identities usable
+NON_IDENTITY_FIELDS = {'last_login'}
+
+
+@receiver(pre_save, sender=User)
+def remember_previous_email(sender, instance, update_fields=None, **kwargs):
+    # An email change must also drop the lookup of the address it is leaving
+    instance._previous_email = None
+    if instance.pk is None or (update_fields and 'email' not in update_fields):
+        return
+    instance._previous_email = sender.objects.filter(pk=instance.pk).values_list('email', flat=True).first()
+
+
+@receiver(post_save, sender=User)
+def invalidate_identity_cache(sender, instance, update_fields=None, **kwargs):
+    if update_fields and set(update_fields) <= NON_IDENTITY_FIELDS:
+        return
+    forget_parent(instance.email, getattr(instance, '_previous_email', None))
+
+
+@receiver(post_delete, sender=User)
+def invalidate_deleted_identity(sender, instance, **kwargs):
+    forget_parent(instance.email)
+
+
+@receiver(post_save, sender=User)
+def invalidate_cached_tokens(sender, instance, created=False, **kwargs):
+    # Covers deactivation and any other change the cached user would miss
+    if not created:
+        invalidate_user_tokens(instance)
+
+
+@receiver(post_save, sender=Token)
+@receiver(post_delete, sender=Token)
+def invalidate_cached_token(sender, instance, **kwargs):
+    invalidate_token(instance.key, instance.user_id)
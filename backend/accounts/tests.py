@@ -1,3 +1,333 @@
+import hashlib
+import json
+import threading
+from unittest import mock
+
+from django.contrib.auth.signals import user_login_failed
+from django.core import mail
+from django.core.cache import cache
+from django.core.mail.backends.locmem import EmailBackend
 from django.test import TestCase
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from ai_tutor_sg.caching import clear_local_caches
+from ai_tutor_sg.testing import QueryBudgetMixin
+from quiz.models import QuizSession, StudentProfile
+from . import passwords
+from .identity import resolve_parent
+from .models import OutboundEmail, User, UserToken
+from .outbox import claim_batch, drain_outbox, enqueue_email
+from .throttling import SlidingWindowLimiter, StudentLoginThrottle
+from .tokens import RESET_PASSWORD, VERIFY_EMAIL, consume_token, issue_token, purge_expired_tokens
+
+PARENT_EMAIL = 'parent@example.com'
+PASSWORD = 'correct horse battery staple'
+
+
+class AccountsQueryBudgetTests(QueryBudgetMixin, TestCase):
+    """Each endpoint's query count, at growing dataset sizes"""
+
+    def setUp(self):
+        self.parent = User.objects.create_user(
+            username=PARENT_EMAIL, email=PARENT_EMAIL, password=PASSWORD, is_parent=True
+        )
+        self.client.defaults['HTTP_X_USER_DATA'] = json.dumps({'email': PARENT_EMAIL})
+
+    def add_children(self, size, parent=None):
+        parent = parent or self.parent
+        for i in range(parent.children.count(), size):
+            StudentProfile.objects.create(parent=parent, name=f'Child {i}', level='P4')
+
+    def add_parents(self, size):
+        """Other parents, each with a child, so lookups have rows to scan past"""
+        for i in range(User.objects.count() - 1, size):
+            parent = User.objects.create_user(
+                username=f'other{i}@example.com', email=f'other{i}@example.com', password=None, is_parent=True,
+            )
+            self.add_children(1, parent)
+
+    def test_health_check(self):
+        self.assertQueryBudget(0, lambda: self.client.get('/api/auth/health/'))
+
+    def test_get_children(self):
+        self.assertQueryBudget(3, lambda: self.client.get('/api/auth/children/'), grow=self.add_children)
+
+    def test_get_children_not_modified(self):
+        self.add_children(1)
+        etag = self.client.get('/api/auth/children/')['ETag']
+
+        def grow(size):
+            # Other parents' children leave this parent's ETag unchanged
+            self.add_parents(size)
+
+        self.assertQueryBudget(
+            2, lambda: self.client.get('/api/auth/children/', HTTP_IF_NONE_MATCH=etag), grow=grow, status=304,
+        )
+
+    def test_create_child(self):
+        self.assertQueryBudget(
+            6,
+            lambda: self.client.post('/api/auth/create-child/', {'name': 'Sam', 'level': 'P4'},
+                                     content_type='application/json'),
+            grow=self.add_children, status=201,
+        )
+
+    def test_delete_child(self):
+        def grow(size):
+            self.sessions = size
+
+        def make_child():
+            child = StudentProfile.objects.create(parent=self.parent, name='Leaving', level='P4')
+            QuizSession.objects.bulk_create([
+                QuizSession(student=child, subject='Math', topic=f'Topic {i}', question_text='1 + 1?',
+                            correct_answer='2', explanation='1 + 1 = 2')
+                for i in range(self.sessions)
+            ])
+            return child.id
+
+        self.assertQueryBudget(
+            8, lambda child_id: self.client.delete(f'/api/auth/delete-child/{child_id}/'),
+            grow=grow, prepare=make_child,
+        )
+
+    def test_student_login(self):
+        self.add_children(1)
+        # Returning parents already have an auth token; only the first login creates it
+        Token.objects.create(user=self.parent)
+        join_code = self.parent.children.get().join_code
+        self.assertQueryBudget(
+            2,
+            lambda: self.client.post('/api/auth/student-login/', {'join_code': join_code},
+                                     content_type='application/json'),
+            grow=self.add_parents,
+        )
+
+    def test_get_student_profile(self):
+        self.add_children(1)
+        child = self.parent.children.get()
+        self.client.force_login(self.parent)
+        self.assertQueryBudget(
+            3, lambda: self.client.get(f'/api/auth/student-profile/?join_code={child.join_code}'),
+            grow=self.add_parents,
+        )
+
+    def test_parent_login(self):
+        Token.objects.create(user=self.parent)
+        self.assertQueryBudget(
+            2,
+            lambda: self.client.post('/api/auth/parent-login/', {'email': PARENT_EMAIL, 'password': PASSWORD},
+                                     content_type='application/json'),
+            grow=self.add_parents,
+        )
+
+    def test_parent_signup(self):
+        emails = iter(f'new{i}@example.com' for i in range(100))
+        self.assertQueryBudget(
+            8,
+            lambda: self.client.post('/api/auth/parent-signup/', {'email': next(emails), 'password': PASSWORD},
+                                     content_type='application/json'),
+            grow=self.add_parents,
+        )
+
+    def test_verify_email(self):
+        self.assertQueryBudget(
+            6,
+            lambda token: self.client.post('/api/auth/verify-email/', {'token': token},
+                                           content_type='application/json'),
+            prepare=lambda: issue_token(self.parent, VERIFY_EMAIL),
+        )
+
+    def test_reset_password(self):
+        self.assertQueryBudget(
+            6,
+            lambda token: self.client.post(
+                '/api/auth/reset-password/', {'token': token, 'new_password': PASSWORD},
+                content_type='application/json',
+            ),
+            prepare=lambda: issue_token(self.parent, RESET_PASSWORD),
+        )
+
+
+class StudentLoginThrottleTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        for limiter, limit in ((StudentLoginThrottle.ip_limiter, 4), (StudentLoginThrottle.prefix_limiter, 2)):
+            patcher = mock.patch.object(limiter, 'limit', limit)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def login(self, join_code, ip='10.0.0.1', **headers):
+        return self.client.post('/api/auth/student-login/', {'join_code': join_code},
+                                content_type='application/json', REMOTE_ADDR=ip, **headers)
+
+    def test_ip_limit(self):
+        for i in range(4):
+            self.assertNotEqual(self.login(f'A{i}0000').status_code, 429)
+        response = self.login('B00000')
+        self.assertEqual(response.status_code, 429)
+        self.assertGreater(int(response['Retry-After']), 0)
+        # X-Forwarded-For is not trusted without NUM_PROXIES
+        self.assertEqual(self.login('C00000', HTTP_X_FORWARDED_FOR='10.9.9.9').status_code, 429)
+        self.assertNotEqual(self.login('C00000', ip='10.0.0.2').status_code, 429)
+
+    def test_prefix_limit_is_per_ip(self):
+        self.login('AA0000')
+        self.login('AA0001')
+        self.assertEqual(self.login('AA0002').status_code, 429)
+        self.assertNotEqual(self.login('AB0000').status_code, 429)
+        self.assertNotEqual(self.login('AA0002', ip='10.0.0.2').status_code, 429)
+
+    def test_window_slides(self):
+        limiter = SlidingWindowLimiter('test', 2, 60)
+        self.assertTrue(limiter.allow('key', now=600))
+        self.assertTrue(limiter.allow('key', now=630))
+        self.assertFalse(limiter.allow('key', now=650))
+        self.assertAlmostEqual(limiter.retry_after('key', now=650), 10)
+        # The previous bucket's hits fade out over the next one
+        self.assertTrue(limiter.allow('key', now=661))
+        self.assertFalse(limiter.allow('key', now=662))
+        self.assertAlmostEqual(limiter.retry_after('key', now=680), 10)
+        self.assertTrue(limiter.allow('key', now=691))
+
+
+class IdentityCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.parent = User.objects.create_user(
+            username=PARENT_EMAIL, email=PARENT_EMAIL, password=PASSWORD, is_parent=True
+        )
+        self.other = User.objects.create_user(
+            username='other@example.com', email='other@example.com', password=PASSWORD, is_parent=True
+        )
+
+    def test_shared_tier(self):
+        self.assertEqual(resolve_parent(PARENT_EMAIL), self.parent)
+        self.assertIsNone(resolve_parent('nobody@example.com'))
+        # Another worker: empty local tier, same shared cache
+        clear_local_caches()
+        with self.assertNumQueries(0):
+            self.assertEqual(resolve_parent(PARENT_EMAIL), self.parent)
+            self.assertIsNone(resolve_parent('nobody@example.com'))
+
+    def test_saves_drop_only_their_user(self):
+        resolve_parent(PARENT_EMAIL)
+        resolve_parent('other@example.com')
+        self.other.last_login = timezone.now()
+        self.other.save(update_fields=['last_login'])
+        self.parent.is_active = False
+        self.parent.save()
+        clear_local_caches()
+        with self.assertNumQueries(1):
+            self.assertFalse(resolve_parent(PARENT_EMAIL).is_active)
+            resolve_parent('other@example.com')
+
+    def test_email_change_drops_old_address(self):
+        resolve_parent(PARENT_EMAIL)
+        self.parent.email = 'renamed@example.com'
+        self.parent.save()
+        self.assertIsNone(resolve_parent(PARENT_EMAIL))
+        self.assertEqual(resolve_parent('renamed@example.com'), self.parent)
+
+
+class OutboxTests(TestCase):
+    def setUp(self):
+        self.emails = [enqueue_email('Hello', 'Body', [f'user{i}@example.com']) for i in range(3)]
+
+    def send_messages(self, side_effect):
+        return mock.patch.object(EmailBackend, 'send_messages', autospec=True, side_effect=side_effect)
+
+    def test_batch_is_sent_in_one_call_outside_the_claim(self):
+        original = EmailBackend.send_messages
+
+        def send(backend, messages):
+            # Claimed rows are invisible to other drainers while sending
+            self.assertEqual(claim_batch(), [])
+            return original(backend, messages)
+
+        with self.send_messages(send) as patched:
+            self.assertEqual(drain_outbox(), (3, 0))
+        self.assertEqual(patched.call_count, 1)
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertEqual(set(OutboundEmail.objects.values_list('status', flat=True)), {'sent'})
+
+    def test_failed_message_is_retried_later(self):
+        original = EmailBackend.send_messages
+
+        def send(backend, messages):
+            if any('user1@example.com' in message.to for message in messages):
+                raise OSError('refused')
+            return original(backend, messages)
+
+        with self.send_messages(send):
+            self.assertEqual(drain_outbox(), (2, 1))
+        self.assertEqual(len(mail.outbox), 2)
+        failed = OutboundEmail.objects.get(id=self.emails[1].id)
+        self.assertEqual((failed.status, failed.attempts, failed.last_error), ('pending', 1, 'refused'))
+        self.assertGreater(failed.next_attempt_at, timezone.now())
+
+    def test_expired_lease_is_claimed_again(self):
+        self.assertEqual(len(claim_batch()), 3)
+        self.assertEqual(claim_batch(), [])
+        OutboundEmail.objects.update(next_attempt_at=timezone.now())
+        self.assertEqual(len(claim_batch()), 3)
+
+
+class ParentLoginTests(TestCase):
+    def setUp(self):
+        User.objects.create_user(username=PARENT_EMAIL, email=PARENT_EMAIL, password=PASSWORD, is_parent=True)
+
+    def login(self, email, password):
+        return self.client.post('/api/auth/parent-login/', {'email': email, 'password': password},
+                                content_type='application/json')
+
+    def test_wrong_password_sends_login_failed(self):
+        receiver = mock.Mock()
+        user_login_failed.connect(receiver)
+        self.addCleanup(user_login_failed.disconnect, receiver)
+
+        self.assertEqual(self.login(PARENT_EMAIL, PASSWORD).status_code, 200)
+        receiver.assert_not_called()
+        self.assertEqual(self.login(PARENT_EMAIL, 'wrong').status_code, 401)
+        self.assertEqual(self.login('nobody@example.com', PASSWORD).status_code, 401)
+        self.assertEqual(
+            [call.kwargs['credentials'] for call in receiver.call_args_list],
+            [{'username': PARENT_EMAIL}, {'username': 'nobody@example.com'}],
+        )
+
+    def test_full_queue_answers_503(self):
+        with mock.patch.object(passwords, '_admitted', threading.BoundedSemaphore(1)) as admitted:
+            admitted.acquire()
+            response = self.login(PARENT_EMAIL, PASSWORD)
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '1')
+
+
+class UserTokenTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username=PARENT_EMAIL, email=PARENT_EMAIL, password=PASSWORD)
+
+    def test_only_the_hash_is_stored(self):
+        raw = issue_token(self.user, VERIFY_EMAIL)
+        stored = UserToken.objects.get()
+        self.assertNotEqual(stored.key_hash, raw)
+        self.assertEqual(stored.key_hash, hashlib.sha256(raw.encode()).hexdigest())
+
+    def test_tokens_are_single_use_and_purpose_bound(self):
+        raw = issue_token(self.user, RESET_PASSWORD)
+        self.assertIsNone(consume_token(raw, VERIFY_EMAIL))
+        self.assertEqual(consume_token(raw, RESET_PASSWORD), self.user)
+        self.assertIsNone(consume_token(raw, RESET_PASSWORD))
+
+    def test_reissuing_replaces_the_earlier_token(self):
+        first = issue_token(self.user, VERIFY_EMAIL)
+        second = issue_token(self.user, VERIFY_EMAIL)
+        self.assertIsNone(consume_token(first, VERIFY_EMAIL))
+        self.assertEqual(consume_token(second, VERIFY_EMAIL), self.user)
 
-# Create your tests here.
+    def test_expired_tokens_are_rejected_and_purged(self):
+        raw = issue_token(self.user, VERIFY_EMAIL)
+        UserToken.objects.update(expires_at=timezone.now())
+        self.assertIsNone(consume_token(raw, VERIFY_EMAIL))
+        self.assertEqual(purge_expired_tokens(), 1)
+        self.assertFalse(UserToken.objects.exists())
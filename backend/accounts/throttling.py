@@ -0,0 +1,97 @@
+"""Sliding-window throttles for unauthenticated endpoints, counted in the shared cache.
+
+Throttles run in DRF's ``initial()`` before the view body, so rejected
+requests never reach the ORM. Counters live in the Django cache, so with a
+shared backend (redis in docker-compose) the limits hold across workers.
+Client IPs come from DRF's ``get_ident``, which only trusts the last
+``NUM_PROXIES`` entries of X-Forwarded-For.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.throttling import BaseThrottle
+
+
+class SlidingWindowLimiter:
+    """Allows at most about ``limit`` hits per ``window`` seconds for each key.
+
+    Hits are counted in fixed buckets of ``window`` seconds with atomic cache
+    increments; the previous bucket counts in proportion to how much of it
+    still overlaps the sliding window, so a burst across a bucket boundary
+    cannot double the limit.
+    """
+
+    def __init__(self, name, limit, window):
+        self.name = name
+        self.limit = limit
+        self.window = window
+
+    def _counts(self, key, now):
+        """``(current key, current count, previous count, elapsed fraction of the current bucket)``"""
+        bucket, elapsed = divmod(now, self.window)
+        current = f'throttle:{self.name}:{key}:{int(bucket)}'
+        previous = f'throttle:{self.name}:{key}:{int(bucket) - 1}'
+        counts = cache.get_many([current, previous])
+        return current, counts.get(current, 0), counts.get(previous, 0), elapsed / self.window
+
+    def _estimate(self, current, previous, elapsed):
+        return previous * (1 - elapsed) + current
+
+    def allow(self, key, now=None):
+        """Record a hit for ``key`` and return True, or return False if over the limit"""
+        now = time.time() if now is None else now
+        current_key, current, previous, elapsed = self._counts(key, now)
+        if self._estimate(current, previous, elapsed) >= self.limit:
+            return False
+        # add() only sets missing keys, so concurrent first hits are not lost
+        if not cache.add(current_key, 1, self.window * 2):
+            try:
+                cache.incr(current_key)
+            except ValueError:
+                # Expired between add() and incr()
+                cache.set(current_key, 1, self.window * 2)
+        return True
+
+    def retry_after(self, key, now=None):
+        """Seconds until ``key`` may be allowed again"""
+        now = time.time() if now is None else now
+        _, current, previous, elapsed = self._counts(key, now)
+        remaining = (1 - elapsed) * self.window
+        if current < self.limit and previous:
+            # The previous bucket's share decays within the current one
+            wait = remaining - self.window * (self.limit - current) / previous
+            if wait < remaining:
+                return max(0.0, wait)
+        if current < self.limit:
+            return remaining
+        # Then the current bucket becomes the previous one and decays
+        return remaining + self.window * (1 - self.limit / current)
+
+
+class StudentLoginThrottle(BaseThrottle):
+    """Limits join code attempts per client IP, and per client IP and join code prefix.
+
+    The prefix limit is keyed by IP too, so one client cannot lock out
+    every student whose code shares a prefix.
+    """
+    ip_limiter = SlidingWindowLimiter('student-login-ip', settings.STUDENT_LOGIN_IP_LIMIT, settings.STUDENT_LOGIN_WINDOW)
+    prefix_limiter = SlidingWindowLimiter(
+        'student-login-prefix', settings.STUDENT_LOGIN_PREFIX_LIMIT, settings.STUDENT_LOGIN_WINDOW,
+    )
+    prefix_length = 2
+
+    def allow_request(self, request, view):
+        self._wait = None
+        ident = self.get_ident(request)
+        if not self.ip_limiter.allow(ident):
+            self._wait = self.ip_limiter.retry_after(ident)
+            return False
+        prefix = str(request.data.get('join_code', '')).upper()[:self.prefix_length]
+        if prefix and not self.prefix_limiter.allow(f'{ident}:{prefix}'):
+            self._wait = self.prefix_limiter.retry_after(f'{ident}:{prefix}')
+            return False
+        return True
+
+    def wait(self):
+        return self._wait
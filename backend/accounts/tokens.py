@@ -0,0 +1,72 @@
+"""Expiring single-use tokens for email verification and password reset.
+
+Only a SHA-256 hash of each token is stored, in a unique (and therefore
+indexed) column, so lookups are an index probe regardless of user count and
+a leaked database does not reveal usable links.
+"""
+from datetime import timedelta
+import hashlib
+import secrets
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import UserToken
+
+VERIFY_EMAIL = 'verify_email'
+RESET_PASSWORD = 'reset_password'
+
+
+def _hash(raw):
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def _ttl(purpose):
+    if purpose == VERIFY_EMAIL:
+        return timedelta(hours=settings.EMAIL_VERIFICATION_TOKEN_TTL_HOURS)
+    return timedelta(hours=settings.PASSWORD_RESET_TOKEN_TTL_HOURS)
+
+
+def issue_token(user, purpose):
+    """Create a token for ``user``, replacing any earlier one with the same purpose"""
+    raw = secrets.token_urlsafe(32)
+    UserToken.objects.filter(user=user, purpose=purpose).delete()
+    UserToken.objects.create(
+        user=user,
+        purpose=purpose,
+        key_hash=_hash(raw),
+        expires_at=timezone.now() + _ttl(purpose),
+    )
+    return raw
+
+
+def consume_token(raw, purpose):
+    """Return the user for a valid, unexpired token and delete it, or None"""
+    token = (
+        UserToken.objects.select_related('user')
+        .filter(key_hash=_hash(raw), purpose=purpose, expires_at__gt=timezone.now())
+        .first()
+    )
+    if token is None:
+        return None
+    # Deleting by pk makes concurrent uses of the same token race safely
+    deleted, _ = UserToken.objects.filter(pk=token.pk).delete()
+    return token.user if deleted else None
+
+
+def revoke_tokens(user, purpose):
+    UserToken.objects.filter(user=user, purpose=purpose).delete()
+
+
+def purge_expired_tokens(batch_size=1000):
+    """Delete expired tokens in batches; returns the number deleted"""
+    purged = 0
+    now = timezone.now()
+    while True:
+        ids = list(
+            UserToken.objects.filter(expires_at__lte=now).order_by('expires_at')
+            .values_list('id', flat=True)[:batch_size]
+        )
+        if not ids:
+            return purged
+        purged += UserToken.objects.filter(id__in=ids).delete()[0]
@@ -1,5 +1,6 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import async_views, views
 
 urlpatterns = [
     path('health/', views.health_check, name='health_check'),
@@ -15,3 +16,8 @@ urlpatterns = [
     path('reset-password/', views.reset_password, name='reset_password'),
     path('delete-child/<int:child_id>/', views.delete_child, name='delete_child'),
 ]
+
+if settings.ASYNC_VIEWS:
+    urlpatterns = [
+        path('health/', async_views.health_check, name='health_check'),
+    ] + urlpatterns
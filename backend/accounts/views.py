@@ -1,18 +1,28 @@
 from rest_framework import status, permissions
 import logging
-from rest_framework.decorators import api_view, permission_classes, authentication_classes
+from rest_framework.decorators import api_view, permission_classes, authentication_classes, throttle_classes
 from rest_framework.response import Response
 from rest_framework.authtoken.models import Token
 from django.contrib.auth import get_user_model
-from django.contrib.auth import authenticate
+from django.contrib.auth.signals import user_login_failed
 from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Q
 from django.utils import timezone
 from .models import User as CustomUser
 from .serializers import UserSerializer, StudentLoginSerializer
+from .authentication import UserDataAuthentication, token_for_user
+from .outbox import enqueue_email
+from .passwords import PasswordCheckBusy, verify_password
+from .throttling import StudentLoginThrottle
+from .tokens import RESET_PASSWORD, VERIFY_EMAIL, consume_token, issue_token, revoke_tokens
+from .identity import DEFAULT_PARENT_EMAIL, default_parent, user_data
 
 logger = logging.getLogger(__name__)
 from quiz.models import StudentProfile
 from quiz.serializers import StudentProfileSerializer
+from quiz.conditional import conditional, children_etag
+from ai_tutor_sg.routers import read_replica
 import json
 
 
@@ -53,66 +63,34 @@ def get_user_profile(request):
 
 
 @api_view(['POST'])
-@authentication_classes([])  # Disable authentication
+@authentication_classes([UserDataAuthentication])
 @permission_classes([permissions.AllowAny])
 def create_child(request):
     """Create a new child profile for parent"""
-    from quiz.serializers import CreateStudentSerializer
-    from accounts.models import User
-    from quiz.models import StudentProfile
-    
     try:
-        # Get user data from frontend
-        user_data = request.META.get('HTTP_X_USER_DATA')
-        parent_user = None
-        
-        if user_data:
-            import json
-            try:
-                user_info = json.loads(user_data)
-                # Try to find or create parent user
-                parent_user, created = User.objects.get_or_create(
-                    email=user_info.get('email', 'demo@example.com'),
-                    defaults={
-                        'first_name': user_info.get('first_name', 'Demo'),
-                        'last_name': user_info.get('last_name', 'User'),
-                        'is_parent': True
-                    }
-                )
-                print(f"Parent user: {parent_user.email}, created: {created}")
-            except Exception as e:
-                print(f"Error parsing user data: {e}")
-        
-        # If no parent user found, create a default one
-        if not parent_user:
-            parent_user, created = User.objects.get_or_create(
-                email='demo@example.com',
+        parent_user = request.user
+        if not parent_user.is_authenticated:
+            # First visit for this email: create the parent account
+            user_info = user_data(request)
+            parent_user, created = CustomUser.objects.get_or_create(
+                email=user_info.get('email', DEFAULT_PARENT_EMAIL),
                 defaults={
-                    'first_name': 'Demo',
-                    'last_name': 'User',
+                    'first_name': user_info.get('first_name', 'Demo'),
+                    'last_name': user_info.get('last_name', 'User'),
                     'is_parent': True
                 }
             )
-            print(f"Created default parent user: {parent_user.email}")
-        
-        # Create the actual child profile in database
-        import random
-        import string
-        
-        # Generate a unique join code
-        while True:
-            join_code = ''.join(random.choices(string.ascii_uppercase + string.digits, k=6))
-            if not StudentProfile.objects.filter(join_code=join_code).exists():
-                break
+            logger.info("[CHILDREN] Parent user id=%s created=%s", parent_user.id, created)
         
+        # Create the actual child profile in database; the join code is
+        # allocated by StudentProfile.save()
         child_profile = StudentProfile.objects.create(
             parent=parent_user,
             name=request.data.get('name'),
-            level=request.data.get('level'),
-            join_code=join_code
+            level=request.data.get('level')
         )
         
-        print(f"Created child profile: {child_profile.name} with join code: {child_profile.join_code}")
+        logger.info("[CHILDREN] Created child id=%s for parent id=%s", child_profile.id, parent_user.id)
         
         # Return the created child data
         child_data = {
@@ -128,42 +106,22 @@ def create_child(request):
         return Response(child_data, status=status.HTTP_201_CREATED)
         
     except Exception as e:
-        print(f"Error creating child: {e}")
+        logger.exception("[CHILDREN] Error creating child: %s", e)
         return Response(
             {'error': str(e)}, 
             status=status.HTTP_400_BAD_REQUEST
         )
 
 
+@read_replica
+@conditional(etag_func=children_etag)
 @api_view(['GET'])
-@authentication_classes([])  # Disable authentication
+@authentication_classes([UserDataAuthentication])
 @permission_classes([permissions.AllowAny])
 def get_children(request):
     """Get all children for current parent"""
-    from accounts.models import User
-    from quiz.models import StudentProfile
-    
     try:
-        # Get user data from frontend
-        user_data = request.META.get('HTTP_X_USER_DATA')
-        parent_user = None
-        
-        if user_data:
-            import json
-            try:
-                user_info = json.loads(user_data)
-                # Try to find parent user
-                parent_user = User.objects.filter(
-                    email=user_info.get('email', 'demo@example.com')
-                ).first()
-                print(f"Found parent user: {parent_user.email if parent_user else 'None'}")
-            except Exception as e:
-                print(f"Error parsing user data: {e}")
-        
-        # If no parent user found, try default
-        if not parent_user:
-            parent_user = User.objects.filter(email='demo@example.com').first()
-            print(f"Using default parent user: {parent_user.email if parent_user else 'None'}")
+        parent_user = request.user if request.user.is_authenticated else default_parent()
         
         # Get children for this parent
         if parent_user:
@@ -180,14 +138,14 @@ def get_children(request):
                     'created_at': child.created_at.isoformat()
                 })
             
-            print(f"Found {len(children_data)} children for parent {parent_user.email}")
+            logger.info("[CHILDREN] Found %s children for parent id=%s", len(children_data), parent_user.id)
             return Response(children_data)
         else:
-            print("No parent user found, returning empty list")
+            logger.info("[CHILDREN] No parent user found, returning empty list")
             return Response([])
             
     except Exception as e:
-        print(f"Error in get_children: {e}")
+        logger.exception("[CHILDREN] Error in get_children: %s", e)
         return Response(
             {'error': str(e)}, 
             status=status.HTTP_400_BAD_REQUEST
@@ -197,27 +155,30 @@ def get_children(request):
 @api_view(['POST'])
 @authentication_classes([])  # Disable authentication
 @permission_classes([permissions.AllowAny])
+@throttle_classes([StudentLoginThrottle])
 def student_login(request):
     """Student login with join code"""
-    from quiz.models import StudentProfile
-    
     try:
-        join_code = request.data.get('join_code', '').upper()
-        print(f"Student login attempt with join code: {join_code}")
+        join_code = str(request.data.get('join_code', '')).upper()
+        # Join codes are credentials, so only their prefix is logged
+        logger.info("[STUDENT_LOGIN] Login attempt with join code prefix=%s", join_code[:2])
         
         if not join_code:
             return Response(
                 {'error': 'Join code is required'}, 
                 status=status.HTTP_400_BAD_REQUEST
             )
+        if len(join_code) != 6 or not join_code.isalnum():
+            # Cannot match any code, so don't spend a query on it
+            raise StudentProfile.DoesNotExist
         
-        # Find student by join code
-        student = StudentProfile.objects.get(join_code=join_code)
-        print(f"Found student: {student.name} for parent: {student.parent.email}")
+        # Find student and parent by join code in one query
+        student = StudentProfile.objects.select_related('parent').get(join_code=join_code)
+        parent = student.parent
+        logger.info("[STUDENT_LOGIN] Found student id=%s for parent id=%s", student.id, parent.id)
         
         # Create or get token for the student's parent account
-        from rest_framework.authtoken.models import Token as AuthToken
-        token, created = AuthToken.objects.get_or_create(user=student.parent)
+        token_key = token_for_user(parent)
         
         # Return student and parent data
         student_data = {
@@ -230,27 +191,27 @@ def student_login(request):
         }
         
         parent_data = {
-            'id': student.parent.id,
-            'email': student.parent.email,
-            'first_name': student.parent.first_name,
-            'last_name': student.parent.last_name,
-            'is_parent': student.parent.is_parent
+            'id': parent.id,
+            'email': parent.email,
+            'first_name': parent.first_name,
+            'last_name': parent.last_name,
+            'is_parent': parent.is_parent
         }
         
         return Response({
-            'token': token.key,
+            'token': token_key,
             'student': student_data,
             'parent': parent_data
         })
         
     except StudentProfile.DoesNotExist:
-        print(f"Student not found with join code: {join_code}")
+        logger.info("[STUDENT_LOGIN] No student with join code prefix=%s", join_code[:2])
         return Response(
             {'error': 'Invalid join code'}, 
             status=status.HTTP_400_BAD_REQUEST
         )
     except Exception as e:
-        print(f"Error in student login: {e}")
+        logger.exception("[STUDENT_LOGIN] Error in student login: %s", e)
         return Response(
             {'error': 'Login failed'}, 
             status=status.HTTP_400_BAD_REQUEST
@@ -273,30 +234,35 @@ def parent_login(request):
     
     try:
         logger.info("[LOGIN] Parent login attempt for email=%s", email)
-        # Authenticate user
-        user = authenticate(username=email, password=password)
-        logger.info("[LOGIN] authenticate(username=email) -> %s", 'success' if user else 'None')
+        # One lookup by username or email, then a single password check
+        candidates = list(CustomUser.objects.filter(Q(username=email) | Q(email=email))[:2])
+        user_obj = next((u for u in candidates if u.username == email), None) or next(iter(candidates), None)
+        if user_obj is None:
+            logger.warning("[LOGIN] No user exists with email=%s", email)
         
-        if user is None:
-            # Try to find user by email
-            try:
-                user_obj = CustomUser.objects.get(email=email)
-                logger.info("[LOGIN] Found user by email. username=%s is_active=%s is_parent=%s", user_obj.username, user_obj.is_active, user_obj.is_parent)
-                user = authenticate(username=user_obj.username, password=password)
-                logger.info("[LOGIN] authenticate(username=user.username) -> %s", 'success' if user else 'None')
-            except CustomUser.DoesNotExist:
-                logger.warning("[LOGIN] No user exists with email=%s", email)
-                pass
+        try:
+            password_ok = verify_password(user_obj, password)
+        except PasswordCheckBusy:
+            logger.warning("[LOGIN] Password check pool saturated, rejecting login for email=%s", email)
+            return Response(
+                {'error': 'Too many login attempts right now. Please try again shortly.'},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                headers={'Retry-After': '1'}
+            )
+        if not password_ok:
+            # As authenticate() does, so lockout and auditing receivers see it
+            user_login_failed.send(sender=__name__, credentials={'username': email}, request=request)
+        user = user_obj if password_ok else None
         
         if user:
             logger.info("[LOGIN] Authenticated user id=%s is_active=%s is_parent=%s", user.id, user.is_active, user.is_parent)
         
         if user and user.is_parent and user.is_active:
             # Create or get token
-            token, created = Token.objects.get_or_create(user=user)
+            token_key = token_for_user(user)
             
             return Response({
-                'token': token.key,
+                'token': token_key,
                 'user': {
                     'id': user.id,
                     'email': user.email,
@@ -319,7 +285,7 @@ def parent_login(request):
             )
             
     except Exception as e:
-        print(f"Error in parent login: {e}")
+        logger.exception("[LOGIN] Error in parent login: %s", e)
         return Response(
             {'error': 'Login failed'},
             status=status.HTTP_400_BAD_REQUEST
@@ -348,34 +314,12 @@ def get_student_profile(request):
 
 
 @api_view(['DELETE'])
-@authentication_classes([])  # Disable authentication
+@authentication_classes([UserDataAuthentication])
 @permission_classes([permissions.AllowAny])
 def delete_child(request, child_id):
     """Delete a child profile"""
-    from accounts.models import User
-    from quiz.models import StudentProfile
-    
     try:
-        # Get user data from frontend
-        user_data = request.META.get('HTTP_X_USER_DATA')
-        parent_user = None
-        
-        if user_data:
-            import json
-            try:
-                user_info = json.loads(user_data)
-                # Try to find parent user
-                parent_user = User.objects.filter(
-                    email=user_info.get('email', 'demo@example.com')
-                ).first()
-                print(f"Found parent user for deletion: {parent_user.email if parent_user else 'None'}")
-            except Exception as e:
-                print(f"Error parsing user data in delete: {e}")
-        
-        # If no parent user found, try default
-        if not parent_user:
-            parent_user = User.objects.filter(email='demo@example.com').first()
-            print(f"Using default parent user for deletion: {parent_user.email if parent_user else 'None'}")
+        parent_user = request.user if request.user.is_authenticated else default_parent()
         
         # Find the child and verify it belongs to the parent
         if parent_user:
@@ -383,26 +327,26 @@ def delete_child(request, child_id):
                 child = StudentProfile.objects.get(id=child_id, parent=parent_user)
                 child_name = child.name
                 child.delete()
-                print(f"Deleted child: {child_name} (ID: {child_id})")
+                logger.info("[CHILDREN] Deleted child id=%s", child_id)
                 return Response({
                     'message': f'Child "{child_name}" has been deleted successfully',
                     'deleted_child_id': child_id
                 })
             except StudentProfile.DoesNotExist:
-                print(f"Child {child_id} not found for parent {parent_user.email}")
+                logger.info("[CHILDREN] Child id=%s not found for parent id=%s", child_id, parent_user.id)
                 return Response(
                     {'error': 'Child not found or does not belong to you'}, 
                     status=status.HTTP_404_NOT_FOUND
                 )
         else:
-            print("No parent user found for deletion")
+            logger.info("[CHILDREN] No parent user found for deletion")
             return Response(
                 {'error': 'Parent not found'}, 
                 status=status.HTTP_404_NOT_FOUND
             )
             
     except Exception as e:
-        print(f"Error deleting child: {e}")
+        logger.exception("[CHILDREN] Error deleting child: %s", e)
         return Response(
             {'error': str(e)}, 
             status=status.HTTP_400_BAD_REQUEST
@@ -414,11 +358,6 @@ def delete_child(request, child_id):
 @permission_classes([permissions.AllowAny])
 def parent_signup(request):
     """Parent registration with email verification"""
-    from django.contrib.auth import get_user_model
-    from django.core.mail import send_mail
-    from django.conf import settings
-    import uuid
-    
     email = request.data.get('email')
     password = request.data.get('password')
     first_name = request.data.get('first_name', '')
@@ -438,31 +377,27 @@ def parent_signup(request):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Create user account (inactive until email verification)
-        # Ensure username is set since the default User model requires it
-        user = CustomUser.objects.create_user(
-            username=email,
-            email=email,
-            password=password,
-            first_name=first_name,
-            last_name=last_name,
-            is_parent=True,
-            is_active=False  # Inactive until email verification
-        )
-        
-        # Generate email verification token
-        verification_token = str(uuid.uuid4())
-        user.email_verification_token = verification_token
-        user.save()
-        
-        # Send verification email
-        verification_url = f"http://localhost:3000/verify-email?token={verification_token}"
-        
-        logger.info("[EMAIL] Sending verification email to %s via %s as %s", email, settings.EMAIL_BACKEND, settings.DEFAULT_FROM_EMAIL)
-        logger.debug("[EMAIL] SMTP host=%s port=%s use_tls=%s user=%s", getattr(settings, 'EMAIL_HOST', ''), getattr(settings, 'EMAIL_PORT', ''), getattr(settings, 'EMAIL_USE_TLS', ''), getattr(settings, 'EMAIL_HOST_USER', ''))
-        send_mail(
-            'Verify Your Email - AI Tutor SG',
-            f'''
+        with transaction.atomic():
+            # Create user account (inactive until email verification)
+            # Ensure username is set since the default User model requires it
+            user = CustomUser.objects.create_user(
+                username=email,
+                email=email,
+                password=password,
+                first_name=first_name,
+                last_name=last_name,
+                is_parent=True,
+                is_active=False  # Inactive until email verification
+            )
+            
+            # Generate email verification token
+            verification_token = issue_token(user, VERIFY_EMAIL)
+            
+            # Queue verification email; it is sent by the outbox worker
+            verification_url = f"http://localhost:3000/verify-email?token={verification_token}"
+            enqueue_email(
+                'Verify Your Email - AI Tutor SG',
+                f'''
             Welcome to AI Tutor SG!
             
             Please verify your email address by clicking the link below:
@@ -473,10 +408,8 @@ def parent_signup(request):
             Best regards,
             AI Tutor SG Team
             ''',
-            settings.DEFAULT_FROM_EMAIL,
-            [email],
-            fail_silently=False,
-        )
+                [email],
+            )
         
         logger.info("[EMAIL] Verification email queued successfully for %s", email)
         return Response({
@@ -486,7 +419,7 @@ def parent_signup(request):
         })
         
     except Exception as e:
-        print(f"Error in parent signup: {e}")
+        logger.exception("[SIGNUP] Error in parent signup: %s", e)
         return Response(
             {'error': 'Registration failed. Please try again.'},
             status=status.HTTP_400_BAD_REQUEST
@@ -507,10 +440,12 @@ def verify_email(request):
         )
     
     try:
-        user = CustomUser.objects.get(email_verification_token=token)
-        user.is_active = True
-        user.email_verification_token = None
-        user.save()
+        with transaction.atomic():
+            user = consume_token(token, VERIFY_EMAIL)
+            if user is None:
+                raise CustomUser.DoesNotExist
+            user.is_active = True
+            user.save(update_fields=['is_active'])
         
         return Response({
             'message': 'Email verified successfully! You can now login.',
@@ -523,7 +458,7 @@ def verify_email(request):
             status=status.HTTP_400_BAD_REQUEST
         )
     except Exception as e:
-        print(f"Error in email verification: {e}")
+        logger.exception("[EMAIL] Error in email verification: %s", e)
         return Response(
             {'error': 'Email verification failed'},
             status=status.HTTP_400_BAD_REQUEST
@@ -535,10 +470,6 @@ def verify_email(request):
 @permission_classes([permissions.AllowAny])
 def request_password_reset(request):
     """Request password reset email"""
-    from django.core.mail import send_mail
-    from django.conf import settings
-    import uuid
-    
     email = request.data.get('email')
     
     if not email:
@@ -550,19 +481,15 @@ def request_password_reset(request):
     try:
         user = CustomUser.objects.get(email=email)
         
-        # Generate password reset token
-        reset_token = str(uuid.uuid4())
-        user.password_reset_token = reset_token
-        user.save()
-        
-        # Send password reset email
-        reset_url = f"http://localhost:3000/reset-password?token={reset_token}"
-        
-        logger.info("[EMAIL] Sending password reset email to %s via %s as %s", email, settings.EMAIL_BACKEND, settings.DEFAULT_FROM_EMAIL)
-        logger.debug("[EMAIL] SMTP host=%s port=%s use_tls=%s user=%s", getattr(settings, 'EMAIL_HOST', ''), getattr(settings, 'EMAIL_PORT', ''), getattr(settings, 'EMAIL_USE_TLS', ''), getattr(settings, 'EMAIL_HOST_USER', ''))
-        send_mail(
-            'Reset Your Password - AI Tutor SG',
-            f'''
+        with transaction.atomic():
+            # Generate password reset token
+            reset_token = issue_token(user, RESET_PASSWORD)
+            
+            # Queue password reset email; it is sent by the outbox worker
+            reset_url = f"http://localhost:3000/reset-password?token={reset_token}"
+            enqueue_email(
+                'Reset Your Password - AI Tutor SG',
+                f'''
             You requested a password reset for your AI Tutor SG account.
             
             Click the link below to reset your password:
@@ -573,10 +500,8 @@ def request_password_reset(request):
             Best regards,
             AI Tutor SG Team
             ''',
-            settings.DEFAULT_FROM_EMAIL,
-            [email],
-            fail_silently=False,
-        )
+                [email],
+            )
         
         logger.info("[EMAIL] Password reset email queued successfully for %s", email)
         return Response({
@@ -591,7 +516,7 @@ def request_password_reset(request):
             'email': email
         })
     except Exception as e:
-        print(f"Error in password reset request: {e}")
+        logger.exception("[PASSWORD_RESET] Error in password reset request: %s", e)
         return Response(
             {'error': 'Password reset request failed'},
             status=status.HTTP_400_BAD_REQUEST
@@ -613,16 +538,18 @@ def reset_password(request):
         )
     
     try:
-        user = CustomUser.objects.get(password_reset_token=token)
-        user.set_password(new_password)
-        user.password_reset_token = None
-        # If account was not verified yet, verify it now to allow immediate login
-        was_inactive = not user.is_active
-        if was_inactive:
-            user.is_active = True
-            user.email_verification_token = None
-            logger.info("[PASSWORD_RESET] Auto-verified account during reset for email=%s", user.email)
-        user.save()
+        with transaction.atomic():
+            user = consume_token(token, RESET_PASSWORD)
+            if user is None:
+                raise CustomUser.DoesNotExist
+            user.set_password(new_password)
+            # If account was not verified yet, verify it now to allow immediate login
+            was_inactive = not user.is_active
+            if was_inactive:
+                user.is_active = True
+                revoke_tokens(user, VERIFY_EMAIL)
+                logger.info("[PASSWORD_RESET] Auto-verified account during reset for email=%s", user.email)
+            user.save(update_fields=['password', 'is_active'])
         
         return Response({
             'message': 'Password reset successfully!' + (" Your account has also been verified." if was_inactive else "")
@@ -634,7 +561,7 @@ def reset_password(request):
             status=status.HTTP_400_BAD_REQUEST
         )
     except Exception as e:
-        print(f"Error in password reset: {e}")
+        logger.exception("[PASSWORD_RESET] Error in password reset: %s", e)
         return Response(
             {'error': 'Password reset failed'},
             status=status.HTTP_400_BAD_REQUEST
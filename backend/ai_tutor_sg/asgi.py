@@ -10,7 +10,12 @@ https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 import os
 
 from django.core.asgi import get_asgi_application
+from django.urls import get_resolver
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ai_tutor_sg.settings')
 
 application = get_asgi_application()
+
+# Import the URLconf and every view now instead of on each worker's first
+# request; with gunicorn --preload, workers inherit them already loaded
+get_resolver().url_patterns
@@ -0,0 +1,65 @@
+"""Small in-process caches shared by the apps"""
+from collections import OrderedDict
+import threading
+import time
+import weakref
+
+_MISSING = object()
+_instances = weakref.WeakSet()
+
+
+class TTLCache:
+    """A thread-safe LRU cache whose entries expire ``ttl`` seconds after being set.
+
+    Each gunicorn worker holds its own instance, so anything cached here must
+    either tolerate ``ttl`` seconds of staleness in other workers or be
+    invalidated through a shared tier as well.
+    """
+
+    def __init__(self, maxsize=1024, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        _instances.add(self)
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                return default
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
+
+
+def clear_local_caches():
+    """Empty every TTLCache in this process (used by tests)"""
+    for instance in list(_instances):
+        instance.clear()
@@ -0,0 +1,75 @@
+"""Brotli/gzip compression of JSON responses above ``COMPRESSION_MIN_SIZE`` bytes.
+
+Brotli is used when the client accepts it and the ``brotli`` package is
+installed, gzip otherwise. Small bodies are sent as-is, since compressing
+them costs more CPU than it saves on the wire.
+"""
+import gzip
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+from django.utils.regex_helper import _lazy_re_compile
+
+try:
+    import brotli
+except ImportError:  # optional
+    brotli = None
+
+COMPRESSIBLE_TYPES = ('application/json',)
+_encoding_re = _lazy_re_compile(r'^\s*([\w*-]+)\s*(?:;\s*q\s*=\s*([0-9.]+))?\s*$')
+
+
+def accepted_encodings(header):
+    """Encodings named in an Accept-Encoding header with a non-zero q-value"""
+    accepted = set()
+    for part in header.split(','):
+        match = _encoding_re.match(part)
+        if not match:
+            continue
+        try:
+            quality = float(match[2]) if match[2] else 1.0
+        except ValueError:
+            continue
+        if quality > 0:
+            accepted.add(match[1].lower())
+    return accepted
+
+
+def compress(content, encoding):
+    if encoding == 'br':
+        return brotli.compress(content, quality=settings.COMPRESSION_BROTLI_QUALITY)
+    return gzip.compress(content, compresslevel=settings.COMPRESSION_GZIP_LEVEL, mtime=0)
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    def process_response(self, request, response):
+        if response.streaming or response.has_header('Content-Encoding'):
+            return response
+        content_type = response.get('Content-Type', '').split(';')[0].strip().lower()
+        if content_type not in COMPRESSIBLE_TYPES:
+            return response
+        # Cache keys must vary even when this particular body stays uncompressed
+        patch_vary_headers(response, ('Accept-Encoding',))
+        if len(response.content) < settings.COMPRESSION_MIN_SIZE:
+            return response
+
+        accepted = accepted_encodings(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if brotli is not None and 'br' in accepted:
+            encoding = 'br'
+        elif 'gzip' in accepted:
+            encoding = 'gzip'
+        else:
+            return response
+
+        compressed = compress(response.content, encoding)
+        if len(compressed) >= len(response.content):
+            return response
+        response.content = compressed
+        response['Content-Length'] = str(len(compressed))
+        response['Content-Encoding'] = encoding
+        # The body differs per encoding, so a strong validator must become weak
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        return response
@@ -0,0 +1,154 @@
+"""Liveness and readiness probes for the load balancer and orchestrator.
+
+``/health/live`` only shows the process is answering requests. ``/health/ready``
+times a database round trip and a cache round trip, and reads the email
+outbox backlog. It answers 503 when a check fails or goes past its
+``HEALTH_*`` threshold, so traffic stops reaching a worker whose database
+pool is exhausted. Each process reuses its last result for
+``HEALTH_CACHE_SECONDS``, and only one probe at a time refreshes it, so
+probing cannot become a load source itself. Probes arriving during a refresh
+answer with the previous result rather than queueing behind a hung check;
+the checks themselves are bounded by connect, socket and statement timeouts.
+"""
+from contextlib import contextmanager
+import logging
+import os
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.http import JsonResponse
+from django.utils import timezone
+from django.views.decorators.cache import never_cache
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+# (ready, results) of the last evaluation and when it finished
+_state = None
+
+
+def _timed(check):
+    """Run ``check()``; returns its details with ``ok`` and ``latency_ms``"""
+    start = time.perf_counter()
+    try:
+        details = check()
+    except Exception as e:
+        # The probe is unauthenticated, so the message itself only goes to the log
+        logger.warning("[HEALTH] %s check failed: %s", check.__name__, e)
+        details = {'ok': False, 'error': type(e).__name__}
+    details['latency_ms'] = round((time.perf_counter() - start) * 1000, 2)
+    return details
+
+
+@contextmanager
+def statement_timeout():
+    """Cancel queries in the block after ``HEALTH_STATEMENT_TIMEOUT_MS`` (Postgres only)"""
+    connection = connections[DEFAULT_DB_ALIAS]
+    if connection.vendor != 'postgresql' or not settings.HEALTH_STATEMENT_TIMEOUT_MS:
+        yield
+        return
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL statement_timeout = %s', [settings.HEALTH_STATEMENT_TIMEOUT_MS])
+        yield
+
+
+def check_database():
+    with statement_timeout(), connections[DEFAULT_DB_ALIAS].cursor() as cursor:
+        cursor.execute('SELECT 1')
+        cursor.fetchone()
+    return {'ok': True}
+
+
+def check_cache():
+    key = f'health:{os.getpid()}'
+    token = uuid.uuid4().hex
+    cache.set(key, token, 30)
+    if cache.get(key) != token:
+        return {'ok': False, 'error': 'cache did not return the value just written'}
+    return {'ok': True}
+
+
+def check_outbox():
+    from accounts.outbox import backlog
+
+    with statement_timeout():
+        count, oldest = backlog()
+    age = (timezone.now() - oldest).total_seconds() if oldest else 0.0
+    details = {'ok': True, 'pending': count, 'oldest_seconds': round(age, 1)}
+    if settings.HEALTH_OUTBOX_MAX_PENDING and count > settings.HEALTH_OUTBOX_MAX_PENDING:
+        details.update(ok=False, error=f'{count} emails pending (limit {settings.HEALTH_OUTBOX_MAX_PENDING})')
+    elif settings.HEALTH_OUTBOX_MAX_AGE and age > settings.HEALTH_OUTBOX_MAX_AGE:
+        details.update(ok=False, error=f'oldest email waiting {age:.0f}s (limit {settings.HEALTH_OUTBOX_MAX_AGE}s)')
+    return details
+
+
+# name: (check, latency threshold setting in milliseconds)
+CHECKS = {
+    'database': (check_database, 'HEALTH_DATABASE_MAX_MS'),
+    'cache': (check_cache, 'HEALTH_CACHE_MAX_MS'),
+    'outbox': (check_outbox, 'HEALTH_OUTBOX_MAX_MS'),
+}
+
+
+def readiness():
+    """Run every check; returns ``(ready, results)``"""
+    results = {}
+    for name, (check, threshold_setting) in CHECKS.items():
+        details = _timed(check)
+        threshold = getattr(settings, threshold_setting)
+        if details['ok'] and threshold and details['latency_ms'] > threshold:
+            details.update(ok=False, error=f'slower than {threshold}ms')
+        results[name] = details
+    ready = all(details['ok'] for details in results.values())
+    if not ready:
+        logger.warning("[HEALTH] Not ready: %s", {name: d['error'] for name, d in results.items() if not d['ok']})
+    return ready, results
+
+
+def _fresh(state):
+    return state is not None and time.monotonic() - state[1] < settings.HEALTH_CACHE_SECONDS
+
+
+def cached_readiness():
+    """``readiness()``, reused for ``HEALTH_CACHE_SECONDS``; also returns the result's age"""
+    global _state
+    state = _state
+    if not _fresh(state):
+        # One probe refreshes; the others answer with the previous result meanwhile,
+        # and only wait (boundedly) when there is none yet
+        if state is None:
+            acquired = _lock.acquire(timeout=settings.HEALTH_WAIT_SECONDS)
+        else:
+            acquired = _lock.acquire(blocking=False)
+        if acquired:
+            try:
+                state = _state
+                if not _fresh(state):
+                    state = _state = (readiness(), time.monotonic())
+            finally:
+                _lock.release()
+        elif state is None:
+            return (False, {}), 0.0
+    result, checked_at = state
+    return result, time.monotonic() - checked_at
+
+
+@never_cache
+def liveness_view(request):
+    """The process is up and serving requests; no dependency is touched"""
+    return JsonResponse({'status': 'ok'})
+
+
+@never_cache
+def readiness_view(request):
+    """200 when every dependency check passes, 503 otherwise"""
+    (ready, results), age = cached_readiness()
+    return JsonResponse(
+        {'status': 'ok' if ready else 'unavailable', 'age_seconds': round(age, 2), 'checks': results},
+        status=200 if ready else 503,
+    )
@@ -0,0 +1,113 @@
+"""Structured, non-blocking logging for request paths.
+
+``QueuedStreamHandler`` only puts records on a bounded in-memory queue; a
+listener thread per process formats and writes them, so request threads never
+wait on stdout. When the queue is full, records are dropped and counted
+rather than blocking. ``JSONFormatter`` renders one JSON object per line with
+any ``extra=`` fields, and ``SamplingFilter`` keeps a fraction of INFO/DEBUG
+records from chosen loggers; warnings and errors always pass.
+"""
+import atexit
+from datetime import datetime, timezone
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+
+# Attributes every LogRecord has; anything else came from ``extra=``
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+class JSONFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class SamplingFilter(logging.Filter):
+    """Passes ``rates[logger]`` of the INFO and DEBUG records of each listed logger.
+
+    Loggers match by dotted prefix, the longest listed prefix winning, so a
+    rate for ``accounts`` also covers ``accounts.views`` unless it has its own.
+    """
+
+    def __init__(self, rates=None, name=''):
+        super().__init__(name)
+        self.rates = dict(rates or {})
+
+    def rate_for(self, logger_name):
+        best, rate = -1, 1.0
+        for prefix, prefix_rate in self.rates.items():
+            if (logger_name == prefix or logger_name.startswith(prefix + '.')) and len(prefix) > best:
+                best, rate = len(prefix), prefix_rate
+        return rate
+
+    def filter(self, record):
+        if record.levelno > logging.INFO:
+            return True
+        rate = self.rate_for(record.name)
+        return rate >= 1 or random.random() < rate
+
+
+class QueuedStreamHandler(logging.handlers.QueueHandler):
+    """Hands records to a listener thread that writes them to ``stream``"""
+
+    def __init__(self, stream=None, maxsize=10000):
+        super().__init__(queue.Queue(maxsize=maxsize))
+        self.stream = stream
+        self.dropped = 0
+        self._listener = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+
+    def _ensure_listener(self):
+        # Threads do not survive fork, so each gunicorn worker starts its own
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            target = logging.StreamHandler(self.stream or sys.stdout)
+            target.setFormatter(self.formatter or JSONFormatter())
+            self.queue = queue.Queue(maxsize=self.queue.maxsize)
+            self._listener = logging.handlers.QueueListener(self.queue, target, respect_handler_level=False)
+            self._listener.start()
+            self._pid = os.getpid()
+            atexit.register(self._listener.stop)
+
+    def prepare(self, record):
+        # Resolve the message and traceback now, while the arguments and
+        # exception are still live; formatting itself happens in the listener
+        record = logging.makeLogRecord(vars(record))
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def emit(self, record):
+        self._ensure_listener()
+        super().emit(record)
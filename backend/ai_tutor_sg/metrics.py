@@ -0,0 +1,307 @@
+"""Per-endpoint request metrics in Prometheus text format.
+
+``MetricsMiddleware`` records, per resolved view: request counts by method
+and status, a latency histogram, a histogram of queries per request, total
+query time and a response size histogram. Queries are counted by an execute
+wrapper installed on every database connection, so replicas and the async
+ORM's worker threads are included.
+
+Each process keeps its metrics in memory. With ``METRICS_DIR`` set, a
+background thread writes them every ``METRICS_FLUSH_INTERVAL`` seconds to
+``metrics-<pid>-<start time>.json`` in that directory (atomically, via
+``os.replace``), and ``/metrics`` sums the files of all gunicorn workers,
+including ones that have exited, so counters never go backwards; the start
+time keeps a reused pid from overwriting an exited worker's file. Clear the
+directory when the server starts.
+
+``/metrics`` answers scrapers sending ``Bearer METRICS_TOKEN``; without a
+token it only answers direct requests from ``METRICS_ALLOWED_IPS``.
+"""
+from contextvars import ContextVar
+import atexit
+import glob
+import json
+import os
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse, HttpResponseForbidden
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55)
+SIZE_BUCKETS = (100, 1000, 10_000, 100_000, 1_000_000)
+# Any other method is counted as ``other``, so clients cannot add label values
+METHODS = {'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'}
+
+# name: (type, help, histogram buckets, label names)
+METRICS = {
+    'http_requests_total': (
+        'counter', 'Requests by view, method and status code', None, ('view', 'method', 'status'),
+    ),
+    'http_request_duration_seconds': (
+        'histogram', 'Request latency by view and method', LATENCY_BUCKETS, ('view', 'method'),
+    ),
+    'http_request_db_queries': (
+        'histogram', 'Database queries per request by view', QUERY_BUCKETS, ('view',),
+    ),
+    'http_request_db_duration_seconds_total': (
+        'counter', 'Time spent in database queries by view', None, ('view',),
+    ),
+    'http_response_size_bytes': (
+        'histogram', 'Response body size in bytes by view', SIZE_BUCKETS, ('view',),
+    ),
+}
+
+_current = ContextVar('request_metrics', default=None)
+
+
+class Registry:
+    """Counters and histograms of one process, keyed by metric name and labels"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.pid = os.getpid()
+        self.started = time.time_ns() // 1_000_000
+        self.values = {name: {} for name in METRICS}
+        self.dirty = False
+        self._flusher = None
+
+    def _check_fork(self):
+        # A worker forked from a preloaded master starts from an empty registry
+        if self.pid != os.getpid():
+            self._reset()
+
+    def inc(self, name, labels, amount=1):
+        with self._lock:
+            self._check_fork()
+            series = self.values[name]
+            series[labels] = series.get(labels, 0) + amount
+            self.dirty = True
+
+    def observe(self, name, labels, value):
+        buckets = METRICS[name][2]
+        with self._lock:
+            self._check_fork()
+            series = self.values[name]
+            histogram = series.get(labels)
+            if histogram is None:
+                histogram = series[labels] = [[0] * (len(buckets) + 1), 0.0, 0]
+            counts = histogram[0]
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            else:
+                counts[-1] += 1
+            histogram[1] += value
+            histogram[2] += 1
+            self.dirty = True
+
+    def dump(self):
+        with self._lock:
+            self._check_fork()
+            self.dirty = False
+            return {
+                name: [
+                    [list(labels), [list(value[0]), value[1], value[2]] if isinstance(value, list) else value]
+                    for labels, value in series.items()
+                ]
+                for name, series in self.values.items()
+            }
+
+    def flush(self):
+        """Write this process's metrics to METRICS_DIR; no-op when it is unset"""
+        directory = settings.METRICS_DIR
+        if not directory:
+            return
+        data = self.dump()  # Resets the pid and start time in a forked worker
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f'metrics-{self.pid}-{self.started}.json')
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f, separators=(',', ':'))
+        os.replace(tmp_path, path)
+
+    def start_flusher(self):
+        if not settings.METRICS_DIR or (self._flusher is not None and self._flusher.is_alive()):
+            return
+        self._flusher = threading.Thread(target=self._flush_loop, name='metrics-flush', daemon=True)
+        self._flusher.start()
+
+    def _flush_loop(self):
+        pid = os.getpid()
+        while self.pid == pid:
+            time.sleep(settings.METRICS_FLUSH_INTERVAL)
+            if self.dirty:
+                try:
+                    self.flush()
+                except OSError:
+                    pass
+
+
+registry = Registry()
+atexit.register(lambda: registry.dirty and registry.flush())
+
+
+def collect():
+    """Metrics summed over every process that has written to METRICS_DIR"""
+    if not settings.METRICS_DIR:
+        dumps = [registry.dump()]
+    else:
+        registry.flush()
+        dumps = []
+        for path in glob.glob(os.path.join(settings.METRICS_DIR, 'metrics-*.json')):
+            try:
+                with open(path) as f:
+                    dumps.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+
+    merged = {name: {} for name in METRICS}
+    for dump in dumps:
+        for name, series in dump.items():
+            if name not in merged:
+                continue
+            for labels, value in series:
+                labels = tuple(labels)
+                current = merged[name].get(labels)
+                if current is None:
+                    merged[name][labels] = value
+                elif METRICS[name][0] == 'counter':
+                    merged[name][labels] = current + value
+                else:
+                    counts = [a + b for a, b in zip(current[0], value[0])]
+                    merged[name][labels] = [counts, current[1] + value[1], current[2] + value[2]]
+    return merged
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(pairs):
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in pairs) + '}'
+
+
+def render(merged):
+    """Prometheus text exposition format (version 0.0.4)"""
+    lines = []
+    for name, (kind, help_text, buckets, label_names) in METRICS.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        for labels, value in sorted(merged[name].items()):
+            pairs = list(zip(label_names, labels))
+            if kind == 'counter':
+                lines.append(f'{name}{_format_labels(pairs)} {value}')
+                continue
+            counts, total, count = value
+            cumulative = 0
+            for bound, bucket_count in zip((*buckets, '+Inf'), counts):
+                cumulative += bucket_count
+                lines.append(f'{name}_bucket{_format_labels(pairs + [("le", bound)])} {cumulative}')
+            lines.append(f'{name}_sum{_format_labels(pairs)} {total}')
+            lines.append(f'{name}_count{_format_labels(pairs)} {count}')
+    return '\n'.join(lines) + '\n'
+
+
+def _allowed(request):
+    token = settings.METRICS_TOKEN
+    if token:
+        return request.META.get('HTTP_AUTHORIZATION') == f'Bearer {token}'
+    # Proxied requests carry X-Forwarded-For and come from the proxy's address
+    return (
+        'HTTP_X_FORWARDED_FOR' not in request.META
+        and request.META.get('REMOTE_ADDR') in settings.METRICS_ALLOWED_IPS
+    )
+
+
+def metrics_view(request):
+    """Prometheus scrape endpoint, for the token holder or allowed addresses"""
+    if not _allowed(request):
+        return HttpResponseForbidden()
+    return HttpResponse(render(collect()), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+class _RequestStats:
+    __slots__ = ('queries', 'query_time')
+
+    def __init__(self):
+        self.queries = 0
+        self.query_time = 0.0
+
+
+def _record_query(execute, sql, params, many, context):
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.query_time += time.perf_counter() - start
+        stats.queries += 1
+
+
+def install_query_wrapper(sender, connection, **kwargs):
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_query)
+
+
+connection_created.connect(install_query_wrapper)
+
+
+class MetricsMiddleware:
+    """Records latency, queries, size and status of every request"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not settings.METRICS_ENABLED:
+            return self.get_response(request)
+        stats = _RequestStats()
+        token = _current.set(stats)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        self._record(request, response, stats, time.perf_counter() - start)
+        return response
+
+    async def __acall__(self, request):
+        if not settings.METRICS_ENABLED:
+            return await self.get_response(request)
+        stats = _RequestStats()
+        token = _current.set(stats)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        self._record(request, response, stats, time.perf_counter() - start)
+        return response
+
+    def _record(self, request, response, stats, elapsed):
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match is not None else '<unresolved>'
+        method = request.method if request.method in METHODS else 'other'
+        registry.inc('http_requests_total', (view, method, str(response.status_code)))
+        registry.observe('http_request_duration_seconds', (view, method), elapsed)
+        registry.observe('http_request_db_queries', (view,), stats.queries)
+        registry.inc('http_request_db_duration_seconds_total', (view,), stats.query_time)
+        if not response.streaming:
+            registry.observe('http_response_size_bytes', (view,), len(response.content))
+        registry.start_flusher()
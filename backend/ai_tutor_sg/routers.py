@@ -0,0 +1,185 @@
+"""Routing of read-only views to read replicas.
+
+Views decorated with ``read_replica`` run their queries on one healthy alias
+from ``settings.DATABASE_REPLICAS``; every other query, and every query after
+a write in the same request, goes to the primary. ``ReplicaPinningMiddleware``
+pins a client to the primary for ``DATABASE_REPLICA_PIN_SECONDS`` after a
+write, by cookie and by identity (auth token or X-User-Data header) in the
+shared cache, so users read their own writes despite replication lag.
+
+To try it locally, copy ``db.sqlite3`` to ``replica.sqlite3`` and set
+``DATABASE_REPLICA_URLS=sqlite:///replica.sqlite3``.
+"""
+from contextvars import ContextVar
+import functools
+import hashlib
+import random
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+from .caching import TTLCache
+
+PIN_COOKIE = 'db_primary'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+
+_routing = ContextVar('db_routing', default=None)
+_health = TTLCache(maxsize=64, ttl=settings.DATABASE_REPLICA_HEALTH_TTL)
+
+
+class _RequestRouting:
+    __slots__ = ('replica', 'wrote')
+
+    def __init__(self):
+        self.replica = None
+        self.wrote = False
+
+
+def replica_healthy(alias):
+    """Whether ``alias`` answers a query against a migrated schema (cached)"""
+    healthy = _health.get(alias)
+    if healthy is None:
+        try:
+            with connections[alias].cursor() as cursor:
+                cursor.execute('SELECT 1 FROM django_migrations LIMIT 1')
+            healthy = True
+        except DatabaseError:
+            connections[alias].close()
+            healthy = False
+        _health.set(alias, healthy)
+    return healthy
+
+
+def choose_replica():
+    """A random healthy replica alias, or the primary when none is healthy"""
+    healthy = [alias for alias in settings.DATABASE_REPLICAS if replica_healthy(alias)]
+    return random.choice(healthy) if healthy else DEFAULT_DB_ALIAS
+
+
+async def achoose_replica():
+    if all(_health.get(alias) is not None for alias in settings.DATABASE_REPLICAS):
+        return choose_replica()
+    return await sync_to_async(choose_replica)()
+
+
+def _pin_key(request):
+    identity = request.META.get('HTTP_AUTHORIZATION') or request.META.get('HTTP_X_USER_DATA')
+    if not identity:
+        return None
+    return 'dbpin:' + hashlib.sha256(identity.encode('utf-8')).hexdigest()[:32]
+
+
+def is_pinned(request):
+    if PIN_COOKIE in request.COOKIES:
+        return True
+    key = _pin_key(request)
+    return key is not None and cache.get(key) is not None
+
+
+async def ais_pinned(request):
+    if PIN_COOKIE in request.COOKIES:
+        return True
+    key = _pin_key(request)
+    return key is not None and await cache.aget(key) is not None
+
+
+def pin_to_primary(request, response):
+    seconds = settings.DATABASE_REPLICA_PIN_SECONDS
+    response.set_cookie(PIN_COOKIE, '1', max_age=seconds, httponly=True, samesite='Lax')
+    key = _pin_key(request)
+    if key is not None:
+        cache.set(key, 1, seconds)
+
+
+def read_replica(view):
+    """Run ``view`` against a replica unless the client is pinned to the primary.
+
+    Apply it outermost so conditional-request checks read from the replica too.
+    """
+    if iscoroutinefunction(view):
+        @functools.wraps(view)
+        async def async_wrapped(request, *args, **kwargs):
+            state = _routing.get()
+            if state is None or not settings.DATABASE_REPLICAS or await ais_pinned(request):
+                return await view(request, *args, **kwargs)
+            state.replica = await achoose_replica()
+            try:
+                return await view(request, *args, **kwargs)
+            finally:
+                state.replica = None
+        return async_wrapped
+
+    @functools.wraps(view)
+    def wrapped(request, *args, **kwargs):
+        state = _routing.get()
+        if state is None or not settings.DATABASE_REPLICAS or is_pinned(request):
+            return view(request, *args, **kwargs)
+        state.replica = choose_replica()
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            state.replica = None
+    return wrapped
+
+
+class ReplicaPinningMiddleware:
+    """Tracks writes per request and pins the client to the primary after one"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not settings.DATABASE_REPLICAS:
+            return self.get_response(request)
+        state = _RequestRouting()
+        token = _routing.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _routing.reset(token)
+        if state.wrote or request.method not in SAFE_METHODS:
+            pin_to_primary(request, response)
+        return response
+
+    async def __acall__(self, request):
+        if not settings.DATABASE_REPLICAS:
+            return await self.get_response(request)
+        state = _RequestRouting()
+        token = _routing.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _routing.reset(token)
+        if state.wrote or request.method not in SAFE_METHODS:
+            await sync_to_async(pin_to_primary)(request, response)
+        return response
+
+
+class PrimaryReplicaRouter:
+    """Sends reads inside ``read_replica`` views to a replica, all else to the primary"""
+
+    def db_for_read(self, model, **hints):
+        state = _routing.get()
+        if state is None or state.replica is None or state.wrote:
+            return DEFAULT_DB_ALIAS
+        return state.replica
+
+    def db_for_write(self, model, **hints):
+        state = _routing.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        aliases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
@@ -10,8 +10,12 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import importlib.util
 from pathlib import Path
-from decouple import config
+from decouple import Csv, config
+from django.core.exceptions import ImproperlyConfigured
+
+from .database import database_config
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -51,12 +55,15 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'ai_tutor_sg.metrics.MetricsMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'ai_tutor_sg.compression.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'ai_tutor_sg.routers.ReplicaPinningMiddleware',
     'allauth.account.middleware.AccountMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
@@ -85,13 +92,35 @@ WSGI_APPLICATION = 'ai_tutor_sg.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# Configured from DATABASE_URL (see ai_tutor_sg/database.py); defaults to the
+# local SQLite file. DB_POOL enables psycopg 3 connection pooling for Postgres
+# when psycopg[pool] is installed, otherwise connections are kept for
+# DB_CONN_MAX_AGE seconds with health checks. Postgres connection attempts
+# give up after DB_CONNECT_TIMEOUT seconds (unless the URL sets connect_timeout).
+_database_options = dict(
+    base_dir=BASE_DIR,
+    conn_max_age=config('DB_CONN_MAX_AGE', cast=int, default=600),
+    pool=config('DB_POOL', cast=bool, default=False),
+    pool_size=(config('DB_POOL_MIN_SIZE', cast=int, default=2), config('DB_POOL_MAX_SIZE', cast=int, default=10)),
+    sqlite_tuning=config('DB_SQLITE_TUNING', cast=bool, default=True),
+    connect_timeout=config('DB_CONNECT_TIMEOUT', cast=int, default=5),
+)
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    'default': database_config(config('DATABASE_URL', default='sqlite:///db.sqlite3'), **_database_options)
 }
 
+# Optional read replicas (comma-separated URLs) for the read-only views; see
+# ai_tutor_sg/routers.py. Clients are pinned to the primary for
+# DATABASE_REPLICA_PIN_SECONDS after a write.
+DATABASE_REPLICAS = []
+for _index, _url in enumerate(config('DATABASE_REPLICA_URLS', cast=Csv(), default='')):
+    _alias = f'replica{_index + 1}'
+    DATABASES[_alias] = {**database_config(_url, **_database_options), 'TEST': {'MIRROR': 'default'}}
+    DATABASE_REPLICAS.append(_alias)
+DATABASE_ROUTERS = ['ai_tutor_sg.routers.PrimaryReplicaRouter'] if DATABASE_REPLICAS else []
+DATABASE_REPLICA_PIN_SECONDS = config('DATABASE_REPLICA_PIN_SECONDS', cast=int, default=10)
+DATABASE_REPLICA_HEALTH_TTL = config('DATABASE_REPLICA_HEALTH_TTL', cast=int, default=15)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -137,6 +166,40 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # Custom settings
 AUTH_USER_MODEL = 'accounts.User'
 
+# Parents resolved from the X-User-Data header are cached per worker process
+# (up to IDENTITY_CACHE_SIZE emails for IDENTITY_CACHE_LOCAL_TTL seconds) and
+# in the shared cache for IDENTITY_CACHE_TTL seconds (capped like
+# AUTH_TOKEN_CACHE_TTL below when there is no shared cache)
+IDENTITY_CACHE_SIZE = config('IDENTITY_CACHE_SIZE', cast=int, default=1024)
+IDENTITY_CACHE_LOCAL_TTL = config('IDENTITY_CACHE_LOCAL_TTL', cast=int, default=5)
+IDENTITY_CACHE_TTL = config('IDENTITY_CACHE_TTL', cast=int, default=60)
+
+# Memory-mapped question bank snapshot shared by all workers, built by
+# `manage.py build_question_snapshot` and rebuilt in the background when
+# questions change.
+# Empty disables it; workers re-stat the file and read CatalogVersion every
+# CHECK_INTERVAL seconds, and use the database while the file is older than
+# the catalog (a rebuild is running or failed).
+QUESTION_SNAPSHOT_PATH = config('QUESTION_SNAPSHOT_PATH', default='')
+QUESTION_SNAPSHOT_CHECK_INTERVAL = config('QUESTION_SNAPSHOT_CHECK_INTERVAL', cast=float, default=1.0)
+
+# The public question and topic lists may be cached by browsers for
+# PUBLIC_CACHE_MAX_AGE seconds. When CACHE_PURGE_URL is set (e.g. a CDN's
+# purge-by-surrogate-key endpoint), shared caches may keep them for
+# PUBLIC_CACHE_SHARED_MAX_AGE seconds, and question/topic changes POST the
+# affected Surrogate-Key values there, with CACHE_PURGE_TOKEN sent in the
+# CACHE_PURGE_AUTH_HEADER header; see quiz/purge.py.
+PUBLIC_CACHE_MAX_AGE = config('PUBLIC_CACHE_MAX_AGE', cast=int, default=60)
+PUBLIC_CACHE_SHARED_MAX_AGE = config('PUBLIC_CACHE_SHARED_MAX_AGE', cast=int, default=86400)
+CACHE_PURGE_URL = config('CACHE_PURGE_URL', default='')
+CACHE_PURGE_TOKEN = config('CACHE_PURGE_TOKEN', default='')
+CACHE_PURGE_AUTH_HEADER = config('CACHE_PURGE_AUTH_HEADER', default='Fastly-Key')
+CACHE_PURGE_TIMEOUT = config('CACHE_PURGE_TIMEOUT', cast=float, default=2.0)
+
+# Quiz sessions older than this many days are moved to the archive tables
+# by `manage.py archive_quiz_sessions`
+QUIZ_SESSION_ARCHIVE_AFTER_DAYS = config('QUIZ_SESSION_ARCHIVE_AFTER_DAYS', cast=int, default=365)
+
 # CORS settings
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",
@@ -164,13 +227,83 @@ CORS_ALLOW_HEADERS = [
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework.authentication.SessionAuthentication',
-        'rest_framework.authentication.TokenAuthentication',
+        'accounts.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.AllowAny',  # Changed to AllowAny for development
     ],
+    # Reverse proxies in front of the app (nginx in docker-compose); throttles
+    # take the client IP from that many X-Forwarded-For entries and otherwise
+    # from REMOTE_ADDR, so clients cannot pick their own IP
+    'NUM_PROXIES': config('NUM_PROXIES', cast=int, default=0),
 }
 
+# FAST_JSON swaps DRF's JSON renderer/parser for the orjson-backed pair in
+# ai_tutor_sg/renderers.py (ignored when orjson is not installed)
+FAST_JSON = config('FAST_JSON', cast=bool, default=False)
+if FAST_JSON and importlib.util.find_spec('orjson') is not None:
+    REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES'] = [
+        'ai_tutor_sg.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ]
+    REST_FRAMEWORK['DEFAULT_PARSER_CLASSES'] = [
+        'ai_tutor_sg.renderers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ]
+
+# JSON responses of at least COMPRESSION_MIN_SIZE bytes are brotli (when the
+# brotli package is installed) or gzip compressed; see ai_tutor_sg/compression.py
+COMPRESSION_MIN_SIZE = config('COMPRESSION_MIN_SIZE', cast=int, default=1024)
+COMPRESSION_BROTLI_QUALITY = config('COMPRESSION_BROTLI_QUALITY', cast=int, default=4)
+COMPRESSION_GZIP_LEVEL = config('COMPRESSION_GZIP_LEVEL', cast=int, default=6)
+
+# Cache shared by all worker processes. Defaults to a per-process local-memory
+# cache; point CACHE_BACKEND/CACHE_LOCATION at memcached or redis in production
+# (docker-compose runs redis) so cached state (e.g. token lookups) and its
+# invalidation are shared between gunicorn workers. CACHE_IS_SHARED is False
+# for the local-memory backend, which callers treat as a per-process tier.
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='ai-tutor-sg'),
+    }
+}
+CACHE_IS_SHARED = not CACHES['default']['BACKEND'].endswith('.LocMemCache')
+# Network caches give up after CACHE_SOCKET_TIMEOUT seconds instead of hanging requests
+CACHE_SOCKET_TIMEOUT = config('CACHE_SOCKET_TIMEOUT', cast=float, default=1.0)
+if CACHES['default']['BACKEND'].endswith('.RedisCache'):
+    CACHES['default']['OPTIONS'] = {
+        'socket_connect_timeout': CACHE_SOCKET_TIMEOUT, 'socket_timeout': CACHE_SOCKET_TIMEOUT,
+    }
+elif CACHES['default']['BACKEND'].endswith('.PyMemcacheCache'):
+    CACHES['default']['OPTIONS'] = {'connect_timeout': CACHE_SOCKET_TIMEOUT, 'timeout': CACHE_SOCKET_TIMEOUT}
+
+# Token authentication caches token -> user in-process for AUTH_TOKEN_LOCAL_TTL
+# seconds and in the shared cache for AUTH_TOKEN_CACHE_TTL seconds. Deleting or
+# rotating a token, or saving its user, evicts both tiers immediately in the
+# process that made the change; other workers' local tier expires within
+# AUTH_TOKEN_LOCAL_TTL (set it to 0 to only use the shared tier). Without a
+# shared cache the "shared" tier is per process too, so it gets the local TTL.
+AUTH_TOKEN_LOCAL_TTL = config('AUTH_TOKEN_LOCAL_TTL', cast=int, default=5)
+AUTH_TOKEN_CACHE_TTL = config('AUTH_TOKEN_CACHE_TTL', cast=int, default=300)
+if not CACHE_IS_SHARED:
+    AUTH_TOKEN_CACHE_TTL = min(AUTH_TOKEN_CACHE_TTL, AUTH_TOKEN_LOCAL_TTL)
+    IDENTITY_CACHE_TTL = min(IDENTITY_CACHE_TTL, IDENTITY_CACHE_LOCAL_TTL)
+
+# Student join code logins allowed per window (seconds), per client IP and per
+# client IP and join code prefix; counted in the shared cache (see CACHES)
+STUDENT_LOGIN_WINDOW = config('STUDENT_LOGIN_WINDOW', cast=int, default=60)
+STUDENT_LOGIN_IP_LIMIT = config('STUDENT_LOGIN_IP_LIMIT', cast=int, default=30)
+STUDENT_LOGIN_PREFIX_LIMIT = config('STUDENT_LOGIN_PREFIX_LIMIT', cast=int, default=20)
+
+# At most PASSWORD_HASH_WORKERS password hash checks run at once per process,
+# with up to PASSWORD_HASH_MAX_PENDING logins waiting at most
+# PASSWORD_HASH_QUEUE_TIMEOUT seconds for a turn; others are answered with 503
+PASSWORD_HASH_WORKERS = config('PASSWORD_HASH_WORKERS', cast=int, default=2)
+PASSWORD_HASH_MAX_PENDING = config('PASSWORD_HASH_MAX_PENDING', cast=int, default=8)
+PASSWORD_HASH_QUEUE_TIMEOUT = config('PASSWORD_HASH_QUEUE_TIMEOUT', cast=float, default=2.0)
+
 # Django Allauth settings
 SITE_ID = 1
 
@@ -204,7 +337,47 @@ else:
     # No credentials set → print emails to console for development
     EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 
+# Lifetime of email verification and password reset links
+EMAIL_VERIFICATION_TOKEN_TTL_HOURS = config('EMAIL_VERIFICATION_TOKEN_TTL_HOURS', cast=int, default=48)
+PASSWORD_RESET_TOKEN_TTL_HOURS = config('PASSWORD_RESET_TOKEN_TTL_HOURS', cast=int, default=2)
+
+# Emails are queued in the outbox and sent by `manage.py drain_outbox`.
+# Failed sends are retried after EMAIL_OUTBOX_RETRY_BASE * 2**(attempt-1)
+# seconds (capped at EMAIL_OUTBOX_RETRY_MAX) up to EMAIL_OUTBOX_MAX_ATTEMPTS times.
+# A claimed batch is left to other drainers once EMAIL_OUTBOX_LEASE seconds
+# pass, so it must outlast sending one batch.
+EMAIL_OUTBOX_MAX_ATTEMPTS = config('EMAIL_OUTBOX_MAX_ATTEMPTS', cast=int, default=5)
+EMAIL_OUTBOX_RETRY_BASE = config('EMAIL_OUTBOX_RETRY_BASE', cast=int, default=30)
+EMAIL_OUTBOX_RETRY_MAX = config('EMAIL_OUTBOX_RETRY_MAX', cast=int, default=3600)
+EMAIL_OUTBOX_LEASE = config('EMAIL_OUTBOX_LEASE', cast=int, default=300)
+
+# /health/ready fails (503) when the database or cache round trip takes longer
+# than its HEALTH_*_MAX_MS, or when more than HEALTH_OUTBOX_MAX_PENDING emails
+# are due or the oldest has waited HEALTH_OUTBOX_MAX_AGE seconds (0 disables a
+# limit). Each process reuses its last result for HEALTH_CACHE_SECONDS, and
+# keeps answering with it while one probe refreshes it; a process without a
+# result waits at most HEALTH_WAIT_SECONDS. Health queries on Postgres are
+# cancelled after HEALTH_STATEMENT_TIMEOUT_MS.
+HEALTH_CACHE_SECONDS = config('HEALTH_CACHE_SECONDS', cast=float, default=2.0)
+HEALTH_WAIT_SECONDS = config('HEALTH_WAIT_SECONDS', cast=float, default=3.0)
+HEALTH_STATEMENT_TIMEOUT_MS = config('HEALTH_STATEMENT_TIMEOUT_MS', cast=int, default=2000)
+HEALTH_DATABASE_MAX_MS = config('HEALTH_DATABASE_MAX_MS', cast=float, default=500)
+HEALTH_CACHE_MAX_MS = config('HEALTH_CACHE_MAX_MS', cast=float, default=200)
+HEALTH_OUTBOX_MAX_MS = config('HEALTH_OUTBOX_MAX_MS', cast=float, default=1000)
+HEALTH_OUTBOX_MAX_PENDING = config('HEALTH_OUTBOX_MAX_PENDING', cast=int, default=1000)
+HEALTH_OUTBOX_MAX_AGE = config('HEALTH_OUTBOX_MAX_AGE', cast=int, default=900)
+
 # Basic logging to surface auth/email diagnostics in the console
+# Log records are queued and written by a listener thread (ai_tutor_sg/log.py),
+# as JSON lines by default or LOG_FORMAT=text for local development.
+# LOG_SAMPLE_RATES keeps only a fraction of INFO/DEBUG lines per logger, e.g.
+# LOG_SAMPLE_RATES=accounts.views=0.1,quiz=0.5; warnings are never sampled.
+LOG_FORMAT = config('LOG_FORMAT', default='json')
+LOG_SAMPLE_RATES = {
+    name.strip(): float(rate)
+    for name, rate in (item.split('=', 1) for item in config('LOG_SAMPLE_RATES', cast=Csv(), default=''))
+}
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
@@ -212,11 +385,22 @@ LOGGING = {
         'standard': {
             'format': '[%(levelname)s] %(asctime)s %(name)s: %(message)s'
         },
+        'json': {
+            '()': 'ai_tutor_sg.log.JSONFormatter',
+        },
+    },
+    'filters': {
+        'sampling': {
+            '()': 'ai_tutor_sg.log.SamplingFilter',
+            'rates': LOG_SAMPLE_RATES,
+        },
     },
     'handlers': {
         'console': {
-            'class': 'logging.StreamHandler',
-            'formatter': 'standard',
+            '()': 'ai_tutor_sg.log.QueuedStreamHandler',
+            'stream': 'ext://sys.stdout',
+            'formatter': 'json' if LOG_FORMAT == 'json' else 'standard',
+            'filters': ['sampling'],
         },
     },
     'loggers': {
@@ -231,6 +415,12 @@ LOGGING = {
             'level': 'INFO',
             'propagate': False,
         },
+        # Project-level modules, e.g. the health probes
+        'ai_tutor_sg': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
         # Django email backend + auth
         'django.core.mail': {
             'handlers': ['console'],
@@ -262,3 +452,30 @@ SOCIALACCOUNT_PROVIDERS = {
 SECRET_KEY = config('SECRET_KEY', default='django-insecure-2*bnsl@l@ybrnu+mc*)s@x3g5xz*43rx4z8_kvm%k*l1ao33mu')
 DEBUG = config('DEBUG', default=True, cast=bool)
 ALLOWED_HOSTS = config('ALLOWED_HOSTS', default='localhost,127.0.0.1', cast=lambda v: [s.strip() for s in v.split(',')])
+
+# Key for the join code permutation. Changing it after codes have been issued
+# is safe but may cost a retry when a new code hits an existing one. Anyone
+# holding it can enumerate issued codes, so without DEBUG it must be set, or
+# SECRET_KEY must not be the committed development key it falls back to.
+JOIN_CODE_SECRET = config('JOIN_CODE_SECRET', default='')
+if not JOIN_CODE_SECRET:
+    if not DEBUG and SECRET_KEY.startswith('django-insecure-'):
+        raise ImproperlyConfigured('Set JOIN_CODE_SECRET (or SECRET_KEY) when DEBUG is off')
+    JOIN_CODE_SECRET = SECRET_KEY
+JOIN_CODE_BLOCK_SIZE = config('JOIN_CODE_BLOCK_SIZE', cast=int, default=50)
+
+# Serve the hot read endpoints (random question, topics, progress, health)
+# from async views. Only worthwhile under an ASGI server, e.g. gunicorn with
+# uvicorn workers as in the Dockerfile.
+ASYNC_VIEWS = config('ASYNC_VIEWS', cast=bool, default=False)
+
+# Per-view request metrics served at /metrics (ai_tutor_sg/metrics.py). Set
+# METRICS_DIR to a directory shared by the gunicorn workers, emptied at
+# startup, so the endpoint reports all of them. Scrapers send METRICS_TOKEN as
+# a Bearer token; without one, only unproxied requests from
+# METRICS_ALLOWED_IPS are answered.
+METRICS_ENABLED = config('METRICS_ENABLED', cast=bool, default=True)
+METRICS_DIR = config('METRICS_DIR', default='')
+METRICS_FLUSH_INTERVAL = config('METRICS_FLUSH_INTERVAL', cast=float, default=1.0)
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+METRICS_ALLOWED_IPS = config('METRICS_ALLOWED_IPS', cast=Csv(), default='127.0.0.1,::1')
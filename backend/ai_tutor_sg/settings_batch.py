@@ -0,0 +1,42 @@
+"""Settings for management commands and scripts that never serve HTTP.
+
+    DJANGO_SETTINGS_MODULE=ai_tutor_sg.settings_batch python manage.py import_questions --file q.jsonl
+
+Database, cache, email, logging and app settings are the same as
+``settings``. The apps that only matter to web requests are left out: the
+admin, allauth and its Google provider (which import requests, PyJWT and
+cryptography), CORS, messages, sites and static files. So is the
+middleware. Loading those apps is most of the start-up time, so short
+commands like ``drain_outbox`` or ``import_questions`` start faster (see
+``benchmarks/bench_startup.py``). The project's own commands also skip the
+system checks, which ``manage.py check`` covers in CI and on deploy.
+
+Do not serve requests, run ``migrate`` or delete users with this profile,
+because it knows nothing about the dropped apps' URLs and tables, nor their
+foreign keys to users.
+"""
+from .settings import *  # noqa: F401,F403
+from .settings import INSTALLED_APPS
+
+WEB_ONLY_APPS = {
+    'django.contrib.admin',
+    'django.contrib.messages',
+    'django.contrib.sites',
+    'django.contrib.staticfiles',
+    'corsheaders',
+    'allauth',
+    'allauth.account',
+    'allauth.socialaccount',
+    'allauth.socialaccount.providers.google',
+}
+
+INSTALLED_APPS = [app for app in INSTALLED_APPS if app not in WEB_ONLY_APPS]
+MIDDLEWARE = []
+AUTHENTICATION_BACKENDS = ['django.contrib.auth.backends.ModelBackend']
+# Emails are plain text; without a template engine the template checks do not
+# import every app's tag libraries (DRF's pulls in requests, yaml and pygments)
+TEMPLATES = []
+
+# System checks still load the URLconf; this module doubles as an empty one
+ROOT_URLCONF = __name__
+urlpatterns = []
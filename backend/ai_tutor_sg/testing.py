@@ -0,0 +1,137 @@
+"""Query budget assertions for endpoint tests.
+
+``QueryCapture`` records every query issued on any database connection
+together with the application frames that issued it. ``QueryBudgetMixin``
+uses it to check that an endpoint stays within a fixed number of queries and
+that the count does not grow as the dataset does, which is how N+1 patterns
+show up. Failures list each query with its stack, so the loop that issued it
+is visible in the test output.
+"""
+from contextlib import ExitStack
+import os
+import time
+import traceback
+
+from django.core.cache import cache
+from django.db import connections
+
+from .caching import clear_local_caches
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _application_frames(stack):
+    """The project's own frames, starting at the test that made the request"""
+    frames = [
+        frame for frame in stack
+        if frame.filename.startswith(BACKEND_DIR)
+        and frame.filename != __file__
+        and 'site-packages' not in frame.filename
+    ]
+    tests = [i for i, frame in enumerate(frames) if os.path.basename(frame.filename).startswith('test')]
+    return frames[tests[0]:] if tests else frames
+
+
+class CapturedQuery:
+    __slots__ = ('alias', 'sql', 'params', 'duration', 'stack')
+
+    def __init__(self, alias, sql, params, duration, stack):
+        self.alias = alias
+        self.sql = sql
+        self.params = params
+        self.duration = duration
+        self.stack = stack
+
+    def format(self):
+        lines = [f'[{self.alias}] {self.sql}']
+        if self.params:
+            lines.append(f'    params: {self.params!r}')
+        for frame in self.stack:
+            lines.append(f'    {frame.filename[len(BACKEND_DIR) + 1:]}:{frame.lineno} in {frame.name}')
+            if frame.line:
+                lines.append(f'        {frame.line}')
+        return '\n'.join(lines)
+
+
+class QueryCapture:
+    """Records the queries run inside the block on every configured database"""
+
+    def __init__(self, using=None):
+        self.aliases = [using] if using else list(connections)
+        self.queries = []
+        self._stack = None
+
+    def __enter__(self):
+        self._stack = ExitStack()
+        for alias in self.aliases:
+            self._stack.enter_context(connections[alias].execute_wrapper(self._wrapper(alias)))
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stack.close()
+
+    def _wrapper(self, alias):
+        def record(execute, sql, params, many, context):
+            start = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                stack = _application_frames(traceback.extract_stack()[:-1])
+                self.queries.append(CapturedQuery(alias, sql, params, time.perf_counter() - start, stack))
+        return record
+
+    def __len__(self):
+        return len(self.queries)
+
+    def report(self):
+        return '\n'.join(f'{i}. {query.format()}' for i, query in enumerate(self.queries, 1))
+
+
+class QueryBudgetMixin:
+    """Assertions for ``TestCase`` subclasses declaring per-endpoint query budgets"""
+
+    # Dataset sizes ``assertQueryBudget`` measures an endpoint at
+    dataset_sizes = (1, 5, 20)
+
+    def clear_caches(self):
+        """Forget cached state, so every measurement takes the cold path"""
+        cache.clear()
+        clear_local_caches()
+
+    def measure_queries(self, call, *args):
+        """``call(*args)``'s response and the queries it ran, from cold caches"""
+        self.clear_caches()
+        with QueryCapture() as capture:
+            response = call(*args)
+        return response, capture
+
+    def assertQueryBudget(self, budget, call, grow=None, prepare=None, sizes=None, status=200):
+        """Fail when ``call()`` runs more than ``budget`` queries, or more as data grows.
+
+        ``grow(size)`` brings the dataset up to ``size`` before each
+        measurement; without it ``call`` is measured once. ``prepare()``,
+        when given, runs before each measurement, outside the capture, and
+        its result is passed to ``call``.
+        """
+        captures = {}
+        for size in (sizes or self.dataset_sizes) if grow else (None,):
+            if grow:
+                grow(size)
+            args = (prepare(),) if prepare else ()
+            response, capture = self.measure_queries(call, *args)
+            self.assertEqual(
+                response.status_code, status,
+                f'Unexpected status {response.status_code}: {getattr(response, "data", response.content)!r}',
+            )
+            where = f' with dataset size {size}' if grow else ''
+            if len(capture) > budget:
+                self.fail(f'{len(capture)} queries{where}, budget is {budget}:\n{capture.report()}')
+            captures[size] = capture
+        if grow and len({len(capture) for capture in captures.values()}) > 1:
+            (small, first), (large, last) = list(captures.items())[0], list(captures.items())[-1]
+            self.fail(
+                f'Query count grows with the dataset: '
+                f'{", ".join(f"{size}: {len(c)}" for size, c in captures.items())}\n'
+                f'Queries at size {small}:\n{first.report()}\n\nQueries at size {large}:\n{last.report()}'
+            )
+        return captures
@@ -0,0 +1,159 @@
+from datetime import date, datetime, timezone as dt_timezone
+from decimal import Decimal
+import importlib.util
+import os
+import tempfile
+from unittest import mock, skipUnless
+
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from rest_framework.renderers import JSONRenderer
+
+from accounts.outbox import enqueue_email
+from accounts.models import User
+from quiz.models import StudentProfile
+from quiz.views import progress_payload
+from . import health, metrics, routers
+from .testing import QueryBudgetMixin
+
+
+class HealthTests(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        health._state = None
+
+    def test_liveness_touches_nothing(self):
+        self.assertQueryBudget(0, lambda: self.client.get('/health/live'))
+
+    def test_ready(self):
+        response = self.client.get('/health/ready')
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(body['status'], 'ok')
+        self.assertEqual(set(body['checks']), {'database', 'cache', 'outbox'})
+        self.assertTrue(all('latency_ms' in check for check in body['checks'].values()))
+
+    @override_settings(HEALTH_OUTBOX_MAX_PENDING=2)
+    def test_outbox_backlog_over_limit(self):
+        for _ in range(3):
+            enqueue_email('Subject', 'Body', ['parent@example.com'])
+        response = self.client.get('/health/ready')
+        self.assertEqual(response.status_code, 503)
+        self.assertFalse(response.json()['checks']['outbox']['ok'])
+
+    def test_failing_check(self):
+        with self.assertLogs('ai_tutor_sg.health', 'WARNING'), mock.patch.dict(health.CHECKS, cache=(mock.Mock(side_effect=OSError('down'), __name__='check_cache'),
+                                                   'HEALTH_CACHE_MAX_MS')):
+            response = self.client.get('/health/ready')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json()['checks']['cache']['error'], 'OSError')
+
+    @override_settings(HEALTH_CACHE_SECONDS=60)
+    def test_result_is_reused(self):
+        self.client.get('/health/ready')
+        # A second probe within HEALTH_CACHE_SECONDS runs no checks
+        self.assertQueryBudget(0, lambda: self.client.get('/health/ready'))
+
+    @override_settings(HEALTH_CACHE_SECONDS=0)
+    def test_refresh_in_flight_does_not_block(self):
+        self.client.get('/health/ready')
+        # Another probe is refreshing: answer with the previous result right away
+        with health._lock, mock.patch.object(health, 'readiness') as readiness:
+            response = self.client.get('/health/ready')
+        self.assertEqual(response.status_code, 200)
+        readiness.assert_not_called()
+
+    @override_settings(HEALTH_WAIT_SECONDS=0.01)
+    def test_first_probe_waits_boundedly(self):
+        with health._lock:
+            response = self.client.get('/health/ready')
+        self.assertEqual(response.status_code, 503)
+
+
+@skipUnless(importlib.util.find_spec('orjson'), 'orjson is not installed')
+class ORJSONRendererTests(TestCase):
+    def test_matches_drf_on_progress(self):
+        from .renderers import ORJSONRenderer
+
+        parent = User.objects.create_user(username='parent@example.com', email='parent@example.com', is_parent=True)
+        student = StudentProfile.objects.create(parent=parent, name='Zoë\u2028', level='P4')
+        progress = {
+            'Fractions': (3, 2, datetime(2024, 1, 1, 8, 30, 15, 123456, tzinfo=dt_timezone.utc)),
+            'Decimals': (1, 1, datetime(2024, 1, 2, tzinfo=dt_timezone.utc)),
+            'Area': (0, 0, None),
+        }
+        payload = progress_payload(student, progress, history=[{'on': date(2024, 1, 1), 'score': Decimal('1.5')}])
+
+        rendered = ORJSONRenderer().render(payload)
+        self.assertEqual(rendered, JSONRenderer().render(payload))
+        self.assertIn(b'"Zo\xc3\xab\\u2028"', rendered)
+
+
+class MetricsTests(TestCase):
+    def test_scrapes_need_the_token_or_a_direct_allowed_address(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 200)
+        self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='10.0.0.5').status_code, 403)
+        self.assertEqual(self.client.get('/metrics', HTTP_X_FORWARDED_FOR='127.0.0.1').status_code, 403)
+        with override_settings(METRICS_TOKEN='secret'):
+            self.assertEqual(self.client.get('/metrics').status_code, 403)
+            response = self.client.get('/metrics', REMOTE_ADDR='10.0.0.5', HTTP_AUTHORIZATION='Bearer secret')
+            self.assertEqual(response.status_code, 200)
+
+    def test_unknown_methods_share_a_label(self):
+        self.client.generic('BREW', '/health/live')
+        body = metrics.render(metrics.collect())
+        self.assertIn('method="other"', body)
+        self.assertNotIn('BREW', body)
+
+    def test_files_are_named_by_pid_and_start_time(self):
+        with tempfile.TemporaryDirectory() as directory, override_settings(METRICS_DIR=directory):
+            metrics.registry.flush()
+            self.assertEqual(
+                os.listdir(directory), [f'metrics-{os.getpid()}-{metrics.registry.started}.json'],
+            )
+
+
+@override_settings(DATABASE_REPLICAS=['replica1'])
+class ReplicaRoutingTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        patcher = mock.patch.object(routers, 'choose_replica', return_value='replica1')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.router = routers.PrimaryReplicaRouter()
+        self.factory = RequestFactory()
+        self.aliases = []
+
+    def request(self, method='get', write=False, **extra):
+        """Run a ``read_replica`` view through the middleware, noting the read alias before and after a write"""
+        @routers.read_replica
+        def view(request):
+            self.aliases.append(self.router.db_for_read(User))
+            if write:
+                self.router.db_for_write(User)
+                self.aliases.append(self.router.db_for_read(User))
+            return HttpResponse()
+
+        request = getattr(self.factory, method)('/', **extra)
+        return routers.ReplicaPinningMiddleware(view)(request)
+
+    def test_reads_use_the_replica_until_a_write(self):
+        response = self.request(write=True)
+        self.assertEqual(self.aliases, ['replica1', 'default'])
+        self.assertIn(routers.PIN_COOKIE, response.cookies)
+
+    def test_client_is_pinned_after_a_write(self):
+        response = self.request('post', HTTP_AUTHORIZATION='Token abc')
+        self.assertIn(routers.PIN_COOKIE, response.cookies)
+        self.aliases.clear()
+
+        self.factory.cookies[routers.PIN_COOKIE] = '1'
+        self.request()
+        del self.factory.cookies[routers.PIN_COOKIE]
+        # Pinned by identity too, for clients that drop the cookie
+        self.request(HTTP_AUTHORIZATION='Token abc')
+        self.request(HTTP_AUTHORIZATION='Token other')
+        self.assertEqual(self.aliases, ['default', 'default', 'replica1'])
+
+    def test_reads_outside_read_replica_views_use_the_primary(self):
+        self.assertEqual(self.router.db_for_read(User), 'default')
@@ -17,9 +17,15 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 
+from .health import liveness_view, readiness_view
+from .metrics import metrics_view
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/auth/', include('accounts.urls')),
     path('api/', include('quiz.urls')),
     path('accounts/', include('allauth.urls')),
+    path('metrics', metrics_view, name='metrics'),
+    path('health/live', liveness_view, name='health_live'),
+    path('health/ready', readiness_view, name='health_ready'),
 ]
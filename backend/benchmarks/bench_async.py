@@ -0,0 +1,81 @@
+"""Sync gunicorn workers against uvicorn (ASGI) workers serving the async views.
+
+    python -m benchmarks.bench_async [--duration 10] [--clients 32]
+                                     [--sync-workers 3] [--async-workers 3] [--json out.json]
+
+Both servers run against the same freshly seeded SQLite database. The mix
+is the hot read path the async views cover: random question (40%), topics
+(30%), progress (20%) and health (10%). Resident memory of the whole server
+process tree is sampled after the run, so worker counts can be adjusted until
+both modes use the same memory and throughput compared at that point.
+"""
+import argparse
+import json
+import sys
+import tempfile
+
+from benchmarks.common import print_table, process_tree_rss_mb, run_load, serve, summarize
+from benchmarks.dataset import PARENT_EMAIL, prepare
+
+SERVERS = {
+    'sync': ['ai_tutor_sg.wsgi:application'],
+    'async': ['ai_tutor_sg.asgi:application', '-k', 'uvicorn_worker.UvicornWorker'],
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--clients', type=int, default=32)
+    parser.add_argument('--sync-workers', type=int, default=3)
+    parser.add_argument('--async-workers', type=int, default=3)
+    parser.add_argument('--json', default=None, help='Write results to this file')
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix='bench-async-')
+    env = {'DEBUG': 'False', 'DATABASE_URL': f'sqlite:///{tmp}/bench.sqlite3'}
+    ids = prepare(env)
+    student_ids = ids['student_ids']
+
+    def pick(rng):
+        roll = rng.random()
+        if roll < 0.4:
+            return 'random_question', 'GET', '/api/questions/random/?subject=Math&level=P4', None
+        if roll < 0.7:
+            return 'get_topics', 'GET', '/api/topics/?level=P4', None
+        if roll < 0.9:
+            return 'get_progress', 'GET', f'/api/progress/{rng.choice(student_ids)}/', None
+        return 'health', 'GET', '/api/auth/health/', None
+
+    rows = []
+    for mode, workers in (('sync', args.sync_workers), ('async', args.async_workers)):
+        command = [sys.executable, '-m', 'gunicorn', *SERVERS[mode],
+                   '--workers', str(workers), '--bind', '127.0.0.1:{port}']
+        mode_env = {**env, 'ASYNC_VIEWS': str(mode == 'async')}
+        with serve(command, env=mode_env) as (base_url, process):
+            results, elapsed = run_load(
+                base_url, pick, clients=args.clients, duration=args.duration,
+                headers={'X-User-Data': json.dumps({'email': PARENT_EMAIL})},
+            )
+            rss = process_tree_rss_mb(process.pid)
+        total = sum(len(r['latencies']) for r in results.values())
+        errors = sum(n for r in results.values() for s, n in r['statuses'].items() if s == 'error' or s >= 500)
+        rows.append({
+            'mode': mode,
+            'workers': workers,
+            'rss_mb': rss,
+            'requests': total,
+            'req/s': round(total / elapsed, 1),
+            'req/s/100MB': round(total / elapsed / rss * 100, 1),
+            'errors': errors,
+            **summarize([latency for r in results.values() for latency in r['latencies']]),
+        })
+
+    print_table(rows, ['mode', 'workers', 'rss_mb', 'req/s', 'req/s/100MB', 'errors', 'p50_ms', 'p95_ms', 'p99_ms'])
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(rows, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""Request throughput per database mode under gunicorn with three workers.
+
+    python -m benchmarks.bench_database [--duration 10] [--clients 12]
+                                        [--postgres-url postgres://...] [--json out.json]
+
+Modes: SQLite with Django's defaults, SQLite with the WAL tuning from
+ai_tutor_sg.database, and with --postgres-url, Postgres with persistent
+connections and (if psycopg_pool is installed) pooled connections. Every
+mode runs against a freshly migrated and seeded database. The request mix
+is 80% reads (random question, topics) and 20% answer submissions.
+"""
+import argparse
+import json
+import sys
+import tempfile
+
+from benchmarks.common import print_table, run_load, serve, summarize
+from benchmarks.dataset import prepare
+
+GUNICORN = [sys.executable, '-m', 'gunicorn', 'ai_tutor_sg.wsgi:application',
+            '--workers', '3', '--bind', '127.0.0.1:{port}']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--clients', type=int, default=12)
+    parser.add_argument('--postgres-url', default=None)
+    parser.add_argument('--json', default=None, help='Write results to this file')
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix='bench-db-')
+    base = {'DEBUG': 'False', 'DB_CONN_MAX_AGE': '600'}
+    modes = [
+        ('sqlite-default', {'DATABASE_URL': f'sqlite:///{tmp}/default.sqlite3', 'DB_SQLITE_TUNING': 'False'}),
+        ('sqlite-wal', {'DATABASE_URL': f'sqlite:///{tmp}/wal.sqlite3', 'DB_SQLITE_TUNING': 'True'}),
+    ]
+    if args.postgres_url:
+        modes.append(('postgres-persistent', {'DATABASE_URL': args.postgres_url, 'DB_POOL': 'False'}))
+        modes.append(('postgres-pool', {'DATABASE_URL': args.postgres_url, 'DB_POOL': 'True'}))
+
+    rows = []
+    for mode, env in modes:
+        env = {**base, **env}
+        ids = prepare(env)
+
+        def pick(rng):
+            roll = rng.random()
+            if roll < 0.4:
+                return 'random_question', 'GET', '/api/questions/random/?subject=Math&level=P4', None
+            if roll < 0.8:
+                return 'get_topics', 'GET', '/api/topics/?level=P4', None
+            body = {'session_id': rng.choice(ids['session_ids']), 'user_answer': rng.choice(['1', '2'])}
+            return 'submit_answer', 'POST', '/api/submit-answer/', body
+
+        with serve(GUNICORN, env=env) as (base_url, _):
+            results, elapsed = run_load(base_url, pick, clients=args.clients, duration=args.duration)
+        total = sum(len(r['latencies']) for r in results.values())
+        errors = sum(n for r in results.values() for s, n in r['statuses'].items() if s == 'error' or s >= 500)
+        all_latencies = [latency for r in results.values() for latency in r['latencies']]
+        rows.append({
+            'mode': mode,
+            'requests': total,
+            'req/s': round(total / elapsed, 1),
+            'errors': errors,
+            **summarize(all_latencies),
+        })
+
+    print_table(rows, ['mode', 'requests', 'req/s', 'errors', 'p50_ms', 'p95_ms', 'p99_ms'])
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(rows, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""Password hashing cost of parent_login per attempt.
+
+Compares the previous flow (``authenticate`` by email, then by username) with
+the single-pass endpoint, counting hasher invocations and wall time.
+
+    python -m benchmarks.bench_parent_login [--attempts 5]
+"""
+import argparse
+from unittest import mock
+
+from benchmarks.common import print_table, setup_django, summarize, test_database, timed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--attempts', type=int, default=5)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.contrib.auth import authenticate
+    from django.contrib.auth.hashers import get_hasher
+    from django.test import Client
+
+    from accounts.models import User
+
+    with test_database():
+        User.objects.create_user(
+            username='parent', email='parent@example.com', password='correct horse', is_parent=True
+        )
+        client = Client()
+
+        def legacy(email, password):
+            # The flow parent_login used before: two hashes for a wrong password
+            user = authenticate(username=email, password=password)
+            if user is None:
+                try:
+                    user_obj = User.objects.get(email=email)
+                    user = authenticate(username=user_obj.username, password=password)
+                except User.DoesNotExist:
+                    pass
+            return user
+
+        def endpoint(email, password):
+            client.post('/api/auth/parent-login/', {'email': email, 'password': password},
+                        content_type='application/json')
+
+        hasher = type(get_hasher())
+        cases = [
+            ('wrong password', 'parent@example.com', 'wrong'),
+            ('unknown email', 'nobody@example.com', 'wrong'),
+            ('success', 'parent@example.com', 'correct horse'),
+        ]
+        rows = []
+        for flow_name, flow in [('legacy', legacy), ('single-pass', endpoint)]:
+            for case, email, password in cases:
+                # verify() and make_password() both hash through encode()
+                with mock.patch.object(hasher, 'encode', autospec=True, side_effect=hasher.encode) as encode:
+                    samples = timed(lambda: flow(email, password), args.attempts)
+                rows.append({
+                    'flow': flow_name,
+                    'case': case,
+                    'hashes/attempt': round(encode.call_count / args.attempts, 2),
+                    **summarize(samples),
+                })
+        print_table(rows, ['flow', 'case', 'hashes/attempt', 'mean_ms', 'p50_ms', 'p95_ms'])
+
+
+if __name__ == '__main__':
+    main()
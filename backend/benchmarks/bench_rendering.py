@@ -0,0 +1,81 @@
+"""Serialization time and bytes on the wire for list_questions and progress.
+
+    python -m benchmarks.bench_rendering [--repeat 200] [--questions 200] [--sessions 2000]
+
+Renders the real response bodies with DRF's JSONRenderer and the orjson
+renderer (checking they produce identical bytes), then reports the size and
+compression time of each body with gzip and, if installed, brotli at the
+levels the compression middleware uses.
+"""
+import argparse
+
+from benchmarks.common import print_table, setup_django, summarize, test_database, timed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=200)
+    parser.add_argument('--questions', type=int, default=200)
+    parser.add_argument('--sessions', type=int, default=2000)
+    parser.add_argument('--explanation-sentences', type=int, default=6)
+    args = parser.parse_args()
+
+    setup_django()
+    from rest_framework.renderers import JSONRenderer
+
+    from ai_tutor_sg import compression
+    from ai_tutor_sg.renderers import ORJSONRenderer
+    from benchmarks.dataset import seed
+    from quiz.archive import session_history, topic_progress
+    from quiz.models import Question, StudentProfile
+    from quiz.serializers import QuestionSerializer
+    from quiz.views import progress_payload
+
+    with test_database():
+        ids = seed(
+            students=5, questions=args.questions, sessions=args.sessions,
+            explanation_sentences=args.explanation_sentences,
+        )
+        student = StudentProfile.objects.get(id=ids['student_ids'][0])
+        payloads = {
+            'list_questions': QuestionSerializer(Question.objects.all()[:200], many=True).data,
+            'progress': progress_payload(student, topic_progress(student)),
+            'progress?history=full': progress_payload(
+                student, topic_progress(student), session_history(student, include_archived=True)
+            ),
+        }
+
+        render_rows, wire_rows = [], []
+        for name, data in payloads.items():
+            bodies = {}
+            for renderer in (JSONRenderer(), ORJSONRenderer()):
+                body = renderer.render(data)
+                bodies[type(renderer).__name__] = body
+                render_rows.append({
+                    'payload': name,
+                    'renderer': type(renderer).__name__,
+                    **summarize(timed(lambda: renderer.render(data), args.repeat)),
+                })
+            if len(set(bodies.values())) != 1:
+                raise SystemExit(f'Renderers disagree on {name}')
+
+            body = bodies['JSONRenderer']
+            encodings = ['gzip'] + (['br'] if compression.brotli is not None else [])
+            wire_rows.append({'payload': name, 'encoding': 'identity', 'bytes': len(body), 'ratio': 1.0})
+            for encoding in encodings:
+                compressed = compression.compress(body, encoding)
+                wire_rows.append({
+                    'payload': name,
+                    'encoding': encoding,
+                    'bytes': len(compressed),
+                    'ratio': round(len(compressed) / len(body), 3),
+                    **summarize(timed(lambda: compression.compress(body, encoding), args.repeat)),
+                })
+
+    print_table(render_rows, ['payload', 'renderer', 'mean_ms', 'p50_ms', 'p95_ms'])
+    print()
+    print_table(wire_rows, ['payload', 'encoding', 'bytes', 'ratio', 'mean_ms', 'p95_ms'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,177 @@
+"""Cold start time and the most expensive imports, per settings profile.
+
+    python -m benchmarks.bench_startup [--runs 7] [--top 15]
+                                       [--command "manage.py drain_outbox"]
+                                       [--profile web=ai_tutor_sg.settings ...]
+                                       [--max-ms batch=400] [--json out.json]
+
+Each profile starts fresh interpreters that run ``django.setup()``, or
+``--command`` when given, and reports the median and minimum wall time. One
+more run under ``python -X importtime`` gives the cumulative import cost
+per module and per top-level package. Only modules imported directly by
+the start-up code, or by Django's app loading, are listed, so the costs do
+not overlap.
+
+``--server`` also times gunicorn (three workers, web profile) from launch
+until it answers, with and without ``--preload``.
+
+``--json`` writes everything for CI to keep and compare. ``--max-ms
+profile=ms`` makes the script exit with status 1 when that profile's median
+is over budget.
+"""
+import argparse
+from collections import defaultdict
+import json
+import os
+import shlex
+import statistics
+import subprocess
+import sys
+import time
+
+from benchmarks.common import BACKEND_DIR, print_table
+
+PROFILES = {
+    'web': 'ai_tutor_sg.settings',
+    'batch': 'ai_tutor_sg.settings_batch',
+}
+SETUP = ['-c', 'import django; django.setup()']
+
+
+def parse_pair(value):
+    name, sep, rest = value.partition('=')
+    if not sep:
+        raise argparse.ArgumentTypeError(f'Expected name=value, got {value!r}')
+    return name, rest
+
+
+def run(args, settings_module, env=None):
+    """Wall time in seconds and stderr of one fresh interpreter"""
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, *args], cwd=BACKEND_DIR,
+        env={**os.environ, 'DJANGO_SETTINGS_MODULE': settings_module, **(env or {})},
+        stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True,
+    )
+    elapsed = time.perf_counter() - start
+    if result.returncode:
+        raise RuntimeError(f'{" ".join(args)} with {settings_module} failed:\n{result.stderr}')
+    return elapsed, result.stderr
+
+
+def parse_importtime(stderr):
+    """``[(module, cumulative_us, depth)]`` from ``-X importtime`` output"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        stripped = name.lstrip(' ')
+        rows.append((stripped, int(cumulative), (len(name) - len(stripped) - 1) // 2))
+    return rows
+
+
+def import_costs(rows, top):
+    """The ``top`` costliest top-level imports and the cost per package, in ms"""
+    roots = [(name, cumulative) for name, cumulative, depth in rows if depth == 0]
+    packages = defaultdict(int)
+    for name, cumulative in roots:
+        packages[name.split('.')[0]] += cumulative
+    return {
+        'total_ms': round(sum(cumulative for _, cumulative in roots) / 1000, 1),
+        'modules': [
+            {'module': name, 'ms': round(cumulative / 1000, 1)}
+            for name, cumulative in sorted(roots, key=lambda row: -row[1])[:top]
+        ],
+        'packages': [
+            {'package': name, 'ms': round(cumulative / 1000, 1)}
+            for name, cumulative in sorted(packages.items(), key=lambda item: -item[1])[:top]
+        ],
+    }
+
+
+def time_server(preload, runs):
+    """Median ms from launching gunicorn until every worker has answered a request"""
+    import tempfile
+    import urllib.request
+
+    from benchmarks.common import serve
+
+    tmp = tempfile.mkdtemp(prefix='bench-startup-')
+    env = {'DEBUG': 'False', 'DATABASE_URL': f'sqlite:///{tmp}/startup.sqlite3'}
+    subprocess.run([sys.executable, 'manage.py', 'migrate', '--noinput'], cwd=BACKEND_DIR,
+                   env={**os.environ, **env}, check=True, capture_output=True)
+    command = [sys.executable, '-m', 'gunicorn', 'ai_tutor_sg.wsgi:application',
+               '--workers', '3', '--bind', '127.0.0.1:{port}', *(['--preload'] if preload else [])]
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        with serve(command, env=env, timeout=60) as (base_url, _):
+            # Enough requests that each worker has served its first one
+            for _ in range(9):
+                urllib.request.urlopen(base_url + '/api/topics/?level=P4').read()
+            samples.append(time.perf_counter() - start)
+    return round(statistics.median(samples) * 1000, 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=7)
+    parser.add_argument('--top', type=int, default=15)
+    parser.add_argument('--command', default=None,
+                        help='Arguments to python to time instead of django.setup(), e.g. "manage.py check"')
+    parser.add_argument('--profile', type=parse_pair, action='append', default=None,
+                        help='name=settings.module; defaults to the web and batch profiles')
+    parser.add_argument('--max-ms', type=parse_pair, action='append', default=[],
+                        help='profile=milliseconds budget for the median start-up time')
+    parser.add_argument('--server', action='store_true', help='Also time gunicorn start-up with and without --preload')
+    parser.add_argument('--json', default=None, help='Write results to this file')
+    args = parser.parse_args()
+
+    command = shlex.split(args.command) if args.command else SETUP
+    profiles = dict(args.profile) if args.profile else PROFILES
+    report = {'command': command, 'runs': args.runs, 'profiles': {}}
+    rows = []
+    for name, settings_module in profiles.items():
+        run(command, settings_module)  # warm the OS file cache and bytecode
+        samples = [run(command, settings_module)[0] for _ in range(args.runs)]
+        _, stderr = run(['-X', 'importtime', *command], settings_module)
+        imports = import_costs(parse_importtime(stderr), args.top)
+        report['profiles'][name] = {
+            'settings': settings_module,
+            'median_ms': round(statistics.median(samples) * 1000, 1),
+            'min_ms': round(min(samples) * 1000, 1),
+            'imports': imports,
+        }
+        rows.append({'profile': name, 'settings': settings_module, **report['profiles'][name],
+                     'import_ms': imports['total_ms']})
+
+    print_table(rows, ['profile', 'settings', 'median_ms', 'min_ms', 'import_ms'])
+    for name, result in report['profiles'].items():
+        print(f'\n{name}: costliest imports')
+        print_table(result['imports']['modules'], ['module', 'ms'])
+
+    if args.server:
+        report['server'] = {
+            'gunicorn_ms': time_server(preload=False, runs=3),
+            'gunicorn_preload_ms': time_server(preload=True, runs=3),
+        }
+        print()
+        print_table([report['server']], ['gunicorn_ms', 'gunicorn_preload_ms'])
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    over = []
+    for name, budget in args.max_ms:
+        median = report['profiles'].get(name, {}).get('median_ms')
+        if median is not None and median > float(budget):
+            over.append(f'{name}: {median}ms > {budget}ms')
+    if over:
+        print('\nOver budget: ' + ', '.join(over))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
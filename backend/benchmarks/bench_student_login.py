@@ -0,0 +1,60 @@
+"""Join code guessing flood against student_login.
+
+Sends ``--attempts`` guesses from one client IP and reports, per response
+status, how many requests were answered and how many DB queries they ran.
+
+    python -m benchmarks.bench_student_login [--attempts 2000]
+"""
+import argparse
+from collections import defaultdict
+import random
+import string
+
+from benchmarks.common import print_table, setup_django, summarize, test_database
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--attempts', type=int, default=2000)
+    args = parser.parse_args()
+
+    setup_django()
+    import time
+
+    from django.db import connection
+    from django.test import Client
+    from django.test.utils import CaptureQueriesContext
+
+    from accounts.models import User
+    from quiz.models import StudentProfile
+
+    with test_database():
+        parent = User.objects.create_user(username='p@example.com', email='p@example.com', password='x', is_parent=True)
+        student = StudentProfile.objects.create(parent=parent, name='Alex', level='P4')
+        client = Client(REMOTE_ADDR='10.0.0.1')
+        rng = random.Random(0)
+
+        queries = defaultdict(int)
+        latencies = defaultdict(list)
+        for i in range(args.attempts):
+            code = student.join_code if i == 0 else ''.join(rng.choices(string.ascii_uppercase + string.digits, k=6))
+            with CaptureQueriesContext(connection) as captured:
+                start = time.perf_counter()
+                response = client.post('/api/auth/student-login/', {'join_code': code}, content_type='application/json')
+                latencies[response.status_code].append(time.perf_counter() - start)
+            queries[response.status_code] += len(captured.captured_queries)
+
+        rows = [
+            {
+                'status': code,
+                'requests': len(samples),
+                'queries/request': round(queries[code] / len(samples), 3),
+                **summarize(samples),
+            }
+            for code, samples in sorted(latencies.items())
+        ]
+        print_table(rows, ['status', 'requests', 'queries/request', 'p50_ms', 'p95_ms', 'p99_ms'])
+
+
+if __name__ == '__main__':
+    main()
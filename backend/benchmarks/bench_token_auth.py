@@ -0,0 +1,56 @@
+"""Authenticated request overhead: stock TokenAuthentication vs the cached class.
+
+    python -m benchmarks.bench_token_auth [--requests 2000]
+"""
+import argparse
+
+from benchmarks.common import print_table, setup_django, summarize, test_database, timed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, default=2000)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.core.cache import cache
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+    from rest_framework.authentication import TokenAuthentication
+    from rest_framework.authtoken.models import Token
+    from rest_framework.request import Request
+    from rest_framework.test import APIRequestFactory
+
+    from accounts.authentication import CachedTokenAuthentication
+    from accounts.models import User
+
+    with test_database():
+        user = User.objects.create_user(username='bench', email='bench@example.com', password='x', is_parent=True)
+        token = Token.objects.create(user=user)
+        factory = APIRequestFactory()
+
+        def authenticate(authenticator):
+            request = Request(factory.get('/', HTTP_AUTHORIZATION=f'Token {token.key}'))
+            authenticated_user, _ = authenticator.authenticate(request)
+            assert authenticated_user.pk == user.pk
+
+        rows = []
+        cases = [
+            ('TokenAuthentication', TokenAuthentication()),
+            ('CachedTokenAuthentication (warm)', CachedTokenAuthentication()),
+        ]
+        cache.clear()
+        authenticate(CachedTokenAuthentication())  # warm both tiers
+        for name, authenticator in cases:
+            with CaptureQueriesContext(connection) as queries:
+                samples = timed(lambda: authenticate(authenticator), args.requests)
+            rows.append({
+                'authenticator': name,
+                'queries/request': round(len(queries.captured_queries) / args.requests, 3),
+                **summarize(samples),
+            })
+        print_table(rows, ['authenticator', 'queries/request', 'mean_ms', 'p50_ms', 'p95_ms', 'p99_ms'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,195 @@
+"""Helpers shared by the benchmark scripts.
+
+Run benchmarks from the backend directory, e.g.::
+
+    python -m benchmarks.bench_token_auth
+
+Each script works against a throwaway test database, created the same way
+the test runner creates one, so db.sqlite3 is never touched.
+"""
+from contextlib import contextmanager
+import os
+import statistics
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def setup_django(settings_module='ai_tutor_sg.settings'):
+    if BACKEND_DIR not in sys.path:
+        sys.path.insert(0, BACKEND_DIR)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+    import django
+    django.setup()
+
+
+@contextmanager
+def test_database(verbosity=0):
+    """Create a fresh test database for the duration of the block"""
+    from django.db import connection
+    from django.test.utils import setup_test_environment, teardown_test_environment
+
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=verbosity, autoclobber=True, serialize=False)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=verbosity)
+        teardown_test_environment()
+
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(samples):
+    """Latency summary in milliseconds for a list of durations in seconds"""
+    return {
+        'count': len(samples),
+        'mean_ms': round(statistics.fmean(samples) * 1000, 3) if samples else 0.0,
+        'p50_ms': round(percentile(samples, 50) * 1000, 3),
+        'p95_ms': round(percentile(samples, 95) * 1000, 3),
+        'p99_ms': round(percentile(samples, 99) * 1000, 3),
+    }
+
+
+def timed(fn, repeat):
+    """Call ``fn`` ``repeat`` times and return the individual durations"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def print_table(rows, columns):
+    widths = [max(len(str(col)), *(len(str(row.get(col, ''))) for row in rows)) for col in columns]
+    print('  '.join(str(col).ljust(w) for col, w in zip(columns, widths)))
+    for row in rows:
+        print('  '.join(str(row.get(col, '')).ljust(w) for col, w in zip(columns, widths)))
+
+
+def free_port():
+    import socket
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+@contextmanager
+def serve(args, env=None, port=None, ready_path='/api/auth/health/', timeout=30):
+    """Run a server process from the backend directory until the block exits.
+
+    ``args`` may contain ``{port}``, which is replaced with ``port`` (a free
+    port by default). Yields the base URL once ``ready_path`` answers.
+    """
+    import subprocess
+    import urllib.request
+
+    port = port or free_port()
+    process = subprocess.Popen(
+        [arg.format(port=port) for arg in args],
+        cwd=BACKEND_DIR, env={**os.environ, **(env or {})},
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    base_url = f'http://127.0.0.1:{port}'
+    try:
+        deadline = time.monotonic() + timeout
+        while True:
+            if process.poll() is not None:
+                raise RuntimeError(f'Server exited with code {process.returncode}: {" ".join(args)}')
+            try:
+                with urllib.request.urlopen(base_url + ready_path, timeout=1):
+                    break
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise RuntimeError(f'Server did not become ready on {base_url}')
+                time.sleep(0.2)
+        yield base_url, process
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def process_tree_rss_mb(pid):
+    """Resident memory of ``pid`` and its descendants in MiB (Linux only)"""
+    total = 0
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        try:
+            with open(f'/proc/{current}/status') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        total += int(line.split()[1])
+            for task in os.listdir(f'/proc/{current}/task'):
+                with open(f'/proc/{current}/task/{task}/children') as f:
+                    pending.extend(int(child) for child in f.read().split())
+        except (FileNotFoundError, ProcessLookupError):
+            continue
+    return round(total / 1024, 1)
+
+
+def run_load(base_url, pick_request, clients=8, duration=10.0, seed=0, headers=None):
+    """Drive ``base_url`` with ``clients`` keep-alive connections for ``duration`` seconds.
+
+    ``pick_request(rng)`` returns ``(name, method, path, body)``; ``headers``
+    are sent with every request. Returns
+    ``{name: {'latencies': [...], 'statuses': {status: count}}}`` and the
+    elapsed wall time.
+    """
+    from collections import defaultdict
+    import http.client
+    import json
+    import random
+    import threading
+    from urllib.parse import urlparse
+
+    parsed = urlparse(base_url)
+    results = defaultdict(lambda: {'latencies': [], 'statuses': defaultdict(int)})
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def client(index):
+        rng = random.Random(seed * 1000 + index)
+        conn = http.client.HTTPConnection(parsed.hostname, parsed.port, timeout=30)
+        local = []
+        while time.monotonic() < deadline:
+            name, method, path, body = pick_request(rng)
+            request_headers = dict(headers or {})
+            if body is not None:
+                request_headers['Content-Type'] = 'application/json'
+            payload = json.dumps(body) if body is not None else None
+            start = time.perf_counter()
+            try:
+                conn.request(method, path, body=payload, headers=request_headers)
+                response = conn.getresponse()
+                response.read()
+                status = response.status
+            except (OSError, http.client.HTTPException):
+                conn.close()
+                conn = http.client.HTTPConnection(parsed.hostname, parsed.port, timeout=30)
+                status = 'error'
+            local.append((name, status, time.perf_counter() - start))
+        conn.close()
+        with lock:
+            for name, status, latency in local:
+                results[name]['latencies'].append(latency)
+                results[name]['statuses'][status] += 1
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, time.perf_counter() - started
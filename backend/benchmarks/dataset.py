@@ -0,0 +1,94 @@
+"""Deterministic benchmark dataset: parents, students, questions and sessions.
+
+``prepare(env)`` migrates, flushes and seeds the database an environment
+selects (for example a ``DATABASE_URL``) in a subprocess, so the benchmark
+driver never opens that database itself.
+"""
+import json
+import os
+import random
+import subprocess
+import sys
+
+LEVEL = 'P4'
+SUBJECT = 'Math'
+TOPICS = ['Fractions', 'Decimals', 'Addition', 'Subtraction']
+PARENT_EMAIL = 'bench-parent@example.com'
+
+
+def seed(students=50, questions=200, sessions=2000, explanation_sentences=1, seed=0):
+    """Populate the configured database; returns ids the load drivers need"""
+    from django.db import transaction
+
+    from accounts.models import User
+    from quiz.buckets import reconcile
+    from quiz.catalog import build_catalog
+    from quiz.models import Question, QuizSession, StudentProfile, Topic
+
+    rng = random.Random(seed)
+    with transaction.atomic():
+        parent = User.objects.create_user(
+            username=PARENT_EMAIL, email=PARENT_EMAIL, password='bench-password', is_parent=True
+        )
+        topics = [Topic.objects.create(name=name, subject=SUBJECT, level=LEVEL) for name in TOPICS]
+        Question.objects.bulk_create([
+            Question(
+                subject=SUBJECT, level=LEVEL, topic=topics[i % len(topics)],
+                question_text=f'What is {i} + {i + 7}?',
+                options=[str(2 * i + 7), str(2 * i + 6), str(2 * i + 8), str(2 * i + 17)],
+                correct_answer=str(2 * i + 7),
+                explanation=' '.join(
+                    [f'{i} + {i + 7} = {2 * i + 7}.']
+                    + [f'Step {n}: add the ones, then the tens, carrying where needed.' for n in range(1, explanation_sentences)]
+                ),
+                difficulty=rng.choice(['easy', 'medium', 'hard']),
+                source='bench',
+            )
+            for i in range(questions)
+        ])
+        question_ids = list(Question.objects.values_list('id', flat=True))
+        # bulk_create skips the signals that keep the question counters and catalog current
+        reconcile()
+        build_catalog()
+        children = [
+            StudentProfile.objects.create(parent=parent, name=f'Student {i}', level=LEVEL)
+            for i in range(students)
+        ]
+        QuizSession.objects.bulk_create([
+            QuizSession(
+                student=rng.choice(children), question_id=rng.choice(question_ids),
+                subject=SUBJECT, topic=rng.choice(TOPICS),
+                question_text='What is 1 + 1?', correct_answer='2', explanation='1 + 1 = 2',
+            )
+            for _ in range(sessions)
+        ], batch_size=500)
+    return {
+        'parent_email': PARENT_EMAIL,
+        'topic_ids': [topic.id for topic in topics],
+        'student_ids': [child.id for child in children],
+        'join_codes': [child.join_code for child in children],
+        'question_ids': question_ids,
+        'session_ids': list(QuizSession.objects.values_list('id', flat=True)),
+    }
+
+
+def prepare(env, **sizes):
+    """Migrate, flush and seed the database selected by ``env``; returns the seeded ids"""
+    from benchmarks.common import BACKEND_DIR
+
+    def run(*args):
+        return subprocess.run(
+            [sys.executable, *args], cwd=BACKEND_DIR, env={**os.environ, **env},
+            check=True, capture_output=True, text=True,
+        ).stdout
+
+    run('manage.py', 'migrate', '--noinput')
+    run('manage.py', 'flush', '--noinput')
+    return json.loads(run('-m', 'benchmarks.dataset', json.dumps(sizes)))
+
+
+if __name__ == '__main__':
+    from benchmarks.common import setup_django
+
+    setup_django()
+    print(json.dumps(seed(**json.loads(sys.argv[1] if len(sys.argv) > 1 else '{}'))))
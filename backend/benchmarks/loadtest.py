@@ -0,0 +1,228 @@
+"""Load test of the real API endpoints, with results that can be compared across commits.
+
+    python -m benchmarks.loadtest [--students 50] [--questions 200] [--sessions 2000]
+                                  [--clients 16] [--duration 20] [--warmup 3]
+                                  [--workers 3] [--server wsgi|asgi]
+                                  [--mix random_question=30,get_progress=20,...]
+                                  [--output loadtest.json] [--compare baseline.json]
+
+A throwaway SQLite database is migrated and seeded with the requested numbers
+of students, questions and past sessions, then served by gunicorn on
+127.0.0.1, so the run needs no network and never touches db.sqlite3.
+Concurrent keep-alive clients drive a weighted mix of endpoints. The mix is
+seeded, so two runs send the same request sequence. Requests made during
+the warm-up are discarded.
+
+Latency percentiles, throughput, status counts and the run configuration,
+including the git commit, are written to ``--output``, by default
+``loadtest-<commit>.json``. ``--compare`` prints the change in p50/p95/p99
+and throughput from an earlier results file.
+"""
+import argparse
+from datetime import datetime, timezone
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+
+from benchmarks.common import BACKEND_DIR, print_table, run_load, serve, summarize
+from benchmarks.dataset import LEVEL, PARENT_EMAIL, SUBJECT, TOPICS, prepare
+
+SERVERS = {
+    'wsgi': ['ai_tutor_sg.wsgi:application'],
+    'asgi': ['ai_tutor_sg.asgi:application', '-k', 'uvicorn_worker.UvicornWorker'],
+}
+
+# name: request builder taking (rng, seeded ids)
+ENDPOINTS = {
+    'health': lambda rng, ids: ('GET', '/api/auth/health/', None),
+    'random_question': lambda rng, ids: (
+        'GET', f'/api/questions/random/?subject={SUBJECT}&level={LEVEL}&topic={rng.choice(ids["topic_ids"])}', None,
+    ),
+    'list_questions': lambda rng, ids: ('GET', f'/api/questions/?subject={SUBJECT}&level={LEVEL}', None),
+    'get_topics': lambda rng, ids: ('GET', f'/api/topics/?subject={SUBJECT}&level={LEVEL}', None),
+    'get_progress': lambda rng, ids: ('GET', f'/api/progress/{rng.choice(ids["student_ids"])}/', None),
+    'get_children': lambda rng, ids: ('GET', '/api/auth/children/', None),
+    'start_quiz_session': lambda rng, ids: ('POST', '/api/start-session/', {
+        'subject': SUBJECT, 'level': LEVEL, 'topic': rng.choice(TOPICS),
+        'question_id': rng.choice(ids['question_ids']),
+    }),
+    'submit_answer': lambda rng, ids: ('POST', '/api/submit-answer/', {
+        'session_id': rng.choice(ids['session_ids']), 'user_answer': rng.choice(['1', '2']),
+    }),
+}
+
+# student_login is left out by default: its throttle answers 429 once the
+# load comes from one address, which measures the limiter, not the view
+DEFAULT_MIX = 'random_question=30,get_topics=15,list_questions=5,get_progress=20,get_children=5,' \
+              'start_quiz_session=10,submit_answer=10,health=5'
+
+
+def parse_mix(value):
+    """``name=weight,...`` as a list of (name, cumulative fraction)"""
+    weights = []
+    for item in value.split(','):
+        name, _, weight = item.partition('=')
+        name = name.strip()
+        if name not in ENDPOINTS:
+            raise argparse.ArgumentTypeError(f'Unknown endpoint {name!r}; choose from {", ".join(ENDPOINTS)}')
+        weights.append((name, float(weight or 1)))
+    total = sum(weight for _, weight in weights)
+    if total <= 0:
+        raise argparse.ArgumentTypeError('The mix needs a positive weight')
+    cumulative, running = [], 0.0
+    for name, weight in weights:
+        running += weight / total
+        cumulative.append((name, running))
+    return cumulative
+
+
+def mix_fractions(mix):
+    fractions, previous = {}, 0.0
+    for name, threshold in mix:
+        fractions[name] = round(threshold - previous, 4)
+        previous = threshold
+    return fractions
+
+
+def git_revision():
+    def git(*args):
+        try:
+            return subprocess.run(
+                ['git', *args], cwd=BACKEND_DIR, capture_output=True, text=True, check=True,
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    status = git('status', '--porcelain', '--untracked-files=no')
+    return {
+        'commit': git('rev-parse', 'HEAD'),
+        'subject': git('log', '-1', '--format=%s'),
+        'dirty': bool(status) if status is not None else None,
+    }
+
+
+def endpoint_rows(results, elapsed):
+    endpoints = {}
+    for name in sorted(results):
+        result = results[name]
+        latencies = result['latencies']
+        errors = sum(n for s, n in result['statuses'].items() if s == 'error' or s >= 500)
+        endpoints[name] = {
+            'req/s': round(len(latencies) / elapsed, 1),
+            'errors': errors,
+            'statuses': {str(s): n for s, n in sorted(result['statuses'].items(), key=str)},
+            **summarize(latencies),
+        }
+    all_latencies = [latency for result in results.values() for latency in result['latencies']]
+    overall = {
+        'req/s': round(len(all_latencies) / elapsed, 1),
+        'errors': sum(row['errors'] for row in endpoints.values()),
+        **summarize(all_latencies),
+    }
+    return endpoints, overall
+
+
+def print_comparison(report, baseline_path):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    rows = []
+    for name, current in [*report['endpoints'].items(), ('overall', report['overall'])]:
+        before = baseline['overall'] if name == 'overall' else baseline.get('endpoints', {}).get(name)
+        if not before:
+            continue
+        row = {'endpoint': name}
+        for key in ('req/s', 'p50_ms', 'p95_ms', 'p99_ms'):
+            change = (current[key] - before[key]) / before[key] * 100 if before[key] else 0.0
+            row[key] = f'{before[key]} -> {current[key]} ({change:+.1f}%)'
+        rows.append(row)
+    commit = (baseline.get('git') or {}).get('commit') or 'unknown'
+    print(f'\nAgainst {baseline_path} (commit {commit[:12]}):')
+    print_table(rows, ['endpoint', 'req/s', 'p50_ms', 'p95_ms', 'p99_ms'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--students', type=int, default=50)
+    parser.add_argument('--questions', type=int, default=200)
+    parser.add_argument('--sessions', type=int, default=2000)
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=20.0)
+    parser.add_argument('--warmup', type=float, default=3.0, help='Seconds of load discarded before measuring')
+    parser.add_argument('--workers', type=int, default=3)
+    parser.add_argument('--server', choices=SERVERS, default='wsgi')
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix(DEFAULT_MIX),
+                        help=f'Weighted endpoints (default {DEFAULT_MIX})')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default=None, help='Results file (default loadtest-<commit>.json)')
+    parser.add_argument('--compare', default=None, help='Earlier results file to compare against')
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix='loadtest-')
+    env = {
+        'DEBUG': 'False',
+        'DATABASE_URL': f'sqlite:///{tmp}/loadtest.sqlite3',
+        'ASYNC_VIEWS': str(args.server == 'asgi'),
+        # Keep per-request log lines from competing with the measured work
+        'LOG_SAMPLE_RATES': 'accounts=0,quiz=0',
+    }
+    sizes = {'students': args.students, 'questions': args.questions, 'sessions': args.sessions, 'seed': args.seed}
+    print(f'Seeding {args.students} students, {args.questions} questions, {args.sessions} sessions...')
+    ids = prepare(env, **sizes)
+
+    mix = args.mix
+
+    def pick(rng):
+        roll = rng.random()
+        for name, threshold in mix:
+            if roll < threshold:
+                break
+        return (name, *ENDPOINTS[name](rng, ids))
+
+    command = [sys.executable, '-m', 'gunicorn', *SERVERS[args.server],
+               '--workers', str(args.workers), '--bind', '127.0.0.1:{port}']
+    headers = {'X-User-Data': json.dumps({'email': PARENT_EMAIL})}
+    with serve(command, env=env) as (base_url, _):
+        if args.warmup > 0:
+            run_load(base_url, pick, clients=args.clients, duration=args.warmup, seed=args.seed + 1, headers=headers)
+        results, elapsed = run_load(
+            base_url, pick, clients=args.clients, duration=args.duration, seed=args.seed, headers=headers,
+        )
+    endpoints, overall = endpoint_rows(results, elapsed)
+
+    revision = git_revision()
+    report = {
+        'git': revision,
+        'started_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'host': {'python': platform.python_version(), 'platform': platform.platform(), 'cpus': os.cpu_count()},
+        'config': {
+            'server': args.server,
+            'workers': args.workers,
+            'clients': args.clients,
+            'duration': args.duration,
+            'warmup': args.warmup,
+            'mix': mix_fractions(mix),
+            'dataset': sizes,
+        },
+        'elapsed': round(elapsed, 3),
+        'endpoints': endpoints,
+        'overall': overall,
+    }
+
+    columns = ['endpoint', 'count', 'req/s', 'errors', 'p50_ms', 'p95_ms', 'p99_ms']
+    print_table(
+        [{'endpoint': name, **row} for name, row in [*endpoints.items(), ('overall', overall)]],
+        columns,
+    )
+    output = args.output or f'loadtest-{(revision["commit"] or "unknown")[:12]}{"-dirty" if revision["dirty"] else ""}.json'
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f'\nWrote {output}')
+    if args.compare:
+        print_comparison(report, args.compare)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import Topic, Question, StudentProfile, QuizSession
+from .generators import regenerate
+from .models import Topic, Question, StudentProfile, QuizSession, ArchivedQuizSession, ArchivedTopicRollup
 
 
 @admin.register(Topic)
@@ -11,9 +12,25 @@ class TopicAdmin(admin.ModelAdmin):
 
 @admin.register(Question)
 class QuestionAdmin(admin.ModelAdmin):
-    list_display = ("id", "subject", "level", "topic", "difficulty", "source", "flag_count")
-    list_filter = ("subject", "level", "difficulty", "source")
+    list_display = ("id", "subject", "level", "topic", "difficulty", "source", "flag_count", "is_hidden", "stats_p_value", "stats_discrimination")
+    list_filter = ("subject", "level", "difficulty", "source", "is_hidden")
+    actions = ("hide_questions", "show_questions")
     search_fields = ("question_text", "source_id")
+    readonly_fields = ("stats_responses", "stats_p_value", "stats_discrimination", "stats_distractors", "stats_median_latency", "stats_updated_at")
+
+    def _set_hidden(self, queryset, hidden):
+        # Saved one by one, since QuerySet.update would skip the signals keeping the question counts
+        for question in queryset.exclude(is_hidden=hidden):
+            question.is_hidden = hidden
+            question.save(update_fields=["is_hidden"])
+
+    @admin.action(description="Hide selected questions from students")
+    def hide_questions(self, request, queryset):
+        self._set_hidden(queryset, True)
+
+    @admin.action(description="Show selected questions to students again")
+    def show_questions(self, request, queryset):
+        self._set_hidden(queryset, False)
 
 
 @admin.register(StudentProfile)
@@ -23,12 +40,45 @@ class StudentProfileAdmin(admin.ModelAdmin):
     search_fields = ("name", "join_code", "parent__email")
 
 
+class GeneratedQuestionMixin:
+    """Shows the question of generated sessions, which store only ``(generator, generator_seed)``"""
+    readonly_fields = ("question_shown", "explanation_shown")
+
+    def _generated(self, obj, field):
+        value = getattr(obj, field)
+        if value or not obj.generator or obj.generator_seed is None:
+            return value
+        question = regenerate(obj.generator, obj.generator_seed)
+        return question[field] if question else value
+
+    @admin.display(description="Question")
+    def question_shown(self, obj):
+        return self._generated(obj, "question_text")
+
+    @admin.display(description="Explanation")
+    def explanation_shown(self, obj):
+        return self._generated(obj, "explanation")
+
+
 @admin.register(QuizSession)
-class QuizSessionAdmin(admin.ModelAdmin):
-    list_display = ("student", "subject", "topic", "is_correct", "created_at")
+class QuizSessionAdmin(GeneratedQuestionMixin, admin.ModelAdmin):
+    list_display = ("student", "subject", "topic", "question_shown", "is_correct", "created_at")
     list_filter = ("subject", "topic", "is_correct")
     search_fields = ("student__name", "topic")
 
 from django.contrib import admin
 
 # Register your models here.
+
+
+@admin.register(ArchivedQuizSession)
+class ArchivedQuizSessionAdmin(GeneratedQuestionMixin, admin.ModelAdmin):
+    list_display = ("student", "subject", "topic", "question_shown", "is_correct", "created_at", "archive_month")
+    list_filter = ("archive_month", "subject", "is_correct")
+    search_fields = ("student__name", "topic")
+
+
+@admin.register(ArchivedTopicRollup)
+class ArchivedTopicRollupAdmin(admin.ModelAdmin):
+    list_display = ("student", "topic", "total_questions", "correct_answers", "last_attempt")
+    search_fields = ("student__name", "topic")
@@ -0,0 +1,172 @@
+"""Archival of old QuizSession rows.
+
+Answered sessions older than a cutoff are copied into ``ArchivedQuizSession``
+(keyed by the month they were created in) and deleted from the hot table in batches.
+Each batch also folds its rows into ``ArchivedTopicRollup`` inside the same
+transaction, so an interrupted run can simply be restarted and progress
+totals never double count or lose a session. Archived rows keep every
+field, so question statistics (quiz/stats.py) keep reading them too.
+Unanswered sessions stay in the hot table, so a late ``submit_answer`` still
+finds them.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Max, Q
+from django.utils import timezone
+
+from .generators import fill_generated
+from .models import ArchivedQuizSession, ArchivedTopicRollup, QuizSession
+
+SESSION_FIELDS = [
+    'student_id', 'question_id', 'subject', 'topic', 'question_text', 'user_answer',
+    'correct_answer', 'explanation', 'is_correct', 'generator', 'generator_seed', 'created_at', 'answered_at',
+]
+
+
+def archive_cutoff(older_than_days=None):
+    if older_than_days is None:
+        older_than_days = settings.QUIZ_SESSION_ARCHIVE_AFTER_DAYS
+    return timezone.now() - timedelta(days=older_than_days)
+
+
+def _month(dt):
+    return dt.date().replace(day=1)
+
+
+def _archive_batch(cutoff, batch_size):
+    """Move one batch of the oldest answered sessions; returns the number of rows moved"""
+    with transaction.atomic():
+        sessions = list(
+            QuizSession.objects.select_for_update()
+            .filter(created_at__lt=cutoff, answered_at__isnull=False)
+            .order_by('id')[:batch_size]
+        )
+        if not sessions:
+            return 0
+
+        ArchivedQuizSession.objects.bulk_create([
+            ArchivedQuizSession(
+                original_id=s.id,
+                archive_month=_month(s.created_at),
+                **{field: getattr(s, field) for field in SESSION_FIELDS}
+            )
+            for s in sessions
+        ])
+
+        totals = {}
+        for s in sessions:
+            total, correct, last = totals.get((s.student_id, s.topic), (0, 0, None))
+            last = s.created_at if last is None or s.created_at > last else last
+            totals[(s.student_id, s.topic)] = (total + 1, correct + int(s.is_correct), last)
+
+        existing = {
+            (r.student_id, r.topic): r
+            for r in ArchivedTopicRollup.objects.select_for_update().filter(
+                student_id__in={student_id for student_id, _ in totals},
+                topic__in={topic for _, topic in totals},
+            )
+        }
+        to_update, to_create = [], []
+        for key, (total, correct, last) in totals.items():
+            rollup = existing.get(key)
+            if rollup is None:
+                to_create.append(ArchivedTopicRollup(
+                    student_id=key[0], topic=key[1],
+                    total_questions=total, correct_answers=correct, last_attempt=last,
+                ))
+                continue
+            rollup.total_questions += total
+            rollup.correct_answers += correct
+            if rollup.last_attempt is None or last > rollup.last_attempt:
+                rollup.last_attempt = last
+            to_update.append(rollup)
+        ArchivedTopicRollup.objects.bulk_create(to_create)
+        ArchivedTopicRollup.objects.bulk_update(
+            to_update, ['total_questions', 'correct_answers', 'last_attempt']
+        )
+
+        QuizSession.objects.filter(id__in=[s.id for s in sessions]).delete()
+        return len(sessions)
+
+
+def archive_sessions(older_than_days=None, batch_size=1000, max_batches=None):
+    """Archive answered sessions older than ``older_than_days``; returns the number moved.
+
+    Every batch commits on its own, so the job can be stopped at any point
+    and resumed later from where it left off.
+    """
+    cutoff = archive_cutoff(older_than_days)
+    moved = 0
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        count = _archive_batch(cutoff, batch_size)
+        if not count:
+            break
+        moved += count
+        batches += 1
+    return moved
+
+
+def _hot_progress(student):
+    return (
+        QuizSession.objects.filter(student=student)
+        .values('topic')
+        .annotate(
+            total=Count('id'),
+            correct=Count('id', filter=Q(is_correct=True)),
+            last=Max('created_at'),
+        )
+        .order_by()
+    )
+
+
+def _merge_progress(hot, rollups):
+    merged = {}
+    for row in hot:
+        merged[row['topic']] = [row['total'], row['correct'], row['last']]
+    for rollup in rollups:
+        entry = merged.setdefault(rollup.topic, [0, 0, None])
+        entry[0] += rollup.total_questions
+        entry[1] += rollup.correct_answers
+        if entry[2] is None or (rollup.last_attempt and rollup.last_attempt > entry[2]):
+            entry[2] = rollup.last_attempt
+    return merged
+
+
+def topic_progress(student):
+    """Per-topic totals for a student across hot sessions and archived rollups"""
+    return _merge_progress(_hot_progress(student), ArchivedTopicRollup.objects.filter(student=student))
+
+
+async def atopic_progress(student):
+    hot = [row async for row in _hot_progress(student)]
+    rollups = [rollup async for rollup in ArchivedTopicRollup.objects.filter(student=student)]
+    return _merge_progress(hot, rollups)
+
+
+HISTORY_FIELDS = ['subject', 'topic', 'question_text', 'user_answer', 'correct_answer', 'is_correct', 'created_at']
+# Read alongside, so generated questions get their text back; fill_generated drops them again
+GENERATOR_FIELDS = ['generator', 'generator_seed']
+
+
+def session_history(student, include_archived=False):
+    """A student's sessions, newest first, optionally merged with archived rows"""
+    fields = HISTORY_FIELDS + GENERATOR_FIELDS
+    history = list(QuizSession.objects.filter(student=student).values(*fields))
+    if include_archived:
+        history.extend(ArchivedQuizSession.objects.filter(student=student).values(*fields))
+    history.sort(key=lambda row: row['created_at'], reverse=True)
+    return fill_generated(history)
+
+
+async def asession_history(student, include_archived=False):
+    fields = HISTORY_FIELDS + GENERATOR_FIELDS
+    history = [row async for row in QuizSession.objects.filter(student=student).values(*fields)]
+    if include_archived:
+        history.extend([
+            row async for row in ArchivedQuizSession.objects.filter(student=student).values(*fields)
+        ])
+    history.sort(key=lambda row: row['created_at'], reverse=True)
+    return fill_generated(history)
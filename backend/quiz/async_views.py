@@ -0,0 +1,88 @@
+"""Async versions of the hot read endpoints, served when ``ASYNC_VIEWS`` is on.
+
+They return the same bodies as their DRF counterparts in ``views`` but use
+the async ORM, so under an ASGI server a slow query parks a coroutine rather
+than a whole worker.
+"""
+import random
+
+from django.http import JsonResponse
+from django.views.decorators.cache import never_cache
+from django.views.decorators.http import require_GET
+from rest_framework.utils.encoders import JSONEncoder
+
+from accounts.identity import aparent_from_user_data
+from ai_tutor_sg.routers import read_replica
+from .archive import asession_history, atopic_progress
+from .buckets import acount_available
+from .catalog import acurrent_catalog
+from .conditional import (
+    conditional, catalog_etag, catalog_last_modified, catalog_state, prefetch_catalog_state,
+    prefetch_progress_state, progress_etag, progress_last_modified,
+)
+from .models import StudentProfile
+from .purge import public_cache, topic_keys
+from .serializers import QuestionSerializer
+from .snapshot import acurrent_snapshot
+from .views import progress_payload, question_queryset, snapshot_filters, topic_names
+
+
+def _json(data, status=200):
+    # DRF's encoder, so dates serialise exactly as the sync views render them
+    return JsonResponse(data, status=status, encoder=JSONEncoder)
+
+
+@never_cache
+@require_GET
+@read_replica
+async def random_question(request):
+    snapshot = await acurrent_snapshot()
+    if snapshot is not None:
+        question = snapshot.sample(random, *snapshot_filters(request.GET))
+        if question is None:
+            return _json({'error': 'No questions found'}, status=404)
+        return _json(question)
+    count = await acount_available(request.GET)
+    if count == 0:
+        return _json({'error': 'No questions found'}, status=404)
+    qs = question_queryset(request.GET)
+    question = await qs.order_by('id')[random.randrange(count):].afirst() or await qs.order_by('?').afirst()
+    if question is None:
+        return _json({'error': 'No questions found'}, status=404)
+    return _json(QuestionSerializer(question).data)
+
+
+@require_GET
+@read_replica
+@public_cache(topic_keys)
+@conditional(
+    etag_func=catalog_etag, last_modified_func=catalog_last_modified,
+    private=False, prefetch=prefetch_catalog_state,
+)
+async def get_topics(request):
+    level = request.GET.get('level', '')
+    if not level:
+        return _json({'error': 'Level is required'}, status=400)
+    # prefetch_catalog_state has read the version, so catalog_state does not query
+    _, names = await acurrent_catalog(catalog_state(request).version)
+    return _json({'topics': topic_names(names, request.GET.get('subject', 'Math'), level)})
+
+
+@require_GET
+@read_replica
+@conditional(
+    etag_func=progress_etag, last_modified_func=progress_last_modified,
+    prefetch=prefetch_progress_state,
+)
+async def get_progress(request, student_id):
+    student = await StudentProfile.objects.filter(id=student_id).afirst()
+    if student is None:
+        return _json({'error': 'Student not found'}, status=404)
+    parent = await aparent_from_user_data(request)
+    if not parent or student.parent_id != parent.pk:
+        return _json({'error': 'Permission denied'}, status=403)
+
+    history = None
+    if request.GET.get('history') == 'full':
+        history = await asession_history(student, include_archived=True)
+    return _json(progress_payload(student, await atopic_progress(student), history))
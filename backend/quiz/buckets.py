@@ -0,0 +1,133 @@
+"""Denormalised counts of visible questions per (subject, level, topic, difficulty).
+
+Question saves and deletes adjust the affected ``QuestionBucketCount`` rows
+from ``post_save``/``post_delete`` handlers, inside the transaction
+``Question.save`` and ``Question.delete`` open, so the counters move
+together with the rows they count. Availability checks and the topic
+catalog then read a handful of counter rows and never count ``Question``.
+
+Bulk writes that skip model signals (``bulk_create``, ``QuerySet.update``)
+leave the counters off; ``manage.py reconcile_question_counts`` recounts
+them one (subject, level) at a time.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+
+from .models import Question, QuestionBucketCount
+
+NO_TOPIC = 0
+# Question fields a bucket is keyed by, plus whether it is counted at all
+QUESTION_FIELDS = ('subject', 'level', 'topic_id', 'difficulty', 'is_hidden')
+
+
+def bucket_of(values):
+    """``(subject, level, topic_id, difficulty)`` for a question's field values, None when hidden"""
+    if values['is_hidden']:
+        return None
+    return values['subject'], values['level'], values['topic_id'] or NO_TOPIC, values['difficulty']
+
+
+def _filter(key):
+    subject, level, topic_id, difficulty = key
+    return {'subject': subject, 'level': level, 'topic_id': topic_id, 'difficulty': difficulty}
+
+
+def adjust(key, delta):
+    """Add ``delta`` to the bucket ``key``, creating it on first use"""
+    if key is None or not delta:
+        return
+    rows = QuestionBucketCount.objects.filter(**_filter(key))
+    if rows.update(count=F('count') + delta):
+        return
+    try:
+        with transaction.atomic():
+            QuestionBucketCount.objects.create(**_filter(key), count=max(delta, 0))
+    except IntegrityError:
+        # Created concurrently since the update above
+        rows.update(count=F('count') + delta)
+
+
+def move(previous, current):
+    """Account for a question whose bucket went from ``previous`` to ``current`` (either may be None)"""
+    if previous == current:
+        return
+    adjust(previous, -1)
+    adjust(current, 1)
+
+
+def merge_topic(topic_id):
+    """Fold a deleted topic's buckets into the no-topic ones, as its questions were"""
+    for row in QuestionBucketCount.objects.filter(topic_id=topic_id):
+        adjust((row.subject, row.level, NO_TOPIC, row.difficulty), row.count)
+        row.delete()
+
+
+def _buckets(params):
+    """Bucket rows matching the ``subject``, ``level``, ``topic`` and ``difficulty`` query params"""
+    rows = QuestionBucketCount.objects.filter(count__gt=0)
+    for field in ('subject', 'level', 'difficulty'):
+        if params.get(field):
+            rows = rows.filter(**{field: params[field]})
+    topic = params.get('topic')
+    if topic:
+        rows = rows.filter(topic_id=int(topic)) if topic.isdigit() else rows.none()
+    return rows
+
+
+def count_available(params):
+    return _buckets(params).aggregate(total=Sum('count'))['total'] or 0
+
+
+async def acount_available(params):
+    return (await _buckets(params).aaggregate(total=Sum('count')))['total'] or 0
+
+
+def availability(params):
+    """Visible question counts matching ``params``, in total and per difficulty and topic"""
+    difficulty, topics = {}, {}
+    for topic_id, value, count in _buckets(params).values_list('topic_id', 'difficulty', 'count'):
+        difficulty[value] = difficulty.get(value, 0) + count
+        if topic_id != NO_TOPIC:
+            topics[str(topic_id)] = topics.get(str(topic_id), 0) + count
+    return {'available': sum(difficulty.values()), 'difficulty': difficulty, 'topics': topics}
+
+
+def reconcile(dry_run=False):
+    """Recount every bucket, one (subject, level) per transaction.
+
+    Returns ``(checked, fixed, topic_ids)``: the buckets compared, those
+    whose count was wrong, and the topics among them.
+    """
+    groups = set(QuestionBucketCount.objects.values_list('subject', 'level').distinct())
+    groups |= set(Question.objects.values_list('subject', 'level').distinct())
+    checked, fixed, topic_ids = 0, 0, set()
+    for subject, level in sorted(groups):
+        with transaction.atomic():
+            # Locked first, so concurrent adjustments wait and land on top of the recount
+            stored = {
+                (row.subject, row.level, row.topic_id, row.difficulty): row
+                for row in QuestionBucketCount.objects.select_for_update().filter(subject=subject, level=level)
+            }
+            actual = {
+                (subject, level, topic_id or NO_TOPIC, difficulty): count
+                for topic_id, difficulty, count in (
+                    Question.objects.filter(subject=subject, level=level, is_hidden=False)
+                    .values_list('topic_id', 'difficulty').annotate(count=Count('id')).order_by()
+                )
+            }
+            for key in stored.keys() | actual.keys():
+                checked += 1
+                row, count = stored.get(key), actual.get(key, 0)
+                if (row.count if row else 0) == count:
+                    continue
+                fixed += 1
+                topic_ids.add(key[2])
+                if dry_run:
+                    continue
+                if row is None:
+                    QuestionBucketCount.objects.create(**_filter(key), count=count)
+                else:
+                    row.count = count
+                    row.save(update_fields=['count'])
+    topic_ids.discard(NO_TOPIC)
+    return checked, fixed, topic_ids
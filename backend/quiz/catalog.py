@@ -0,0 +1,184 @@
+"""Precomputed subject -> level -> topic tree with question counts.
+
+The tree lives in the single ``TopicCatalog`` row::
+
+    {"questions": 120, "subjects": [
+        {"subject": "Math", "questions": 120, "levels": [
+            {"level": "P4", "questions": 40, "topics": [
+                {"id": 3, "name": "Fractions", "questions": 25,
+                 "difficulty": {"easy": 5, "medium": 15, "hard": 5}},
+                ...]}]}]}
+
+Only active topics are listed, in choice order for subjects and levels and
+by name for topics; counts leave out hidden questions and come from
+``QuestionBucketCount`` (see quiz/buckets.py). Saving or deleting a question
+or topic recounts just the affected topics and patches the row in the same
+transaction, so readers never run the GROUP BY. Each process keeps the tree it last read, together
+with the ``CatalogVersion`` it reflects, and only reads the row again once
+that version has changed. ``manage.py build_topic_catalog`` rebuilds the
+whole tree after bulk changes that bypass model signals.
+"""
+from contextlib import contextmanager
+import threading
+
+from asgiref.sync import sync_to_async
+
+from django.db import transaction
+
+from ai_tutor_sg.caching import TTLCache
+from .models import CatalogVersion, QuestionBucketCount, Topic, TopicCatalog
+
+SUBJECT_ORDER = [value for value, _ in Topic.SUBJECT_CHOICES]
+LEVEL_ORDER = [value for value, _ in Topic.LEVEL_CHOICES]
+
+# (version, tree, {(subject, level): [topic names]}) of the last tree read
+_local = TTLCache(maxsize=1, ttl=24 * 3600)
+
+
+def _order(values, value):
+    return (values.index(value), '') if value in values else (len(values), value)
+
+
+def _entries(topics):
+    """Flat catalog entries for ``topics``, with their visible question counts from the buckets"""
+    topics = list(topics)
+    difficulty = {topic.id: {} for topic in topics}
+    rows = QuestionBucketCount.objects.filter(topic_id__in=difficulty, count__gt=0)
+    for topic_id, value, count in rows.values_list('topic_id', 'difficulty', 'count'):
+        difficulty[topic_id][value] = count
+    return [
+        {
+            'id': topic.id, 'name': topic.name, 'subject': topic.subject, 'level': topic.level,
+            'questions': sum(difficulty[topic.id].values()), 'difficulty': difficulty[topic.id],
+        }
+        for topic in topics
+    ]
+
+
+def _tree(entries):
+    subjects = {}
+    for entry in entries:
+        subjects.setdefault(entry['subject'], {}).setdefault(entry['level'], []).append(entry)
+    tree = []
+    for subject in sorted(subjects, key=lambda value: _order(SUBJECT_ORDER, value)):
+        levels = []
+        for level in sorted(subjects[subject], key=lambda value: _order(LEVEL_ORDER, value)):
+            topics = [
+                {key: entry[key] for key in ('id', 'name', 'questions', 'difficulty')}
+                for entry in sorted(subjects[subject][level], key=lambda entry: (entry['name'], entry['id']))
+            ]
+            levels.append({'level': level, 'questions': sum(topic['questions'] for topic in topics), 'topics': topics})
+        tree.append({'subject': subject, 'questions': sum(level['questions'] for level in levels), 'levels': levels})
+    return {'questions': sum(subject['questions'] for subject in tree), 'subjects': tree}
+
+
+def _flatten(tree):
+    return [
+        {'subject': subject['subject'], 'level': level['level'], **topic}
+        for subject in tree.get('subjects', [])
+        for level in subject['levels']
+        for topic in level['topics']
+    ]
+
+
+def build_catalog():
+    """Recount every active topic and store the whole tree; returns it"""
+    with transaction.atomic():
+        version = CatalogVersion.current().version
+        tree = _tree(_entries(Topic.objects.filter(is_active=True)))
+        TopicCatalog.objects.update_or_create(pk=1, defaults={'catalog_version': version, 'data': tree})
+    return tree
+
+
+def refresh_topics(topic_ids):
+    """Recount ``topic_ids`` and patch them into the stored tree.
+
+    The row is stamped with the current ``CatalogVersion`` even when no topic
+    is given (e.g. for a question without one), so readers holding the tree
+    know it is still current.
+    """
+    topic_ids = {topic_id for topic_id in topic_ids if topic_id is not None}
+    with transaction.atomic():
+        # Serialises concurrent patches, so none is lost
+        row = TopicCatalog.objects.select_for_update().filter(pk=1).first()
+        if row is None:
+            build_catalog()
+            return
+        if topic_ids:
+            entries = [entry for entry in _flatten(row.data) if entry['id'] not in topic_ids]
+            entries += _entries(Topic.objects.filter(id__in=topic_ids, is_active=True))
+            row.data = _tree(entries)
+        row.catalog_version = CatalogVersion.current().version
+        row.save(update_fields=['data', 'catalog_version', 'updated_at'])
+
+
+_deferred = threading.local()
+
+
+@contextmanager
+def refresh_deferred():
+    """Collect topic refreshes requested inside the block into one at the end"""
+    depth = getattr(_deferred, 'depth', 0)
+    if depth == 0:
+        _deferred.topic_ids = None
+    _deferred.depth = depth + 1
+    try:
+        yield
+    finally:
+        _deferred.depth = depth
+        if depth == 0 and _deferred.topic_ids is not None:
+            topic_ids, _deferred.topic_ids = _deferred.topic_ids, None
+            refresh_topics(topic_ids)
+
+
+def schedule_refresh(topic_ids):
+    """Refresh ``topic_ids`` now, or at the end of the enclosing ``refresh_deferred`` block"""
+    if getattr(_deferred, 'depth', 0):
+        _deferred.topic_ids = (_deferred.topic_ids or set()) | set(topic_ids)
+        return
+    refresh_topics(topic_ids)
+
+
+def _remember(version, tree):
+    names = {
+        (subject['subject'], level['level']): [topic['name'] for topic in level['topics']]
+        for subject in tree.get('subjects', [])
+        for level in subject['levels']
+    }
+    _local.set('catalog', (version, tree, names))
+    return tree, names
+
+
+def _cached(version):
+    cached = _local.get('catalog')
+    if cached is not None and cached[0] == version:
+        return cached[1], cached[2]
+    return None
+
+
+def current_catalog(version=None):
+    """``(tree, names)``: the stored tree and its topic names per ``(subject, level)``.
+
+    ``version`` is the ``CatalogVersion`` the caller has already read; the
+    stored row is only read when the tree this process holds is for another
+    version.
+    """
+    if version is None:
+        version = CatalogVersion.current().version
+    cached = _cached(version)
+    if cached is not None:
+        return cached
+    row = TopicCatalog.objects.filter(pk=1).values_list('catalog_version', 'data').first()
+    if row is None:
+        return _remember(version, build_catalog())
+    return _remember(*row)
+
+
+async def acurrent_catalog(version):
+    cached = _cached(version)
+    if cached is not None:
+        return cached
+    row = await TopicCatalog.objects.filter(pk=1).values_list('catalog_version', 'data').afirst()
+    if row is None:
+        return _remember(version, await sync_to_async(build_catalog)())
+    return _remember(*row)
@@ -0,0 +1,123 @@
+"""Conditional GET support for endpoints the dashboards poll.
+
+Validators come from cheap version counters (``StudentProfile.progress_version``
+and ``CatalogVersion``), so a matching ``If-None-Match`` is answered with
+``304 Not Modified`` before the view runs any aggregation.
+"""
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+
+from django.db.models import Count, Max, Sum
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.views.decorators.http import condition
+
+from accounts.identity import aparent_from_user_data, parent_from_user_data
+from .models import CatalogVersion, StudentProfile
+
+
+def conditional(etag_func=None, last_modified_func=None, private=True, prefetch=None):
+    """Django's ``condition`` plus headers telling clients to always revalidate.
+
+    Private responses depend on the parent named by X-User-Data, so they vary
+    on it and shared browsers do not revalidate another user's copy.
+    For async views, ``prefetch`` is awaited first and memoises the state the
+    validators read on the request, so they run without blocking queries.
+    """
+    def decorator(view):
+        conditional_view = condition(etag_func=etag_func, last_modified_func=last_modified_func)(view)
+
+        def patch(response):
+            if private:
+                patch_cache_control(response, private=True, no_cache=True)
+                patch_vary_headers(response, ('X-User-Data',))
+            else:
+                patch_cache_control(response, no_cache=True)
+            return response
+
+        if iscoroutinefunction(view):
+            @wraps(conditional_view)
+            async def async_wrapper(request, *args, **kwargs):
+                if prefetch is not None:
+                    await prefetch(request, *args, **kwargs)
+                return patch(await conditional_view(request, *args, **kwargs))
+            return async_wrapper
+
+        @wraps(conditional_view)
+        def wrapper(request, *args, **kwargs):
+            return patch(conditional_view(request, *args, **kwargs))
+        return wrapper
+    return decorator
+
+
+def _progress_query(student_id):
+    return StudentProfile.objects.filter(id=student_id).values_list('progress_version', 'updated_at', 'parent_id')
+
+
+def _progress_state(request, student_id):
+    """``(version, updated_at, parent_id)`` when the requesting parent owns the student, else None.
+
+    Validators run before the view's permission check, so other callers get
+    none and cannot learn from 304s or ETags that the student exists or changed.
+    """
+    if not hasattr(request, '_progress_state'):
+        request._progress_state = _progress_query(student_id).first()
+    state = request._progress_state
+    if state is None:
+        return None
+    parent = parent_from_user_data(request)
+    return state if parent is not None and parent.pk == state[2] else None
+
+
+async def prefetch_progress_state(request, student_id):
+    if not hasattr(request, '_progress_state'):
+        request._progress_state = await _progress_query(student_id).afirst()
+    # Memoised on the request, so the validators resolve the parent without blocking
+    await aparent_from_user_data(request)
+
+
+def progress_etag(request, student_id):
+    state = _progress_state(request, student_id)
+    if state is None:
+        return None
+    version, updated_at, parent_id = state
+    history = 'full' if request.GET.get('history') == 'full' else 'summary'
+    return f'"progress-{parent_id}-{student_id}-{version}-{updated_at.timestamp():.6f}-{history}"'
+
+
+def progress_last_modified(request, student_id):
+    state = _progress_state(request, student_id)
+    return state[1] if state else None
+
+
+def children_etag(request):
+    parent = parent_from_user_data(request)
+    if parent is None:
+        return '"children-none"'
+    state = StudentProfile.objects.filter(parent=parent).aggregate(
+        count=Count('id'), last_id=Max('id'), versions=Sum('progress_version'), latest=Max('updated_at'),
+    )
+    latest = state['latest'].timestamp() if state['latest'] else 0
+    return (
+        f'"children-{parent.pk}-{state["count"]}-{state["last_id"] or 0}-'
+        f'{state["versions"] or 0}-{latest:.6f}"'
+    )
+
+
+def catalog_state(request):
+    if not hasattr(request, '_catalog_state'):
+        request._catalog_state = CatalogVersion.current()
+    return request._catalog_state
+
+
+async def prefetch_catalog_state(request):
+    if not hasattr(request, '_catalog_state'):
+        request._catalog_state = await CatalogVersion.acurrent()
+
+
+def catalog_etag(request):
+    return f'"catalog-{catalog_state(request).version}"'
+
+
+def catalog_last_modified(request):
+    return catalog_state(request).updated_at
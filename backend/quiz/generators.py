@@ -0,0 +1,351 @@
+"""Parametric question generators for unlimited arithmetic practice.
+
+Each ``Generator`` covers one (subject, level, topic) and turns 63-bit seeds
+into questions: a stem, the correct answer, three distractors built from
+common mistakes, and a worked explanation. Parameters are derived from the
+seed with SplitMix64, one independent stream per parameter, and all the
+arithmetic runs on NumPy arrays, so a batch of thousands of seeds costs one
+pass of vector operations plus the string formatting.
+
+The same seed always gives the same question, so a quiz session only stores
+``(generator key, seed)`` and regenerates the text when it is shown again.
+That makes the output part of the stored data: any change to what a
+generator produces for a given seed needs a new key (``...v2``), with the
+old class kept for the sessions that reference it.
+"""
+from fractions import Fraction
+import secrets
+
+import numpy as np
+
+SEED_BITS = 63  # seeds are stored in a signed BigIntegerField
+SEED_MASK = np.uint64((1 << SEED_BITS) - 1)
+_GOLDEN = np.uint64(0x9E3779B97F4A7C15)
+_STREAM = np.uint64(0xD1B54A32D192ED03)
+
+NAMES = ['Aisha', 'Ben', 'Chloe', 'Darren', 'Mei Ling', 'Farid', 'Priya', 'Wei Jie']
+ITEMS = ['stickers', 'marbles', 'stamps', 'beads', 'cards', 'shells']
+
+
+def splitmix64(x):
+    """SplitMix64 finaliser of the uint64 array ``x``, elementwise"""
+    with np.errstate(over='ignore'):
+        z = x + _GOLDEN
+        z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return z ^ (z >> np.uint64(31))
+
+
+def new_seed():
+    return secrets.randbits(SEED_BITS)
+
+
+def batch_seeds(seed, count):
+    """``count`` distinct-looking seeds derived from one, for batch generation"""
+    with np.errstate(over='ignore'):
+        base = np.uint64(seed) + np.arange(count, dtype=np.uint64)
+    return splitmix64(base) & SEED_MASK
+
+
+def draw(seeds, stream, low, high):
+    """Integers in ``[low, high]`` (scalars or arrays), independent per ``stream``"""
+    with np.errstate(over='ignore'):
+        bits = splitmix64(seeds + np.uint64(stream + 1) * _STREAM)
+    span = (np.asarray(high, dtype=np.int64) - low + 1).astype(np.uint64)
+    return np.asarray(low, dtype=np.int64) + (bits % span).astype(np.int64)
+
+
+def fraction_text(numerator, denominator):
+    value = Fraction(int(numerator), int(denominator))
+    return str(value.numerator) if value.denominator == 1 else f'{value.numerator}/{value.denominator}'
+
+
+def tenths_text(tenths):
+    return f'{tenths // 10}.{tenths % 10}'
+
+
+class Generator:
+    """Base class; subclasses set the class attributes and implement ``compute`` and ``render``"""
+
+    key = ''  # '<subject>.<level>.<topic>.<kind>.v<n>'
+    subject = 'Math'
+    level = ''
+    topic = ''
+    difficulty = 'medium'
+
+    def compute(self, seeds):
+        """Parameters and results for every seed, as ``{name: int64 array}``"""
+        raise NotImplementedError
+
+    def render(self, row):
+        """``(question_text, correct_answer, distractor candidates, explanation)`` for one item.
+
+        ``row`` maps the names ``compute`` returned to plain ints. Candidates
+        are in order of preference; the first three distinct from each other
+        and from the answer become the wrong options.
+        """
+        raise NotImplementedError
+
+    def generate(self, seeds):
+        """Questions for ``seeds`` (any iterable of ints below 2**63), in order"""
+        seeds = np.asarray(seeds, dtype=np.uint64) & SEED_MASK
+        columns = {name: values.tolist() for name, values in self.compute(seeds).items()}
+        # Where the correct answer goes among the four options
+        positions = draw(seeds, 99, 0, 3).tolist()
+        questions = []
+        for i, seed in enumerate(seeds.tolist()):
+            stem, answer, candidates, explanation = self.render({name: values[i] for name, values in columns.items()})
+            distractors = list(dict.fromkeys(c for c in candidates if c != answer))[:3]
+            if len(distractors) < 3:
+                raise ValueError(f'{self.key} produced too few distractors for seed {seed}')
+            options = distractors[:positions[i]] + [answer] + distractors[positions[i]:]
+            questions.append({
+                'generator': self.key,
+                'seed': seed,
+                'subject': self.subject,
+                'level': self.level,
+                'topic': self.topic,
+                'difficulty': self.difficulty,
+                'question_text': stem,
+                'options': options,
+                'correct_answer': answer,
+                'explanation': explanation,
+            })
+        return questions
+
+    def generate_one(self, seed):
+        return self.generate([seed])[0]
+
+
+GENERATORS = {}
+_by_topic = {}
+
+
+def register(cls):
+    generator = cls()
+    GENERATORS[cls.key] = generator
+    _by_topic[(cls.subject, cls.level, cls.topic)] = generator
+    return cls
+
+
+def generator_for(subject, level, topic):
+    """The generator for a (subject, level, topic), or None"""
+    return _by_topic.get((subject, level, topic))
+
+
+def regenerate(key, seed):
+    """The question a session stored as ``(key, seed)``, or None for unknown keys"""
+    generator = GENERATORS.get(key)
+    return generator.generate_one(seed) if generator else None
+
+
+def fill_generated(rows):
+    """Put the regenerated ``question_text`` into session rows that only stored a seed.
+
+    Rows are dicts with ``generator`` and ``generator_seed``; those two keys
+    are removed. Rows are grouped by generator, so each runs one batch.
+    """
+    pending = {}
+    for row in rows:
+        key, seed = row.pop('generator', ''), row.pop('generator_seed', None)
+        if key and seed is not None and not row.get('question_text'):
+            pending.setdefault(key, []).append((row, seed))
+    for key, items in pending.items():
+        generator = GENERATORS.get(key)
+        if generator is None:
+            continue
+        for (row, _), question in zip(items, generator.generate([seed for _, seed in items])):
+            row['question_text'] = question['question_text']
+    return rows
+
+
+@register
+class AdditionP3(Generator):
+    key = 'math.p3.addition.v1'
+    level = 'P3'
+    topic = 'Addition'
+
+    def compute(self, seeds):
+        a = draw(seeds, 0, 11, 88)
+        b = draw(seeds, 1, 11, 99 - a)
+        ones = a % 10 + b % 10
+        return {
+            'a': a, 'b': b, 'sum': a + b, 'ones': ones, 'carry': ones // 10,
+            'tens': a // 10 + b // 10 + ones // 10,
+            'story': draw(seeds, 2, 0, 1), 'name': draw(seeds, 3, 0, len(NAMES) - 1),
+            'item': draw(seeds, 4, 0, len(ITEMS) - 1),
+        }
+
+    def render(self, row):
+        a, b, total = row['a'], row['b'], row['sum']
+        if row['story']:
+            name, item = NAMES[row['name']], ITEMS[row['item']]
+            stem = f'{name} has {a} {item}. {name} gets {b} more. How many {item} does {name} have now?'
+        else:
+            stem = f'What is {a} + {b}?'
+        if row['carry']:
+            steps = (f"Add the ones: {a % 10} + {b % 10} = {row['ones']}. Write {row['ones'] % 10}, carry 1. "
+                     f"Add the tens: {a // 10} + {b // 10} + 1 = {row['tens']}.")
+        else:
+            steps = f"Add the ones: {a % 10} + {b % 10} = {row['ones']}. Add the tens: {a // 10} + {b // 10} = {row['tens']}."
+        candidates = [
+            total - 10 if row['carry'] else total + 10,  # carry forgotten / added twice
+            total + 1, total - 1, total + 10, total - 10, total + 2,
+        ]
+        return stem, str(total), [str(c) for c in candidates if c > 0], f'{steps} Answer: {total}.'
+
+
+@register
+class SubtractionP3(Generator):
+    key = 'math.p3.subtraction.v1'
+    level = 'P3'
+    topic = 'Subtraction'
+
+    def compute(self, seeds):
+        a = draw(seeds, 0, 21, 99)
+        b = draw(seeds, 1, 10, a - 1)
+        borrow = (a % 10 < b % 10).astype(np.int64)
+        # Subtracting the smaller ones digit from the larger is the classic borrow mistake
+        no_borrow = np.abs(a % 10 - b % 10) + 10 * (a // 10 - b // 10)
+        return {'a': a, 'b': b, 'difference': a - b, 'borrow': borrow, 'no_borrow': no_borrow}
+
+    def render(self, row):
+        a, b, difference = row['a'], row['b'], row['difference']
+        if row['borrow']:
+            steps = (f"{a % 10} is smaller than {b % 10}, so borrow 1 ten: {a % 10 + 10} - {b % 10} = {a % 10 + 10 - b % 10}. "
+                     f"Then the tens: {a // 10 - 1} - {b // 10} = {a // 10 - 1 - b // 10}.")
+        else:
+            steps = f"Subtract the ones: {a % 10} - {b % 10} = {a % 10 - b % 10}. Then the tens: {a // 10} - {b // 10} = {a // 10 - b // 10}."
+        candidates = [row['no_borrow'], difference + 10, difference - 1, difference + 1, a + b, difference + 2]
+        explanation = f'{steps} Answer: {difference}. Check by adding: {difference} + {b} = {a}.'
+        return f'What is {a} - {b}?', str(difference), [str(c) for c in candidates if c >= 0], explanation
+
+
+class _FractionGenerator(Generator):
+    """Two proper fractions ``a/b`` and ``c/d`` with different denominators"""
+
+    max_denominator = 12
+
+    def fractions(self, seeds):
+        b = draw(seeds, 0, 2, self.max_denominator)
+        # d != b: shift the draw past b
+        d = draw(seeds, 1, 2, self.max_denominator - 1)
+        d = d + (d >= b)
+        a = draw(seeds, 2, 1, b - 1)
+        c = draw(seeds, 3, 1, d - 1)
+        return a, b, c, d
+
+    @staticmethod
+    def wrong(answer, pairs):
+        """Candidate texts for ``(numerator, denominator)`` pairs not equal in value to ``answer``"""
+        return [
+            fraction_text(n, d) for n, d in pairs
+            if n > 0 and d > 0 and Fraction(n, d) != answer
+        ]
+
+
+@register
+class FractionAdditionP4(_FractionGenerator):
+    key = 'math.p4.fractions.add.v1'
+    level = 'P4'
+    topic = 'Fractions'
+
+    def compute(self, seeds):
+        a, b, c, d = self.fractions(seeds)
+        common = np.lcm(b, d)
+        x, y = a * (common // b), c * (common // d)
+        return {'a': a, 'b': b, 'c': c, 'd': d, 'common': common, 'x': x, 'y': y}
+
+    def render(self, row):
+        a, b, c, d, common, x, y = (row[k] for k in ('a', 'b', 'c', 'd', 'common', 'x', 'y'))
+        answer = Fraction(x + y, common)
+        explanation = (f'Find a common denominator ({common}): {a}/{b} = {x}/{common} and {c}/{d} = {y}/{common}. '
+                       f'Add the numerators: {x} + {y} = {x + y}, so the answer is {x + y}/{common}')
+        if answer.denominator != common:
+            explanation += f', which simplifies to {fraction_text(x + y, common)}'
+        candidates = self.wrong(answer, [
+            (a + c, b + d),  # added tops and bottoms
+            (a + c, common),  # added numerators without converting
+            (a * c, b * d),
+            (x + y + 1, common), (x + y - 1, common), (x + y, common + 1),
+        ])
+        return f'What is {a}/{b} + {c}/{d}?', fraction_text(x + y, common), candidates, explanation + '.'
+
+
+@register
+class DecimalAdditionP4(Generator):
+    key = 'math.p4.decimals.add.v1'
+    level = 'P4'
+    topic = 'Decimals'
+    difficulty = 'easy'
+
+    def compute(self, seeds):
+        # Tenths, so no floating point is involved
+        a = draw(seeds, 0, 1, 99)
+        b = draw(seeds, 1, 1, 99)
+        return {'a': a, 'b': b, 'sum': a + b, 'carry': (a % 10 + b % 10 >= 10).astype(np.int64)}
+
+    def render(self, row):
+        a, b, total = row['a'], row['b'], row['sum']
+        explanation = (f'Line up the decimal points and add the tenths: {a % 10} + {b % 10} = {a % 10 + b % 10}'
+                       + (', write the last digit and carry 1 to the ones' if row['carry'] else '')
+                       + f'. Then add the ones. {tenths_text(a)} + {tenths_text(b)} = {tenths_text(total)}.')
+        candidates = [
+            total - 10 if row['carry'] else total + 10,
+            total + 1, total - 1, total + 10, abs(a - b), total + 2,
+        ]
+        return (f'What is {tenths_text(a)} + {tenths_text(b)}?', tenths_text(total),
+                [tenths_text(c) for c in candidates if c > 0], explanation)
+
+
+@register
+class FractionMultiplicationP5(_FractionGenerator):
+    key = 'math.p5.fractions.multiply.v1'
+    level = 'P5'
+    topic = 'Fractions'
+    max_denominator = 10
+
+    def compute(self, seeds):
+        a, b, c, d = self.fractions(seeds)
+        return {'a': a, 'b': b, 'c': c, 'd': d}
+
+    def render(self, row):
+        a, b, c, d = row['a'], row['b'], row['c'], row['d']
+        answer = Fraction(a * c, b * d)
+        explanation = f'Multiply the numerators: {a}×{c}={a * c}. Multiply the denominators: {b}×{d}={b * d}.'
+        if answer.denominator != b * d:
+            explanation += f' Simplify: {a * c}/{b * d} = {fraction_text(a * c, b * d)}.'
+        candidates = self.wrong(answer, [
+            (a + c, b + d),
+            (a * d, b * c),  # flipped the second fraction as if dividing
+            (a * c, b + d),
+            (a + c, b * d), (a * c + 1, b * d), (a * c, b * d + 1),
+        ])
+        return f'What is {a}/{b} × {c}/{d}?', fraction_text(a * c, b * d), candidates, explanation
+
+
+@register
+class FractionDivisionP6(_FractionGenerator):
+    key = 'math.p6.fractions.divide.v1'
+    level = 'P6'
+    topic = 'Fractions'
+    max_denominator = 10
+    difficulty = 'hard'
+
+    def compute(self, seeds):
+        a, b, c, d = self.fractions(seeds)
+        return {'a': a, 'b': b, 'c': c, 'd': d}
+
+    def render(self, row):
+        a, b, c, d = row['a'], row['b'], row['c'], row['d']
+        answer = Fraction(a * d, b * c)
+        explanation = (f'To divide by a fraction, multiply by its reciprocal: '
+                       f'{a}/{b} × {d}/{c} = {a * d}/{b * c}')
+        if answer.denominator != b * c:
+            explanation += f' = {fraction_text(a * d, b * c)}'
+        candidates = self.wrong(answer, [
+            (a * c, b * d),  # multiplied instead
+            (b * c, a * d),  # flipped the first fraction instead
+            (a * d, b * c + 1), (a * d + 1, b * c), (a + d, b + c),
+        ])
+        return f'What is {a}/{b} ÷ {c}/{d}?', fraction_text(a * d, b * c), candidates, explanation + '.'
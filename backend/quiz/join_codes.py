@@ -0,0 +1,99 @@
+"""Collision-free join code allocation.
+
+A join code is a keyed pseudorandom permutation of a counter: a four-round
+Feistel network over 32-bit values, keyed from ``JOIN_CODE_SECRET`` and
+cycle-walked into the 36**6 code space. Distinct counter values always map to
+distinct codes, so no uniqueness query is needed, and without the key the
+sequence of issued codes cannot be predicted.
+
+Counter values are reserved from ``JoinCodeCounter`` in blocks of
+``JOIN_CODE_BLOCK_SIZE``, so most allocations do not touch the database.
+"""
+import hashlib
+import string
+import threading
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import JoinCodeCounter
+
+ALPHABET = string.ascii_uppercase + string.digits
+CODE_LENGTH = 6
+CODE_SPACE = len(ALPHABET) ** CODE_LENGTH
+ROUNDS = 4
+
+
+class JoinCodesExhausted(Exception):
+    pass
+
+
+def _round_keys(secret):
+    return [
+        hashlib.sha256(f'join-code:{i}:{secret}'.encode('utf-8')).digest()[:16]
+        for i in range(ROUNDS)
+    ]
+
+
+def _feistel(value, keys):
+    left, right = value >> 16, value & 0xFFFF
+    for key in keys:
+        digest = hashlib.blake2b(right.to_bytes(2, 'big'), key=key, digest_size=2).digest()
+        left, right = right, left ^ int.from_bytes(digest, 'big')
+    return (left << 16) | right
+
+
+def permute(index, secret=None):
+    """Map ``index`` in ``[0, CODE_SPACE)`` to a unique value in the same range"""
+    if not 0 <= index < CODE_SPACE:
+        raise JoinCodesExhausted(f'Join code index {index} is outside the code space')
+    keys = _round_keys(settings.JOIN_CODE_SECRET if secret is None else secret)
+    value = _feistel(index, keys)
+    # Cycle-walk: re-encrypt until the value lands back inside the code space
+    while value >= CODE_SPACE:
+        value = _feistel(value, keys)
+    return value
+
+
+def encode(value):
+    chars = []
+    for _ in range(CODE_LENGTH):
+        value, digit = divmod(value, len(ALPHABET))
+        chars.append(ALPHABET[digit])
+    return ''.join(reversed(chars))
+
+
+class JoinCodeAllocator:
+    """Hands out codes from counter blocks reserved in the database"""
+
+    def __init__(self, block_size=None):
+        self.block_size = block_size
+        self._next = 0
+        self._end = 0
+        self._lock = threading.Lock()
+
+    def _reserve(self):
+        block_size = self.block_size or settings.JOIN_CODE_BLOCK_SIZE
+        with transaction.atomic():
+            counter, _ = JoinCodeCounter.objects.select_for_update().get_or_create(pk=1)
+            start = counter.next_value
+            if start >= CODE_SPACE:
+                raise JoinCodesExhausted('All join codes have been issued')
+            counter.next_value = min(start + block_size, CODE_SPACE)
+            counter.save(update_fields=['next_value'])
+        self._next, self._end = start, counter.next_value
+
+    def allocate(self):
+        with self._lock:
+            if self._next >= self._end:
+                self._reserve()
+            index = self._next
+            self._next += 1
+        return encode(permute(index))
+
+
+allocator = JoinCodeAllocator()
+
+
+def allocate_join_code():
+    return allocator.allocate()
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from quiz.archive import archive_sessions
+
+
+class Command(BaseCommand):
+    help = 'Move old answered quiz sessions into the monthly archive in resumable batches'
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than-days', type=int, default=None,
+                            help='Archive answered sessions older than this (default: QUIZ_SESSION_ARCHIVE_AFTER_DAYS)')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--max-batches', type=int, default=None, help='Stop after this many batches')
+
+    def handle(self, *args, **opts):
+        moved = archive_sessions(
+            older_than_days=opts['older_than_days'],
+            batch_size=opts['batch_size'],
+            max_batches=opts['max_batches'],
+        )
+        self.stdout.write(self.style.SUCCESS(f'Archived {moved} quiz sessions'))
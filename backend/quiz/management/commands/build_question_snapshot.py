@@ -0,0 +1,23 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from quiz.snapshot import build_snapshot
+
+
+class Command(BaseCommand):
+    help = 'Write the memory-mapped question bank snapshot the workers sample from'
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default=None, help='Output file (defaults to QUESTION_SNAPSHOT_PATH)')
+        parser.add_argument('--force', action='store_true',
+                            help='Replace the file even if it is at the current catalog version or later')
+
+    def handle(self, *args, **opts):
+        path = opts['path'] or settings.QUESTION_SNAPSHOT_PATH
+        if not path:
+            raise CommandError('Set QUESTION_SNAPSHOT_PATH or pass --path')
+        count = build_snapshot(path, force=opts['force'])
+        if count is None:
+            self.stdout.write(self.style.SUCCESS(f'{path} is already up to date'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Wrote {count} questions to {path}'))
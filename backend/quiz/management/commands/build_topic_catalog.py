@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from quiz.catalog import build_catalog
+
+
+class Command(BaseCommand):
+    help = 'Recount every topic and store the catalog tree served by /api/catalog/ and /api/topics/'
+    requires_system_checks = []
+
+    def handle(self, *args, **opts):
+        tree = build_catalog()
+        topics = sum(len(level['topics']) for subject in tree['subjects'] for level in subject['levels'])
+        self.stdout.write(self.style.SUCCESS(f'Catalog has {topics} topics and {tree["questions"]} questions'))
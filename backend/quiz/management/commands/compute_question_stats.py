@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from quiz.stats import refresh_question_stats
+
+
+class Command(BaseCommand):
+    help = 'Compute per-question p-value, discrimination, distractor and latency statistics'
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='Recompute every answered question, not only stale ones')
+        parser.add_argument('--question', type=int, action='append', dest='questions', help='Question id to refresh (repeatable)')
+        parser.add_argument('--chunk-size', type=int, default=5000, help='Sessions fetched per query')
+
+    def handle(self, *args, **opts):
+        updated = refresh_question_stats(
+            question_ids=opts['questions'],
+            full=opts['full'],
+            chunk_size=opts['chunk_size'],
+        )
+        self.stdout.write(self.style.SUCCESS(f'Updated statistics for {updated} questions'))
@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand, CommandError
+from quiz.generators import GENERATORS, batch_seeds, generator_for, new_seed
+import json
+
+
+class Command(BaseCommand):
+    help = 'Generate questions from a parametric generator as JSONL, ready for import_questions'
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('--generator', help='Generator key, e.g. math.p4.fractions.add.v1')
+        parser.add_argument('--subject', default='Math')
+        parser.add_argument('--level', help='Level, with --topic, instead of --generator')
+        parser.add_argument('--topic', help='Topic name, with --level, instead of --generator')
+        parser.add_argument('--count', type=int, default=100)
+        parser.add_argument('--seed', type=int, default=None, help='Base seed; the same seed gives the same questions')
+        parser.add_argument('--output', default='-', help='Path to write, or - for stdout')
+        parser.add_argument('--list', action='store_true', help='List the registered generators and exit')
+
+    def handle(self, *args, **opts):
+        if opts['list']:
+            for key, generator in GENERATORS.items():
+                self.stdout.write(f'{key}\t{generator.subject} {generator.level} {generator.topic}')
+            return
+
+        if opts['generator']:
+            generator = GENERATORS.get(opts['generator'])
+        elif opts['level'] and opts['topic']:
+            generator = generator_for(opts['subject'], opts['level'], opts['topic'])
+        else:
+            raise CommandError('Pass --generator, or --level and --topic')
+        if generator is None:
+            raise CommandError('No generator found; see --list')
+
+        seed = opts['seed'] if opts['seed'] is not None else new_seed()
+        if not 0 <= seed < 2 ** 63:
+            raise CommandError('--seed must be between 0 and 2**63 - 1')
+        questions = generator.generate(batch_seeds(seed, opts['count']))
+
+        out = self.stdout if opts['output'] == '-' else open(opts['output'], 'w', encoding='utf-8')
+        try:
+            for q in questions:
+                out.write(json.dumps({
+                    'id': f"{q['generator']}:{q['seed']}",
+                    'question_text': q['question_text'],
+                    'options': q['options'],
+                    'correct_answer': q['correct_answer'],
+                    'explanation': q['explanation'],
+                    'difficulty': q['difficulty'],
+                }, ensure_ascii=False) + '\n')
+        finally:
+            if out is not self.stdout:
+                out.close()
+        # stderr, so stdout stays valid JSONL
+        self.stderr.write(self.style.SUCCESS(f'Generated {len(questions)} questions with {generator.key} (seed {seed})'))
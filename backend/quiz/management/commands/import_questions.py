@@ -1,5 +1,8 @@
 from django.core.management.base import BaseCommand
 from quiz.models import Question, Topic
+from quiz.catalog import refresh_deferred
+from quiz.purge import purge_deferred
+from quiz.snapshot import rebuild_deferred
 import json
 import hashlib
 
@@ -10,6 +13,7 @@ def hash_q(stem: str, answer: str) -> str:
 
 class Command(BaseCommand):
     help = 'Import questions from JSONL/JSON files into the Question bank'
+    requires_system_checks = []
 
     def add_arguments(self, parser):
         parser.add_argument('--file', required=True, help='Path to a JSON or JSONL file')
@@ -68,26 +72,29 @@ class Command(BaseCommand):
             )
             created_count += 1
 
-        # detect JSON vs JSONL
-        if path.endswith('.jsonl') or path.endswith('.jsonlines'):
-            with open(path, 'r', encoding='utf-8') as f:
-                for line in f:
-                    line = line.strip()
-                    if not line:
-                        continue
-                    try:
-                        obj = json.loads(line)
-                        upsert(obj)
-                    except Exception:
-                        continue
-        else:
-            with open(path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                if isinstance(data, dict) and 'data' in data:
-                    data = data['data']
-                if isinstance(data, list):
-                    for obj in data:
-                        upsert(obj)
+        # Recount the catalog, rebuild the question snapshot and then purge
+        # cached lists once, after the whole file
+        with purge_deferred(), rebuild_deferred(), refresh_deferred():
+            # detect JSON vs JSONL
+            if path.endswith('.jsonl') or path.endswith('.jsonlines'):
+                with open(path, 'r', encoding='utf-8') as f:
+                    for line in f:
+                        line = line.strip()
+                        if not line:
+                            continue
+                        try:
+                            obj = json.loads(line)
+                            upsert(obj)
+                        except Exception:
+                            continue
+            else:
+                with open(path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                    if isinstance(data, dict) and 'data' in data:
+                        data = data['data']
+                    if isinstance(data, list):
+                        for obj in data:
+                            upsert(obj)
 
         self.stdout.write(self.style.SUCCESS(f'Imported ~{created_count} questions into bank'))
 
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from quiz.buckets import reconcile
+from quiz.catalog import refresh_topics
+
+
+class Command(BaseCommand):
+    help = 'Recount the per-bucket question counters and fix any drift, one subject and level at a time'
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only report the buckets that are off')
+
+    def handle(self, *args, **opts):
+        checked, fixed, topic_ids = reconcile(dry_run=opts['dry_run'])
+        if fixed and not opts['dry_run']:
+            # The catalog counts are read from the buckets
+            refresh_topics(topic_ids)
+        verb = 'would fix' if opts['dry_run'] else 'fixed'
+        self.stdout.write(self.style.SUCCESS(f'Checked {checked} buckets, {verb} {fixed}'))
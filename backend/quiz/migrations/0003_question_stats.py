@@ -0,0 +1,58 @@
+# Generated by Django 5.2.7 on 2026-10-19 14:48
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0002_question'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='question',
+            name='stats_discrimination',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='stats_distractors',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='stats_median_latency',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='stats_p_value',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='stats_responses',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='stats_updated_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='quizsession',
+            name='answered_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='quizsession',
+            name='question',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='sessions', to='quiz.question'),
+        ),
+        migrations.AddIndex(
+            model_name='quizsession',
+            index=models.Index(fields=['question', 'answered_at'], name='quiz_quizse_questio_afd37a_idx'),
+        ),
+    ]
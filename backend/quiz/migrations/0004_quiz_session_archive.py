@@ -0,0 +1,77 @@
+# Generated by Django 5.2.7 on 2026-10-19 14:49
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0003_question_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedQuizSession',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('original_id', models.BigIntegerField(unique=True)),
+                ('archive_month', models.DateField(db_index=True)),
+                ('subject', models.CharField(choices=[('Math', 'Mathematics'), ('Science', 'Science'), ('English', 'English')], max_length=20)),
+                ('topic', models.CharField(max_length=100)),
+                ('question_text', models.TextField()),
+                ('user_answer', models.CharField(blank=True, max_length=500, null=True)),
+                ('correct_answer', models.CharField(max_length=500)),
+                ('explanation', models.TextField()),
+                ('is_correct', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField()),
+                ('answered_at', models.DateTimeField(blank=True, null=True)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Archived Quiz Session',
+                'verbose_name_plural': 'Archived Quiz Sessions',
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedTopicRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('topic', models.CharField(max_length=100)),
+                ('total_questions', models.IntegerField(default=0)),
+                ('correct_answers', models.IntegerField(default=0)),
+                ('last_attempt', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Archived Topic Rollup',
+                'verbose_name_plural': 'Archived Topic Rollups',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='quizsession',
+            index=models.Index(fields=['created_at'], name='quiz_quizse_created_40bac8_idx'),
+        ),
+        migrations.AddField(
+            model_name='archivedquizsession',
+            name='question',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='quiz.question'),
+        ),
+        migrations.AddField(
+            model_name='archivedquizsession',
+            name='student',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_sessions', to='quiz.studentprofile'),
+        ),
+        migrations.AddField(
+            model_name='archivedtopicrollup',
+            name='student',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_rollups', to='quiz.studentprofile'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedquizsession',
+            index=models.Index(fields=['student', 'created_at'], name='quiz_archiv_student_5aafa2_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='archivedtopicrollup',
+            unique_together={('student', 'topic')},
+        ),
+    ]
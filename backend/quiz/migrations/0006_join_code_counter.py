@@ -0,0 +1,20 @@
+# Generated by Django 5.2.7 on 2026-10-19 14:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0005_conditional_get_versions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='JoinCodeCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('next_value', models.BigIntegerField(default=0)),
+            ],
+        ),
+    ]
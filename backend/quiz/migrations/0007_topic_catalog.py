@@ -0,0 +1,22 @@
+# Generated by Django 5.2.7 on 2026-10-19 15:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0006_join_code_counter'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TopicCatalog',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('catalog_version', models.BigIntegerField(default=0)),
+                ('data', models.JSONField(default=dict)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.7 on 2026-10-19 15:32
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def count_questions(apps, schema_editor):
+    """Fill the bucket counters from the questions already in the bank"""
+    Question = apps.get_model('quiz', 'Question')
+    QuestionBucketCount = apps.get_model('quiz', 'QuestionBucketCount')
+    db_alias = schema_editor.connection.alias
+    rows = (
+        Question.objects.using(db_alias)
+        .values_list('subject', 'level', 'topic_id', 'difficulty').annotate(count=Count('id')).order_by()
+    )
+    QuestionBucketCount.objects.using(db_alias).bulk_create([
+        QuestionBucketCount(subject=subject, level=level, topic_id=topic_id or 0, difficulty=difficulty, count=count)
+        for subject, level, topic_id, difficulty, count in rows
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0007_topic_catalog'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='question',
+            name='is_hidden',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.CreateModel(
+            name='QuestionBucketCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('subject', models.CharField(max_length=20)),
+                ('level', models.CharField(max_length=10)),
+                ('topic_id', models.BigIntegerField(default=0)),
+                ('difficulty', models.CharField(max_length=20)),
+                ('count', models.IntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('subject', 'level', 'topic_id', 'difficulty'), name='unique_question_bucket')],
+            },
+        ),
+        migrations.RunPython(count_questions, migrations.RunPython.noop),
+    ]
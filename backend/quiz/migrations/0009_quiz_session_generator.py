@@ -0,0 +1,33 @@
+# Generated by Django 5.2.7 on 2026-10-19 15:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0008_question_bucket_counts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivedquizsession',
+            name='generator',
+            field=models.CharField(blank=True, default='', max_length=50),
+        ),
+        migrations.AddField(
+            model_name='archivedquizsession',
+            name='generator_seed',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='quizsession',
+            name='generator',
+            field=models.CharField(blank=True, default='', max_length=50),
+        ),
+        migrations.AddField(
+            model_name='quizsession',
+            name='generator_seed',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -1,7 +1,6 @@
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.utils import timezone
 from accounts.models import User
-import random
-import string
 
 
 class StudentProfile(models.Model):
@@ -22,20 +21,29 @@ class StudentProfile(models.Model):
     join_code = models.CharField(max_length=6, unique=True)
     xp = models.IntegerField(default=0)
     streak = models.IntegerField(default=0)
+    progress_version = models.IntegerField(default=0)  # bumped on every answer, used as an ETag
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     def save(self, *args, **kwargs):
-        if not self.join_code:
+        if self.join_code:
+            return super().save(*args, **kwargs)
+        # Allocated codes never collide with each other, but codes issued
+        # before the allocator existed (or under another secret) still can
+        for attempt in range(5):
             self.join_code = self.generate_join_code()
-        super().save(*args, **kwargs)
+            try:
+                with transaction.atomic():
+                    return super().save(*args, **kwargs)
+            except IntegrityError:
+                if attempt == 4 or not StudentProfile.objects.filter(join_code=self.join_code).exists():
+                    self.join_code = ''
+                    raise
 
     def generate_join_code(self):
-        """Generate a unique 6-character join code"""
-        while True:
-            code = ''.join(random.choices(string.ascii_uppercase + string.digits, k=6))
-            if not StudentProfile.objects.filter(join_code=code).exists():
-                return code
+        """Allocate a unique 6-character join code"""
+        from .join_codes import allocate_join_code
+        return allocate_join_code()
 
     def __str__(self):
         return f"{self.name} ({self.level})"
@@ -45,6 +53,14 @@ class StudentProfile(models.Model):
         verbose_name_plural = "Student Profiles"
 
 
+class JoinCodeCounter(models.Model):
+    """Single-row counter feeding the join code permutation in `quiz.join_codes`"""
+    next_value = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"Next join code index: {self.next_value}"
+
+
 class QuizSession(models.Model):
     SUBJECT_CHOICES = [
         ('Math', 'Mathematics'),
@@ -53,6 +69,7 @@ class QuizSession(models.Model):
     ]
 
     student = models.ForeignKey(StudentProfile, on_delete=models.CASCADE, related_name='quiz_sessions')
+    question = models.ForeignKey('Question', on_delete=models.SET_NULL, null=True, blank=True, related_name='sessions')
     subject = models.CharField(max_length=20, choices=SUBJECT_CHOICES)
     topic = models.CharField(max_length=100)
     question_text = models.TextField()
@@ -60,7 +77,11 @@ class QuizSession(models.Model):
     correct_answer = models.CharField(max_length=500)
     explanation = models.TextField()
     is_correct = models.BooleanField(default=False)
+    # Set for generated questions, whose text is regenerated from these (see quiz/generators.py)
+    generator = models.CharField(max_length=50, blank=True, default='')
+    generator_seed = models.BigIntegerField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    answered_at = models.DateTimeField(null=True, blank=True)
 
     def __str__(self):
         return f"{self.student.name} - {self.subject} - {self.topic}"
@@ -68,6 +89,57 @@ class QuizSession(models.Model):
     class Meta:
         verbose_name = "Quiz Session"
         verbose_name_plural = "Quiz Sessions"
+        indexes = [
+            models.Index(fields=['question', 'answered_at']),
+            models.Index(fields=['created_at']),
+        ]
+
+
+class ArchivedQuizSession(models.Model):
+    """QuizSession rows moved out of the hot table by `manage.py archive_quiz_sessions`"""
+    original_id = models.BigIntegerField(unique=True)
+    archive_month = models.DateField(db_index=True)  # first day of the month the session was created in
+    student = models.ForeignKey(StudentProfile, on_delete=models.CASCADE, related_name='archived_sessions')
+    question = models.ForeignKey('Question', on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    subject = models.CharField(max_length=20, choices=QuizSession.SUBJECT_CHOICES)
+    topic = models.CharField(max_length=100)
+    question_text = models.TextField()
+    user_answer = models.CharField(max_length=500, null=True, blank=True)
+    correct_answer = models.CharField(max_length=500)
+    explanation = models.TextField()
+    is_correct = models.BooleanField(default=False)
+    generator = models.CharField(max_length=50, blank=True, default='')
+    generator_seed = models.BigIntegerField(null=True, blank=True)
+    created_at = models.DateTimeField()
+    answered_at = models.DateTimeField(null=True, blank=True)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.student_id} - {self.subject} - {self.topic} ({self.archive_month:%Y-%m})"
+
+    class Meta:
+        verbose_name = "Archived Quiz Session"
+        verbose_name_plural = "Archived Quiz Sessions"
+        indexes = [
+            models.Index(fields=['student', 'created_at']),
+        ]
+
+
+class ArchivedTopicRollup(models.Model):
+    """Per-topic totals of a student's archived sessions, so progress stays complete"""
+    student = models.ForeignKey(StudentProfile, on_delete=models.CASCADE, related_name='archived_rollups')
+    topic = models.CharField(max_length=100)
+    total_questions = models.IntegerField(default=0)
+    correct_answers = models.IntegerField(default=0)
+    last_attempt = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.student_id} - {self.topic}: {self.correct_answers}/{self.total_questions}"
+
+    class Meta:
+        verbose_name = "Archived Topic Rollup"
+        verbose_name_plural = "Archived Topic Rollups"
+        unique_together = ['student', 'topic']
 
 
 class Topic(models.Model):
@@ -129,12 +201,88 @@ class Question(models.Model):
     source_id = models.CharField(max_length=100, blank=True)
     license = models.CharField(max_length=100, blank=True)
     flag_count = models.IntegerField(default=0)
+    is_hidden = models.BooleanField(default=False)  # withdrawn from students, e.g. after review of flags
     created_at = models.DateTimeField(auto_now_add=True)
 
+    # Psychometric statistics, maintained by `manage.py compute_question_stats`
+    stats_responses = models.IntegerField(default=0)
+    stats_p_value = models.FloatField(null=True, blank=True)  # fraction answered correctly
+    stats_discrimination = models.FloatField(null=True, blank=True)  # item-rest correlation
+    stats_distractors = models.JSONField(default=dict, blank=True)  # answer -> times chosen
+    stats_median_latency = models.FloatField(null=True, blank=True)  # seconds
+    stats_updated_at = models.DateTimeField(null=True, blank=True)
+
     class Meta:
         indexes = [
             models.Index(fields=['subject', 'level']),
         ]
 
+    def save(self, *args, **kwargs):
+        # The post_save handlers keep QuestionBucketCount and the catalog in
+        # step; running them in the same transaction keeps the counts exact.
+        # No savepoint: a failure here fails the enclosing transaction anyway.
+        with transaction.atomic(savepoint=False):
+            return super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic(savepoint=False):
+            return super().delete(*args, **kwargs)
+
+    def __str__(self):
+        return f"{self.subject}/{self.level} - {self.topic or 'No Topic'}"
+
+
+class CatalogVersion(models.Model):
+    """Single-row counter bumped whenever topics or questions change"""
+    version = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    @classmethod
+    def current(cls):
+        state = cls.objects.filter(pk=1).first()
+        if state is None:
+            state, _ = cls.objects.get_or_create(pk=1)
+        return state
+
+    @classmethod
+    async def acurrent(cls):
+        state = await cls.objects.filter(pk=1).afirst()
+        if state is None:
+            state, _ = await cls.objects.aget_or_create(pk=1)
+        return state
+
+    @classmethod
+    def bump(cls):
+        updated = cls.objects.filter(pk=1).update(version=models.F('version') + 1, updated_at=timezone.now())
+        if not updated:
+            cls.objects.get_or_create(pk=1, defaults={'version': 1})
+
+    def __str__(self):
+        return f"Catalog v{self.version}"
+
+
+class TopicCatalog(models.Model):
+    """Single row holding the precomputed topic tree served by the catalog endpoints (see quiz/catalog.py)"""
+    catalog_version = models.BigIntegerField(default=0)  # CatalogVersion.version the tree reflects
+    data = models.JSONField(default=dict)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Topic catalog at v{self.catalog_version}"
+
+
+class QuestionBucketCount(models.Model):
+    """Visible questions per (subject, level, topic, difficulty), kept by quiz/buckets.py"""
+    subject = models.CharField(max_length=20)
+    level = models.CharField(max_length=10)
+    topic_id = models.BigIntegerField(default=0)  # 0 for questions without a topic
+    difficulty = models.CharField(max_length=20)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['subject', 'level', 'topic_id', 'difficulty'], name='unique_question_bucket'),
+        ]
+
     def __str__(self):
-        return f"{self.subject}/{self.level} - {self.topic or 'No Topic'}"
\ No newline at end of file
+        return f"{self.subject}/{self.level}/{self.topic_id}/{self.difficulty}: {self.count}"
@@ -0,0 +1,199 @@
+"""HTTP caching of the public catalog reads, with surrogate-key purging.
+
+``list_questions``, ``get_topics`` and ``get_catalog`` answer the same body
+to everyone, so ``public_cache`` marks them cacheable by browsers for
+``PUBLIC_CACHE_MAX_AGE`` seconds and tags them with a ``Surrogate-Key``
+header naming the filters they were computed for::
+
+    questions questions/Math/P4/any      GET /api/questions/?subject=Math&level=P4
+    topics topics/Math/P4                GET /api/topics/?subject=Math&level=P4
+    catalog                              GET /api/catalog/
+
+When ``CACHE_PURGE_URL`` is set, shared caches (the CDN) may keep them for
+``PUBLIC_CACHE_SHARED_MAX_AGE`` seconds instead, because every change to a
+question or topic POSTs the keys of each response it could appear in to that
+URL once the transaction commits, e.g. ``questions/Math/P4/7``,
+``questions/Math/any/7`` ... ``questions/any/any/any`` for question edits in
+topic 7, plus ``catalog``, whose counts include every question. The bare
+``questions`` and ``topics`` keys purge every list. Purges run on a
+background thread, so the write that caused them never waits on the CDN.
+
+The bundled nginx (frontend/nginx.conf) also keeps question and topic lists
+for 10 seconds whatever these headers say, and cannot be purged: behind it,
+an edit can take up to 10 seconds to reach the CDN and browsers, on top of
+their own ``max-age``.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import partial, wraps
+import itertools
+import logging
+import threading
+from urllib.parse import quote
+import urllib.request
+
+from asgiref.sync import iscoroutinefunction
+
+from django.conf import settings
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+ANY = 'any'
+CATALOG_KEY = 'catalog'
+# Keys per purge request; Fastly accepts at most 256
+PURGE_BATCH_SIZE = 256
+
+
+def _key(*parts):
+    return '/'.join(quote(str(part), safe='') for part in parts)
+
+
+def _topic_param(value):
+    """The ``topic`` filter as the id the purge keys use, so ``07`` and ``7`` match"""
+    return str(int(value)) if value.isdigit() else value
+
+
+def question_keys(params):
+    """Surrogate keys of a question list filtered by ``subject``, ``level`` and ``topic``"""
+    topic = params.get('topic')
+    return [
+        'questions',
+        _key('questions', params.get('subject') or ANY, params.get('level') or ANY,
+             _topic_param(topic) if topic else ANY),
+    ]
+
+
+def topic_keys(params):
+    """Surrogate keys of the topic list for a ``subject`` and ``level``"""
+    return ['topics', _key('topics', params.get('subject', 'Math'), params.get('level', ''))]
+
+
+def catalog_keys(params):
+    return [CATALOG_KEY]
+
+
+def question_purge_keys(subject, level, topic_id):
+    """Keys of every question list a question with these fields appears in, and the catalog"""
+    topics = [topic_id, ANY] if topic_id is not None else [ANY]
+    return {CATALOG_KEY} | {
+        _key('questions', *parts)
+        for parts in itertools.product([subject, ANY], [level, ANY], topics)
+    }
+
+
+def topic_purge_keys(subject, level):
+    return {CATALOG_KEY, _key('topics', subject, level)}
+
+
+def cache_control():
+    # Without purging, shared caches could not be told about edits either
+    max_age = settings.PUBLIC_CACHE_MAX_AGE
+    shared_max_age = settings.PUBLIC_CACHE_SHARED_MAX_AGE if settings.CACHE_PURGE_URL else max_age
+    return f'public, max-age={max_age}, s-maxage={shared_max_age}'
+
+
+def public_cache(keys_func):
+    """Mark successful responses publicly cacheable and tag them with ``keys_func(request.GET)``.
+
+    Replaces any ``Cache-Control`` set by inner decorators such as ``conditional``.
+    """
+    def decorator(view):
+        def patch(request, response):
+            if response.status_code in (200, 304):
+                response['Cache-Control'] = cache_control()
+                response['Surrogate-Key'] = ' '.join(keys_func(request.GET))
+            return response
+
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                return patch(request, await view(request, *args, **kwargs))
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            return patch(request, view(request, *args, **kwargs))
+        return wrapper
+    return decorator
+
+
+def purge(keys):
+    """Ask ``CACHE_PURGE_URL`` to drop every response tagged with any of ``keys``.
+
+    Returns whether every request succeeded; failures are logged, not raised,
+    since the cached copies still expire after ``PUBLIC_CACHE_SHARED_MAX_AGE``.
+    """
+    if not settings.CACHE_PURGE_URL or not keys:
+        return True
+    keys = sorted(keys)
+    ok = True
+    for start in range(0, len(keys), PURGE_BATCH_SIZE):
+        batch = keys[start:start + PURGE_BATCH_SIZE]
+        request = urllib.request.Request(
+            settings.CACHE_PURGE_URL, method='POST', data=b'', headers={'Surrogate-Key': ' '.join(batch)},
+        )
+        if settings.CACHE_PURGE_TOKEN:
+            request.add_header(settings.CACHE_PURGE_AUTH_HEADER, settings.CACHE_PURGE_TOKEN)
+        try:
+            with urllib.request.urlopen(request, timeout=settings.CACHE_PURGE_TIMEOUT) as response:
+                response.read()
+        except Exception as e:
+            ok = False
+            logger.warning("[PURGE] Purging %d surrogate keys failed: %s", len(batch), e)
+    if ok:
+        logger.debug("[PURGE] Purged %d surrogate keys", len(keys))
+    return ok
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _background():
+    # Started on first use, so workers forked after import get their own thread
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='cache-purge')
+    return _executor
+
+
+def purge_in_background(keys):
+    """Queue ``purge(keys)`` on this process's purge thread; returns its future"""
+    return _background().submit(purge, keys)
+
+
+def wait_for_purges():
+    """Block until the purges queued so far have run"""
+    if _executor is not None:
+        _executor.submit(lambda: None).result()
+
+
+_deferred = threading.local()
+
+
+@contextmanager
+def purge_deferred():
+    """Collect purges requested inside the block into one ``purge`` at the end"""
+    depth = getattr(_deferred, 'depth', 0)
+    if depth == 0:
+        _deferred.keys = set()
+    _deferred.depth = depth + 1
+    try:
+        yield
+    finally:
+        _deferred.depth = depth
+        if depth == 0:
+            keys, _deferred.keys = _deferred.keys, set()
+            purge(keys)
+
+
+def schedule_purge(keys):
+    """Purge ``keys`` in the background once the current transaction commits, if purging is enabled"""
+    if not settings.CACHE_PURGE_URL:
+        return
+    if getattr(_deferred, 'depth', 0):
+        _deferred.keys.update(keys)
+        return
+    transaction.on_commit(partial(purge_in_background, set(keys)), robust=True)
@@ -30,16 +30,14 @@ class QuizSessionSerializer(serializers.ModelSerializer):
 
 
 class SubmitAnswerSerializer(serializers.Serializer):
-    session_id = serializers.IntegerField()
+    # Validates to the session itself (with its student), so the view
+    # does not fetch it a second time
+    session_id = serializers.PrimaryKeyRelatedField(
+        queryset=QuizSession.objects.select_related('student'),
+        error_messages={'does_not_exist': 'Invalid session ID'},
+    )
     user_answer = serializers.CharField(max_length=500)
 
-    def validate_session_id(self, value):
-        try:
-            session = QuizSession.objects.get(id=value)
-            return value
-        except QuizSession.DoesNotExist:
-            raise serializers.ValidationError("Invalid session ID")
-
 
 class TopicSerializer(serializers.ModelSerializer):
     class Meta:
@@ -0,0 +1,124 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import buckets
+from .models import CatalogVersion, Question, Topic
+from .catalog import schedule_refresh
+from .purge import question_purge_keys, schedule_purge, topic_purge_keys
+from .snapshot import schedule_rebuild
+
+# Saves touching only these fields leave the public catalog unchanged
+NON_CATALOG_FIELDS = {
+    'flag_count', 'stats_responses', 'stats_p_value', 'stats_discrimination',
+    'stats_distractors', 'stats_median_latency', 'stats_updated_at',
+}
+# Flags are moderation input, so cached copies are purged on them as well
+NON_PUBLIC_FIELDS = NON_CATALOG_FIELDS - {'flag_count'}
+
+# Fields the public responses are filtered by, hence their surrogate keys,
+# and the topic catalog is grouped by
+PURGE_FIELDS = {
+    Question: ('subject', 'level', 'topic_id'),
+    Topic: ('subject', 'level'),
+}
+# Fields read back before an edit, to undo the row's previous contribution
+PREVIOUS_FIELDS = {
+    Question: buckets.QUESTION_FIELDS,
+    Topic: PURGE_FIELDS[Topic],
+}
+
+
+def _purge_keys(sender, values):
+    values = [values[field] for field in PURGE_FIELDS[sender]]
+    return question_purge_keys(*values) if sender is Question else topic_purge_keys(*values)
+
+
+def _values(sender, instance):
+    return {field: getattr(instance, field) for field in PREVIOUS_FIELDS[sender]}
+
+
+@receiver(post_save, sender=Topic)
+@receiver(post_save, sender=Question)
+def bump_catalog_on_save(sender, update_fields=None, **kwargs):
+    if update_fields and set(update_fields) <= NON_CATALOG_FIELDS:
+        return
+    CatalogVersion.bump()
+    schedule_rebuild()
+
+
+@receiver(post_delete, sender=Topic)
+@receiver(post_delete, sender=Question)
+def bump_catalog_on_delete(sender, **kwargs):
+    CatalogVersion.bump()
+    schedule_rebuild()
+
+
+@receiver(pre_save, sender=Topic)
+@receiver(pre_save, sender=Question)
+def remember_previous_fields(sender, instance, update_fields=None, **kwargs):
+    # An edit moving a row to another subject, level or topic must also purge
+    # the lists, and recount the topic, it is leaving
+    instance._previous = None
+    if instance.pk is None or (update_fields and set(update_fields) <= NON_CATALOG_FIELDS):
+        return
+    instance._previous = sender.objects.filter(pk=instance.pk).values(*PREVIOUS_FIELDS[sender]).first()
+
+
+# Registered before the catalog handlers below, which read the counts
+@receiver(post_save, sender=Question)
+def count_question_on_save(sender, instance, created, update_fields=None, **kwargs):
+    if update_fields and set(update_fields) <= NON_CATALOG_FIELDS:
+        return
+    previous = getattr(instance, '_previous', None)
+    if created or previous is not None:
+        buckets.move(buckets.bucket_of(previous) if previous else None, buckets.bucket_of(_values(sender, instance)))
+
+
+@receiver(post_delete, sender=Question)
+def count_question_on_delete(sender, instance, **kwargs):
+    buckets.adjust(buckets.bucket_of(_values(sender, instance)), -1)
+
+
+@receiver(post_delete, sender=Topic)
+def count_topic_on_delete(sender, instance, **kwargs):
+    buckets.merge_topic(instance.pk)
+
+
+@receiver(post_save, sender=Topic)
+@receiver(post_save, sender=Question)
+def purge_on_save(sender, instance, update_fields=None, **kwargs):
+    if update_fields and set(update_fields) <= NON_PUBLIC_FIELDS:
+        return
+    keys = _purge_keys(sender, _values(sender, instance))
+    previous = getattr(instance, '_previous', None)
+    if previous is not None:
+        keys |= _purge_keys(sender, previous)
+    schedule_purge(keys)
+
+
+@receiver(post_delete, sender=Topic)
+@receiver(post_delete, sender=Question)
+def purge_on_delete(sender, instance, **kwargs):
+    keys = _purge_keys(sender, _values(sender, instance))
+    if sender is Topic:
+        # Its questions' topic is nulled in bulk, without signals; rare enough to purge them all
+        keys.add('questions')
+    schedule_purge(keys)
+
+
+@receiver(post_save, sender=Topic)
+@receiver(post_save, sender=Question)
+def refresh_catalog_on_save(sender, instance, update_fields=None, **kwargs):
+    if update_fields and set(update_fields) <= NON_CATALOG_FIELDS:
+        return
+    if sender is Topic:
+        schedule_refresh({instance.pk})
+        return
+    previous = getattr(instance, '_previous', None)
+    schedule_refresh({instance.topic_id, previous['topic_id'] if previous else None})
+
+
+@receiver(post_delete, sender=Topic)
+@receiver(post_delete, sender=Question)
+def refresh_catalog_on_delete(sender, instance, **kwargs):
+    schedule_refresh({instance.pk if sender is Topic else instance.topic_id})
@@ -0,0 +1,416 @@
+"""Read-only, memory-mapped snapshot of the question bank.
+
+``build_snapshot`` writes every visible question to one binary file::
+
+    header   magic, format, catalog version, counts and section offsets
+    records  one fixed-size row per question, ordered by (subject, level,
+             topic, id); strings are (offset, length) pairs into the heap
+    groups   one row per (subject, level, topic) with its record range
+    ids      (question id, record index) pairs sorted by id
+    heap     UTF-8 strings, each distinct value stored once
+
+The file is written next to its final path and swapped in with
+``os.replace``, so readers see either the old or the new snapshot. Builds
+hold an exclusive lock on ``<path>.lock`` and never replace a snapshot of
+the same or a later catalog version, so a slow build cannot undo a newer
+one. Edits rebuild on a background thread once their transaction commits. Every
+gunicorn worker maps the same file read-only, so the pages live once in the
+OS page cache, and ``current_snapshot`` remaps when the file is replaced.
+Sampling and lookup then run without touching the database.
+"""
+import bisect
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+import heapq
+import itertools
+import json
+import logging
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.db import connections, transaction
+
+try:
+    import fcntl
+except ImportError:  # Windows: builds are not serialised across processes
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'QSNAP\x00\x00\x01'
+FORMAT_VERSION = 1
+
+STRING_FIELDS = [
+    'subject', 'level', 'question_text', 'options', 'correct_answer',
+    'explanation', 'difficulty', 'source', 'source_id', 'license',
+]
+NO_TOPIC = -1
+
+HEADER = struct.Struct('<8sIQIIQQQ')
+RECORD = struct.Struct('<qq' + 'II' * len(STRING_FIELDS) + 'B')
+GROUP = struct.Struct('<IIIIqII')
+ID_ENTRY = struct.Struct('<qI')
+
+
+class SnapshotError(Exception):
+    pass
+
+
+class _Heap:
+    def __init__(self):
+        self.chunks = []
+        self.size = 0
+        self.offsets = {}
+
+    def add(self, value):
+        """(offset, length) of ``value``, appending it the first time it is seen"""
+        if value not in self.offsets:
+            data = value.encode('utf-8')
+            self.offsets[value] = (self.size, len(data))
+            self.chunks.append(data)
+            self.size += len(data)
+        return self.offsets[value]
+
+
+def snapshot_version(path):
+    """The catalog version of the snapshot at ``path``, or -1 when there is no readable one"""
+    try:
+        with open(path, 'rb') as f:
+            magic, version, catalog_version, *_ = HEADER.unpack(f.read(HEADER.size))
+    except (OSError, struct.error):
+        return -1
+    return catalog_version if magic == MAGIC and version == FORMAT_VERSION else -1
+
+
+@contextmanager
+def _build_lock(path):
+    with open(f'{path}.lock', 'a') as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        yield
+
+
+def build_snapshot(path=None, force=False):
+    """Write a snapshot of every visible question to ``path`` atomically.
+
+    Returns the question count, or None when the file on disk is already at
+    the current catalog version (or a later one) and was left alone. Pass
+    ``force=True`` to replace it anyway, e.g. after the database was reset.
+    """
+    path = path or settings.QUESTION_SNAPSHOT_PATH
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    with _build_lock(path):
+        return _build(path, directory, force)
+
+
+def _build(path, directory, force):
+    from .models import CatalogVersion, Question
+
+    fields = ['id', 'topic_id', 'is_multiple_choice', *STRING_FIELDS]
+    # Read the version first, so a concurrent edit can only make it look older
+    catalog_version = CatalogVersion.current().version
+    if not force and snapshot_version(path) >= catalog_version:
+        return None
+    rows = list(
+        Question.objects.filter(is_hidden=False).order_by('subject', 'level', 'topic_id', 'id').values_list(*fields)
+    )
+
+    heap = _Heap()
+    records = bytearray()
+    groups = bytearray()
+    group_key, group_start = None, 0
+    for index, (question_id, topic_id, is_multiple_choice, *strings) in enumerate(rows):
+        values = dict(zip(STRING_FIELDS, strings))
+        values['options'] = json.dumps(values['options'] or [], ensure_ascii=False)
+        topic_id = NO_TOPIC if topic_id is None else topic_id
+        spans = [part for field in STRING_FIELDS for part in heap.add(values[field] or '')]
+        records += RECORD.pack(question_id, topic_id, *spans, int(is_multiple_choice))
+
+        key = (values['subject'], values['level'], topic_id)
+        if key != group_key:
+            if group_key is not None:
+                groups += _pack_group(heap, group_key, group_start, index)
+            group_key, group_start = key, index
+    if group_key is not None:
+        groups += _pack_group(heap, group_key, group_start, len(rows))
+
+    ids = b''.join(
+        ID_ENTRY.pack(question_id, index)
+        for question_id, index in sorted((row[0], index) for index, row in enumerate(rows))
+    )
+    groups_offset = HEADER.size + len(records)
+    ids_offset = groups_offset + len(groups)
+    heap_offset = ids_offset + len(ids)
+    header = HEADER.pack(
+        MAGIC, FORMAT_VERSION, catalog_version, len(rows), len(groups) // GROUP.size,
+        groups_offset, ids_offset, heap_offset,
+    )
+
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.questions-', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            for part in (header, records, groups, ids, *heap.chunks):
+                f.write(part)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp_path, 0o644)
+        # Checked again in case a writer without the lock got there first
+        if not force and snapshot_version(path) >= catalog_version:
+            os.unlink(tmp_path)
+            return None
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+    return len(rows)
+
+
+def _pack_group(heap, key, start, end):
+    subject, level, topic_id = key
+    return GROUP.pack(*heap.add(subject), *heap.add(level), topic_id, start, end)
+
+
+class QuestionSnapshot:
+    """A mapped snapshot file; questions come back as serializer-shaped dicts"""
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self.stat = os.fstat(f.fileno())
+            if self.stat.st_size < HEADER.size:
+                raise SnapshotError(f'{path} is not a question snapshot')
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, version, self.catalog_version, self.count, group_count,
+         self._groups_offset, self._ids_offset, self._heap_offset) = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise SnapshotError(f'{path} is not a format {FORMAT_VERSION} question snapshot')
+        self.groups = [
+            self._read_group(self._groups_offset + i * GROUP.size) for i in range(group_count)
+        ]
+
+    def __len__(self):
+        return self.count
+
+    def _string(self, offset, length):
+        start = self._heap_offset + offset
+        return self._map[start:start + length].decode('utf-8')
+
+    def _read_group(self, position):
+        subject_off, subject_len, level_off, level_len, topic_id, start, end = GROUP.unpack_from(self._map, position)
+        return (
+            self._string(subject_off, subject_len),
+            self._string(level_off, level_len),
+            None if topic_id == NO_TOPIC else topic_id,
+            start,
+            end,
+        )
+
+    def _record_id(self, index):
+        return struct.unpack_from('<q', self._map, HEADER.size + index * RECORD.size)[0]
+
+    def record(self, index):
+        question_id, topic_id, *rest = RECORD.unpack_from(self._map, HEADER.size + index * RECORD.size)
+        is_multiple_choice = rest.pop()
+        values = {
+            field: self._string(rest[2 * i], rest[2 * i + 1]) for i, field in enumerate(STRING_FIELDS)
+        }
+        values['options'] = json.loads(values['options'])
+        return {
+            'id': question_id,
+            'subject': values['subject'],
+            'level': values['level'],
+            'topic': None if topic_id == NO_TOPIC else topic_id,
+            'question_text': values['question_text'],
+            'is_multiple_choice': bool(is_multiple_choice),
+            'options': values['options'],
+            'correct_answer': values['correct_answer'],
+            'explanation': values['explanation'],
+            'difficulty': values['difficulty'],
+            'source': values['source'],
+            'source_id': values['source_id'],
+            'license': values['license'],
+        }
+
+    def get(self, question_id):
+        """The question with ``question_id``, or None; a binary search over the id table"""
+        low, high = 0, self.count
+        while low < high:
+            mid = (low + high) // 2
+            entry_id, index = ID_ENTRY.unpack_from(self._map, self._ids_offset + mid * ID_ENTRY.size)
+            if entry_id == question_id:
+                return self.record(index)
+            if entry_id < question_id:
+                low = mid + 1
+            else:
+                high = mid
+        return None
+
+    def _matching_groups(self, subject=None, level=None, topic_id=None):
+        return [
+            (start, end) for group_subject, group_level, group_topic, start, end in self.groups
+            if (not subject or group_subject == subject)
+            and (not level or group_level == level)
+            and (not topic_id or group_topic == int(topic_id))
+        ]
+
+    def sample(self, rng, subject=None, level=None, topic_id=None):
+        """A uniformly random matching question, or None when nothing matches"""
+        ranges = self._matching_groups(subject, level, topic_id)
+        cumulative = []
+        total = 0
+        for start, end in ranges:
+            total += end - start
+            cumulative.append(total)
+        if not total:
+            return None
+        pick = rng.randrange(total)
+        group = bisect.bisect_right(cumulative, pick)
+        before = cumulative[group - 1] if group else 0
+        return self.record(ranges[group][0] + pick - before)
+
+    def filter(self, subject=None, level=None, topic_id=None, limit=None):
+        """Matching questions in id order, at most ``limit`` of them"""
+        streams = [
+            ((self._record_id(index), index) for index in range(start, end))
+            for start, end in self._matching_groups(subject, level, topic_id)
+        ]
+        merged = heapq.merge(*streams)
+        if limit is not None:
+            merged = itertools.islice(merged, limit)
+        return [self.record(index) for _, index in merged]
+
+
+_lock = threading.Lock()
+_snapshot = None
+_catalog_version = 0
+_checked_at = 0.0
+
+
+def _check_due(now):
+    return now - _checked_at >= settings.QUESTION_SNAPSHOT_CHECK_INTERVAL
+
+
+def _check(path, now, catalog_version):
+    """Remap ``path`` if it was replaced, and note the current catalog version"""
+    global _snapshot, _catalog_version, _checked_at
+    with _lock:
+        if not _check_due(now):
+            return
+        try:
+            stat = os.stat(path)
+            if _snapshot is None or (stat.st_ino, stat.st_mtime_ns) != (_snapshot.stat.st_ino, _snapshot.stat.st_mtime_ns):
+                # The old map is released once in-flight readers drop it
+                _snapshot = QuestionSnapshot(path)
+        except (OSError, ValueError, SnapshotError, struct.error):
+            _snapshot = None
+        _catalog_version = catalog_version
+        _checked_at = now
+
+
+def _usable():
+    # A snapshot older than the catalog misses later edits and hides: its
+    # rebuild is still running or has failed, so the database answers instead
+    snapshot = _snapshot
+    if snapshot is None or snapshot.catalog_version < _catalog_version:
+        return None
+    return snapshot
+
+
+def current_snapshot():
+    """The snapshot at ``QUESTION_SNAPSHOT_PATH``, remapped after it is replaced.
+
+    Returns None when snapshots are disabled, the file is missing or
+    unreadable, or it predates the current ``CatalogVersion``, in which case
+    callers fall back to the database. The file and the version are checked
+    at most every ``QUESTION_SNAPSHOT_CHECK_INTERVAL`` seconds.
+    """
+    from .models import CatalogVersion
+
+    path = settings.QUESTION_SNAPSHOT_PATH
+    if not path:
+        return None
+    now = time.monotonic()
+    if _check_due(now):
+        _check(path, now, CatalogVersion.current().version)
+    return _usable()
+
+
+async def acurrent_snapshot():
+    from .models import CatalogVersion
+
+    path = settings.QUESTION_SNAPSHOT_PATH
+    if not path:
+        return None
+    now = time.monotonic()
+    if _check_due(now):
+        _check(path, now, (await CatalogVersion.acurrent()).version)
+    return _usable()
+
+
+_executor = None
+_executor_lock = threading.Lock()
+_rebuild_queued = False
+
+
+def _rebuild():
+    global _rebuild_queued
+    with _executor_lock:
+        _rebuild_queued = False
+    try:
+        build_snapshot()
+    except Exception:
+        logger.exception("[SNAPSHOT] Rebuild failed; readers use the database until the next one")
+    finally:
+        connections.close_all()
+
+
+def rebuild_in_background():
+    """Queue a rebuild on this process's snapshot thread, unless one is already waiting to start"""
+    global _executor, _rebuild_queued
+    with _executor_lock:
+        if _rebuild_queued:
+            return
+        _rebuild_queued = True
+        # Started on first use, so workers forked after import get their own thread
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='question-snapshot')
+        _executor.submit(_rebuild)
+
+
+def wait_for_rebuilds():
+    """Block until the rebuilds queued so far have run"""
+    if _executor is not None:
+        _executor.submit(lambda: None).result()
+
+
+_deferred = threading.local()
+
+
+@contextmanager
+def rebuild_deferred():
+    """Collapse snapshot rebuilds requested inside the block into one at the end"""
+    depth = getattr(_deferred, 'depth', 0)
+    _deferred.depth = depth + 1
+    try:
+        yield
+    finally:
+        _deferred.depth = depth
+        if depth == 0 and getattr(_deferred, 'pending', False):
+            _deferred.pending = False
+            build_snapshot()
+
+
+def schedule_rebuild():
+    """Rebuild the snapshot in the background once the current transaction commits, if enabled"""
+    if not settings.QUESTION_SNAPSHOT_PATH:
+        return
+    if getattr(_deferred, 'depth', 0):
+        _deferred.pending = True
+        return
+    transaction.on_commit(rebuild_in_background, robust=True)
@@ -0,0 +1,236 @@
+"""Per-question psychometric statistics.
+
+Answered sessions are streamed in primary-key chunks and reduced with NumPy,
+so memory is bounded by the chunk size plus a few numbers per question (and
+one latency sample per answer, which an exact median needs). Archived
+sessions (quiz/archive.py) keep every field the statistics use and are read
+alongside the hot table, so archiving never changes a question's numbers.
+"""
+from django.db.models import Count, DurationField, Exists, ExpressionWrapper, F, OuterRef, Q
+from django.utils import timezone
+import numpy as np
+
+from .models import ArchivedQuizSession, Question, QuizSession
+
+# Hot sessions first: rows archived during a run then get ids past the
+# archive bound and are not read twice
+SESSION_MODELS = (QuizSession, ArchivedQuizSession)
+
+
+def stale_question_ids():
+    """Ids of questions that received answers since their stats were last computed"""
+    answered = QuizSession.objects.filter(question=OuterRef('pk'), answered_at__isnull=False)
+    archived = ArchivedQuizSession.objects.filter(question=OuterRef('pk'), answered_at__isnull=False)
+    never_computed = Q(stats_updated_at__isnull=True) & (Exists(answered) | Exists(archived))
+    new_answers = Exists(answered.filter(answered_at__gt=OuterRef('stats_updated_at')))
+    return list(
+        Question.objects.filter(never_computed | new_answers).order_by('id').values_list('id', flat=True)
+    )
+
+
+def _max_ids():
+    """The highest id of each session table; rows past them are left to the next refresh"""
+    return {
+        model: model.objects.order_by('-id').values_list('id', flat=True).first() or 0
+        for model in SESSION_MODELS
+    }
+
+
+def _student_scores(max_ids):
+    """Sorted student ids with their answered and correct totals across the bank, up to ``max_ids``"""
+    totals = {}
+    for model in SESSION_MODELS:
+        rows = (
+            model.objects.filter(answered_at__isnull=False, question__isnull=False, id__lte=max_ids[model])
+            .values('student_id')
+            .annotate(total=Count('id'), correct=Count('id', filter=Q(is_correct=True)))
+            .order_by()
+            .values_list('student_id', 'total', 'correct')
+        )
+        for student_id, total, correct in rows:
+            previous = totals.get(student_id, (0, 0))
+            totals[student_id] = (previous[0] + total, previous[1] + correct)
+    if not totals:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, empty
+    data = np.array(sorted((student_id, *counts) for student_id, counts in totals.items()), dtype=np.int64)
+    return data[:, 0], data[:, 1], data[:, 2]
+
+
+def _session_chunks(model, question_ids, chunk_size, max_id):
+    """Yield answered ``model`` rows up to ``max_id`` for the given questions as lists of tuples, in id order"""
+    sessions = model.objects.filter(answered_at__isnull=False, question_id__in=question_ids, id__lte=max_id)
+    sessions = sessions.annotate(
+        latency=ExpressionWrapper(F('answered_at') - F('created_at'), output_field=DurationField())
+    )
+    last_id = 0
+    while True:
+        chunk = list(
+            sessions.filter(id__gt=last_id).order_by('id').values_list(
+                'id', 'question_id', 'student_id', 'is_correct', 'user_answer', 'latency'
+            )[:chunk_size]
+        )
+        if not chunk:
+            return
+        yield chunk
+        last_id = chunk[-1][0]
+
+
+def compute_question_stats(question_ids, chunk_size=5000):
+    """Compute statistics for ``question_ids``; returns ``{question_id: {field: value}}``.
+
+    The discrimination index is the item-rest point-biserial correlation: the
+    correlation between answering this question correctly and the student's
+    accuracy on all *other* answered bank questions.
+    """
+    targets = np.unique(np.asarray(list(question_ids), dtype=np.int64))
+    m = len(targets)
+    if m == 0:
+        return {}
+
+    # Sessions created after this are left to the next refresh, so every
+    # student read below has a score
+    max_ids = _max_ids()
+    student_ids, student_totals, student_correct = _student_scores(max_ids)
+
+    n = np.zeros(m)
+    sum_x = np.zeros(m)
+    n_xy = np.zeros(m)
+    sum_xy_x = np.zeros(m)
+    sum_xy_y = np.zeros(m)
+    sum_xy_yy = np.zeros(m)
+    sum_xy_xy = np.zeros(m)
+    distractors = [dict() for _ in range(m)]
+    latency_idx = []
+    latency_val = []
+
+    # Sessions are fetched in chunks of ``chunk_size`` rows, but the ``__in``
+    # list is also kept bounded for large refreshes.
+    chunks = (
+        chunk
+        for model in SESSION_MODELS
+        for start in range(0, m, chunk_size)
+        for chunk in _session_chunks(model, targets[start:start + chunk_size].tolist(), chunk_size, max_ids[model])
+    )
+    for chunk in chunks:
+        _, qids, sids, correct, answers, latencies = zip(*chunk)
+        q = np.searchsorted(targets, np.asarray(qids, dtype=np.int64))
+        x = np.asarray(correct, dtype=np.float64)
+
+        n += np.bincount(q, minlength=m)
+        sum_x += np.bincount(q, weights=x, minlength=m)
+
+        # Rest score: the student's accuracy with this answer removed
+        sids = np.asarray(sids, dtype=np.int64)
+        s = np.searchsorted(student_ids, sids)
+        # Sessions answered after the scores were read can belong to a
+        # student without one; they get no rest score
+        known = s < len(student_ids)
+        known[known] = student_ids[s[known]] == sids[known]
+        rest_n = np.full(len(sids), -1, dtype=np.int64)
+        rest_n[known] = student_totals[s[known]] - 1
+        valid = rest_n > 0
+        y = np.zeros(len(x))
+        y[valid] = (student_correct[s[valid]] - x[valid]) / rest_n[valid]
+        qv, xv, yv = q[valid], x[valid], y[valid]
+        n_xy += np.bincount(qv, minlength=m)
+        sum_xy_x += np.bincount(qv, weights=xv, minlength=m)
+        sum_xy_y += np.bincount(qv, weights=yv, minlength=m)
+        sum_xy_yy += np.bincount(qv, weights=yv * yv, minlength=m)
+        sum_xy_xy += np.bincount(qv, weights=xv * yv, minlength=m)
+
+        # Distractor distribution: count (question, answer) pairs in one pass
+        answer_arr = np.array([a if a is not None else '' for a in answers], dtype=object)
+        has_answer = answer_arr != ''
+        if has_answer.any():
+            labels, codes = np.unique(answer_arr[has_answer].astype(str), return_inverse=True)
+            keys = q[has_answer] * len(labels) + codes
+            pairs, counts = np.unique(keys, return_counts=True)
+            for key, count in zip(pairs.tolist(), counts.tolist()):
+                qi, code = divmod(key, len(labels))
+                label = str(labels[code])
+                distractors[qi][label] = distractors[qi].get(label, 0) + count
+
+        lat = np.array(
+            [d.total_seconds() if d is not None else np.nan for d in latencies], dtype=np.float64
+        )
+        ok = np.isfinite(lat) & (lat >= 0)
+        latency_idx.append(q[ok])
+        latency_val.append(lat[ok])
+
+    p_value = np.divide(sum_x, n, out=np.full(m, np.nan), where=n > 0)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean_x = sum_xy_x / n_xy
+        mean_y = sum_xy_y / n_xy
+        cov = sum_xy_xy / n_xy - mean_x * mean_y
+        var_x = mean_x - mean_x * mean_x  # x is binary, so E[x^2] == E[x]
+        var_y = sum_xy_yy / n_xy - mean_y * mean_y
+        discrimination = cov / np.sqrt(var_x * var_y)
+    discrimination[~((var_x > 0) & (var_y > 1e-12))] = np.nan
+
+    median_latency = np.full(m, np.nan)
+    if latency_idx:
+        qi = np.concatenate(latency_idx)
+        lat = np.concatenate(latency_val)
+        if len(qi):
+            order = np.lexsort((lat, qi))
+            lat = lat[order]
+            counts = np.bincount(qi, minlength=m)
+            starts = np.cumsum(counts) - counts
+            has = counts > 0
+            lo = starts[has] + (counts[has] - 1) // 2
+            hi = starts[has] + counts[has] // 2
+            median_latency[has] = (lat[lo] + lat[hi]) / 2
+
+    def _value(arr, i):
+        v = float(arr[i])
+        return None if np.isnan(v) else round(v, 4)
+
+    return {
+        int(qid): {
+            'stats_responses': int(n[i]),
+            'stats_p_value': _value(p_value, i),
+            'stats_discrimination': _value(discrimination, i),
+            'stats_distractors': distractors[i],
+            'stats_median_latency': _value(median_latency, i),
+        }
+        for i, qid in enumerate(targets.tolist())
+    }
+
+
+def refresh_question_stats(question_ids=None, full=False, chunk_size=5000):
+    """Recompute and store statistics; returns the number of questions updated.
+
+    By default only questions that received new answers since their last
+    refresh are recomputed. Pass ``full=True`` to recompute every question that
+    has been answered, or ``question_ids`` to pick questions explicitly.
+    """
+    # Stamp before reading so answers arriving mid-run trigger the next refresh
+    started = timezone.now()
+    if question_ids is None:
+        if full:
+            question_ids = set()
+            for model in SESSION_MODELS:
+                question_ids.update(
+                    model.objects.filter(answered_at__isnull=False, question__isnull=False)
+                    .values_list('question_id', flat=True).distinct()
+                )
+        else:
+            question_ids = stale_question_ids()
+
+    results = compute_question_stats(question_ids, chunk_size=chunk_size)
+    fields = [
+        'stats_responses', 'stats_p_value', 'stats_discrimination',
+        'stats_distractors', 'stats_median_latency', 'stats_updated_at',
+    ]
+    ids = list(results)
+    for start in range(0, len(ids), chunk_size):
+        batch = ids[start:start + chunk_size]
+        questions = list(Question.objects.filter(id__in=batch))
+        for question in questions:
+            for field, value in results[question.id].items():
+                setattr(question, field, value)
+            question.stats_updated_at = started
+        Question.objects.bulk_update(questions, fields, batch_size=500)
+    return len(ids)
@@ -1,3 +1,803 @@
-from django.test import TestCase
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import io
+import json
+import os
+import tempfile
+import threading
+from datetime import timedelta
+from fractions import Fraction
+from unittest import mock
 
-# Create your tests here.
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from accounts.authentication import token_for_user
+from accounts.models import User
+from ai_tutor_sg.testing import QueryBudgetMixin, QueryCapture
+from .archive import archive_sessions
+from .buckets import reconcile
+from .catalog import build_catalog
+from .generators import GENERATORS, batch_seeds, generator_for, regenerate
+from .join_codes import ALPHABET, CODE_LENGTH, CODE_SPACE, JoinCodeAllocator, JoinCodesExhausted, permute
+from .models import (
+    ArchivedQuizSession, ArchivedTopicRollup, CatalogVersion, JoinCodeCounter, Question, QuestionBucketCount,
+    QuizSession, StudentProfile, Topic, TopicCatalog,
+)
+from .purge import question_purge_keys, wait_for_purges
+from . import snapshot, stats
+
+PARENT_EMAIL = 'parent@example.com'
+
+
+class QuizQueryBudgetTests(QueryBudgetMixin, TestCase):
+    """Each endpoint's query count, at growing dataset sizes"""
+
+    def setUp(self):
+        self.parent = User.objects.create_user(
+            username=PARENT_EMAIL, email=PARENT_EMAIL, password='x', is_parent=True
+        )
+        self.student = StudentProfile.objects.create(parent=self.parent, name='Alex', level='P4')
+        self.client.defaults['HTTP_X_USER_DATA'] = json.dumps({'email': PARENT_EMAIL})
+
+    def add_questions(self, size):
+        for i in range(Question.objects.count(), size):
+            topic = Topic.objects.create(name=f'Topic {i}', subject='Math', level='P4')
+            Question.objects.create(
+                subject='Math', level='P4', topic=topic, question_text=f'What is {i} + 1?',
+                options=[str(i + 1), str(i + 2)], correct_answer=str(i + 1), explanation='Add one.',
+            )
+
+    def add_sessions(self, size, student=None):
+        """Sessions for ``student`` up to ``size``, each on its own topic"""
+        student = student or self.student
+        for i in range(student.quiz_sessions.count(), size):
+            QuizSession.objects.create(
+                student=student, subject='Math', topic=f'Topic {i}',
+                question_text='What is 1 + 1?', correct_answer='2', explanation='1 + 1 = 2',
+                is_correct=i % 2 == 0,
+            )
+
+    def add_archived(self, size):
+        for i in range(ArchivedTopicRollup.objects.filter(student=self.student).count(), size):
+            ArchivedTopicRollup.objects.create(
+                student=self.student, topic=f'Archived {i}', total_questions=2, correct_answers=1,
+                last_attempt=timezone.now(),
+            )
+            ArchivedQuizSession.objects.create(
+                original_id=10_000 + i, archive_month=timezone.now().date().replace(day=1),
+                student=self.student, subject='Math', topic=f'Archived {i}',
+                question_text='What is 2 + 2?', correct_answer='4', explanation='2 + 2 = 4',
+                created_at=timezone.now(),
+            )
+
+    def test_list_questions(self):
+        self.assertQueryBudget(1, lambda: self.client.get('/api/questions/?subject=Math&level=P4'),
+                               grow=self.add_questions)
+
+    def test_random_question(self):
+        self.assertQueryBudget(2, lambda: self.client.get('/api/questions/random/?subject=Math&level=P4'),
+                               grow=self.add_questions)
+
+    def test_question_availability(self):
+        self.assertQueryBudget(1, lambda: self.client.get('/api/questions/available/?subject=Math&level=P4'),
+                               grow=self.add_questions)
+
+    def test_flag_question(self):
+        self.add_questions(1)
+        question = Question.objects.get()
+        self.assertQueryBudget(2, lambda: self.client.post(f'/api/questions/{question.id}/flag/'))
+
+    def test_get_topics(self):
+        def grow(size):
+            for i in range(Topic.objects.count(), size):
+                Topic.objects.create(name=f'Topic {i}', subject='Math', level='P4')
+
+        # The catalog version, then the stored catalog, as the caches start cold
+        self.assertQueryBudget(2, lambda: self.client.get('/api/topics/?subject=Math&level=P4'), grow=grow)
+
+    def test_get_topics_warm(self):
+        self.client.get('/api/topics/?subject=Math&level=P4')
+        with QueryCapture() as capture:
+            response = self.client.get('/api/topics/?subject=Math&level=P4')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(capture), 1, capture.report())
+
+    def test_get_catalog(self):
+        self.assertQueryBudget(2, lambda: self.client.get('/api/catalog/'), grow=self.add_questions)
+
+    def test_get_progress(self):
+        def grow(size):
+            self.add_sessions(size)
+            self.add_archived(size)
+
+        url = f'/api/progress/{self.student.id}/'
+        self.assertQueryBudget(5, lambda: self.client.get(url), grow=grow)
+
+    def test_get_progress_full_history(self):
+        def grow(size):
+            self.add_sessions(size)
+            self.add_archived(size)
+
+        url = f'/api/progress/{self.student.id}/?history=full'
+        self.assertQueryBudget(7, lambda: self.client.get(url), grow=grow)
+
+    def test_get_progress_not_modified(self):
+        url = f'/api/progress/{self.student.id}/'
+        etag = self.client.get(url)['ETag']
+        # The student row, and the parent the ownership check needs on a cold identity cache
+        self.assertQueryBudget(
+            2, lambda: self.client.get(url, HTTP_IF_NONE_MATCH=etag), grow=self.add_sessions, status=304,
+        )
+
+    def test_get_progress_validators_only_for_the_owner(self):
+        url = f'/api/progress/{self.student.id}/'
+        response = self.client.get(url)
+        self.assertIn('X-User-Data', response['Vary'])
+        etag = response['ETag']
+
+        User.objects.create_user(username='other@example.com', email='other@example.com', is_parent=True)
+        other = json.dumps({'email': 'other@example.com'})
+        for headers in ({}, {'HTTP_IF_NONE_MATCH': etag}):
+            response = self.client.get(url, HTTP_X_USER_DATA=other, **headers)
+            self.assertEqual(response.status_code, 403)
+            self.assertFalse(response.has_header('ETag'))
+            self.assertFalse(response.has_header('Last-Modified'))
+
+    def test_start_quiz_session_changes_progress_etag(self):
+        url = f'/api/progress/{self.student.id}/'
+        etag = self.client.get(url)['ETag']
+        body = {'subject': 'Math', 'level': 'P4', 'topic': 'Fractions'}
+        self.client.post('/api/start-session/', body, content_type='application/json',
+                         HTTP_AUTHORIZATION=f'Token {token_for_user(self.parent)}')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['progress'][0]['total_questions'], 1)
+
+    def test_submit_answer(self):
+        self.add_sessions(1)
+        session_id = QuizSession.objects.order_by('id').values_list('id', flat=True).first()
+        body = {'session_id': session_id, 'user_answer': '2'}
+        self.assertQueryBudget(
+            3,
+            lambda: self.client.post('/api/submit-answer/', body, content_type='application/json'),
+            grow=self.add_sessions,
+        )
+
+    def test_start_quiz_session(self):
+        self.add_questions(1)
+        question = Question.objects.get()
+
+        def grow(size):
+            for i in range(self.parent.children.count(), size):
+                StudentProfile.objects.create(parent=self.parent, name=f'Child {i}', level='P4')
+
+        # Token authentication, as the view reads the parent from request.user
+        token = token_for_user(self.parent)
+        body = {'subject': 'Math', 'level': 'P4', 'topic': 'Topic 0', 'question_id': question.id}
+        self.assertQueryBudget(
+            5,
+            lambda: self.client.post(
+                '/api/start-session/', body, content_type='application/json', HTTP_AUTHORIZATION=f'Token {token}',
+            ),
+            grow=grow,
+        )
+
+    def test_start_quiz_session_rejects_bad_question_ids(self):
+        headers = {'HTTP_AUTHORIZATION': f'Token {token_for_user(self.parent)}'}
+        body = {'subject': 'Math', 'level': 'P4', 'topic': 'Fractions'}
+        for question_id, expected in (('abc', 400), (-1, 400), (1.5, 400), (999, 404)):
+            response = self.client.post(
+                '/api/start-session/', {**body, 'question_id': question_id}, content_type='application/json', **headers,
+            )
+            self.assertEqual(response.status_code, expected, question_id)
+        self.assertFalse(QuizSession.objects.exists())
+
+    def test_start_quiz_session_hides_hidden_questions(self):
+        self.add_questions(1)
+        question = Question.objects.get()
+        question.is_hidden = True
+        question.save(update_fields=['is_hidden'])
+        body = {'subject': 'Math', 'level': 'P4', 'topic': 'Topic 0', 'question_id': question.id}
+        response = self.client.post('/api/start-session/', body, content_type='application/json',
+                                    HTTP_AUTHORIZATION=f'Token {token_for_user(self.parent)}')
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(QuizSession.objects.exists())
+
+
+class TopicCatalogTests(TestCase):
+    def setUp(self):
+        self.fractions = Topic.objects.create(name='Fractions', subject='Math', level='P4')
+        self.decimals = Topic.objects.create(name='Decimals', subject='Math', level='P4')
+        self.plants = Topic.objects.create(name='Plants', subject='Science', level='P3')
+
+    def add_question(self, topic, difficulty='medium', **fields):
+        return Question.objects.create(
+            subject=topic.subject, level=topic.level, topic=topic, question_text=f'Question {Question.objects.count()}',
+            correct_answer='1', difficulty=difficulty, **fields,
+        )
+
+    def stored(self):
+        return TopicCatalog.objects.get(pk=1).data
+
+    def assertMatchesRebuild(self):
+        self.assertEqual(self.stored(), build_catalog())
+
+    def test_tree(self):
+        self.add_question(self.fractions, 'easy')
+        self.add_question(self.fractions, 'hard')
+        self.add_question(self.decimals)
+        self.add_question(self.plants)
+
+        response = self.client.get('/api/catalog/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'questions': 4, 'subjects': [
+            {'subject': 'Math', 'questions': 3, 'levels': [{'level': 'P4', 'questions': 3, 'topics': [
+                {'id': self.decimals.id, 'name': 'Decimals', 'questions': 1, 'difficulty': {'medium': 1}},
+                {'id': self.fractions.id, 'name': 'Fractions', 'questions': 2,
+                 'difficulty': {'easy': 1, 'hard': 1}},
+            ]}]},
+            {'subject': 'Science', 'questions': 1, 'levels': [{'level': 'P3', 'questions': 1, 'topics': [
+                {'id': self.plants.id, 'name': 'Plants', 'questions': 1, 'difficulty': {'medium': 1}},
+            ]}]},
+        ]})
+
+    def test_changes_patch_the_stored_tree(self):
+        question = self.add_question(self.fractions)
+        self.add_question(self.decimals, 'hard')
+        self.assertMatchesRebuild()
+
+        question.topic = self.decimals
+        question.difficulty = 'easy'
+        question.save()
+        self.assertMatchesRebuild()
+
+        self.plants.level = 'P5'
+        self.plants.save()
+        self.assertMatchesRebuild()
+
+        self.decimals.is_active = False
+        self.decimals.save()
+        self.assertMatchesRebuild()
+        self.assertNotIn('Decimals', json.dumps(self.stored()))
+
+        question.delete()
+        self.fractions.delete()
+        self.assertMatchesRebuild()
+
+    def test_stats_updates_leave_the_tree_alone(self):
+        question = self.add_question(self.fractions)
+        before = TopicCatalog.objects.get(pk=1).updated_at
+        question.stats_responses = 3
+        question.save(update_fields=['stats_responses'])
+        self.assertEqual(TopicCatalog.objects.get(pk=1).updated_at, before)
+
+    def test_topics_come_from_the_catalog(self):
+        response = self.client.get('/api/topics/?subject=Math&level=P4')
+        self.assertEqual(response.json(), {'topics': ['Decimals', 'Fractions']})
+
+        # Levels without topics in the database keep the mock topics
+        response = self.client.get('/api/topics/?subject=Math&level=P6')
+        self.assertEqual(response.json(), {'topics': ['Fractions']})
+
+    def test_import_recounts_once(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.jsonl', delete=False) as f:
+            for i in range(3):
+                f.write(json.dumps({'question': f'What is {i} + 2?', 'answer': str(i + 2)}) + '\n')
+        self.addCleanup(os.remove, f.name)
+
+        with QueryCapture() as capture:
+            call_command('import_questions', file=f.name, level='P4', topic='Fractions', stdout=open(os.devnull, 'w'))
+
+        self.assertEqual(len([q for q in capture.queries if 'UPDATE "quiz_topiccatalog"' in q.sql]), 1)
+        self.assertEqual(self.stored()['subjects'][0]['levels'][0]['topics'][1]['questions'], 3)
+        self.assertMatchesRebuild()
+
+
+class QuestionBucketCountTests(TestCase):
+    def setUp(self):
+        self.fractions = Topic.objects.create(name='Fractions', subject='Math', level='P4')
+        self.decimals = Topic.objects.create(name='Decimals', subject='Math', level='P4')
+
+    def add_question(self, topic=None, difficulty='medium', **fields):
+        return Question.objects.create(
+            subject='Math', level='P4', topic=topic, question_text=f'Question {Question.objects.count()}',
+            correct_answer='1', difficulty=difficulty, **fields,
+        )
+
+    def counts(self):
+        return {
+            (row.topic_id, row.difficulty): row.count
+            for row in QuestionBucketCount.objects.exclude(count=0)
+        }
+
+    def assertCountsExact(self):
+        self.assertEqual(reconcile(dry_run=True)[1], 0)
+
+    def test_counts_follow_changes(self):
+        question = self.add_question(self.fractions)
+        self.add_question(self.fractions, 'hard')
+        self.add_question(None, 'easy')
+        self.assertEqual(self.counts(), {(self.fractions.id, 'medium'): 1, (self.fractions.id, 'hard'): 1, (0, 'easy'): 1})
+
+        question.topic = self.decimals
+        question.difficulty = 'easy'
+        question.save()
+        self.assertEqual(self.counts(), {(self.decimals.id, 'easy'): 1, (self.fractions.id, 'hard'): 1, (0, 'easy'): 1})
+
+        question.is_hidden = True
+        question.save(update_fields=['is_hidden'])
+        self.assertEqual(self.counts(), {(self.fractions.id, 'hard'): 1, (0, 'easy'): 1})
+        question.is_hidden = False
+        question.save(update_fields=['is_hidden'])
+        self.assertCountsExact()
+
+        self.fractions.delete()
+        self.assertEqual(self.counts(), {(self.decimals.id, 'easy'): 1, (0, 'easy'): 1, (0, 'hard'): 1})
+        question.delete()
+        self.assertEqual(self.counts(), {(0, 'easy'): 1, (0, 'hard'): 1})
+        self.assertCountsExact()
+
+    def test_flags_do_not_touch_counts(self):
+        question = self.add_question(self.fractions)
+        with QueryCapture() as capture:
+            question.flag_count = 1
+            question.save(update_fields=['flag_count'])
+        self.assertFalse([q for q in capture.queries if 'quiz_questionbucketcount' in q.sql])
+
+    def test_availability(self):
+        self.add_question(self.fractions, 'easy')
+        self.add_question(self.fractions, 'hard')
+        self.add_question(self.decimals, 'hard')
+        self.add_question(self.decimals, is_hidden=True)
+
+        with QueryCapture() as capture:
+            response = self.client.get('/api/questions/available/?subject=Math&level=P4')
+        self.assertEqual(response.json(), {
+            'available': 3, 'difficulty': {'easy': 1, 'hard': 2},
+            'topics': {str(self.fractions.id): 2, str(self.decimals.id): 1},
+        })
+        self.assertFalse([q for q in capture.queries if 'quiz_question"' in q.sql])
+
+        response = self.client.get(f'/api/questions/available/?topic={self.decimals.id}&difficulty=hard')
+        self.assertEqual(response.json()['available'], 1)
+
+    def test_random_question_skips_hidden(self):
+        self.add_question(self.fractions, is_hidden=True)
+        response = self.client.get(f'/api/questions/random/?topic={self.fractions.id}')
+        self.assertEqual(response.status_code, 404)
+
+        visible = self.add_question(self.fractions)
+        for _ in range(5):
+            response = self.client.get(f'/api/questions/random/?topic={self.fractions.id}')
+            self.assertEqual(response.json()['id'], visible.id)
+
+    def test_reconcile_fixes_drift(self):
+        self.add_question(self.fractions)
+        # Bulk writes skip the signals
+        Question.objects.bulk_create([
+            Question(subject='Math', level='P4', topic=self.decimals, question_text=f'Bulk {i}', correct_answer='1')
+            for i in range(3)
+        ])
+        Question.objects.filter(topic=self.fractions).update(is_hidden=True)
+
+        out = io.StringIO()
+        call_command('reconcile_question_counts', stdout=out)
+
+        self.assertIn('fixed 2', out.getvalue())
+        self.assertEqual(self.counts(), {(self.decimals.id, 'medium'): 3})
+        self.assertCountsExact()
+        self.assertEqual(TopicCatalog.objects.get(pk=1).data, build_catalog())
+        self.assertEqual(self.client.get('/api/topics/?subject=Math&level=P4').status_code, 200)
+
+
+class PurgeTarget(ThreadingHTTPServer):
+    """Local stand-in for a CDN purge endpoint, recording each request's surrogate keys"""
+
+    def __init__(self):
+        self.requests = []
+        self.status = 200
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get('Content-Length') or 0))
+                server.requests.append({
+                    'keys': set(self.headers.get('Surrogate-Key', '').split()),
+                    'token': self.headers.get('Fastly-Key'),
+                })
+                self.send_response(server.status)
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        super().__init__(('127.0.0.1', 0), Handler)
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server_address[1]}/purge'
+
+    @property
+    def purged(self):
+        return set().union(*(request['keys'] for request in self.requests))
+
+
+class QuestionStatsTests(TestCase):
+    def setUp(self):
+        parent = User.objects.create_user(username=PARENT_EMAIL, email=PARENT_EMAIL, password='x', is_parent=True)
+        self.students = [StudentProfile.objects.create(parent=parent, name=f'Child {i}', level='P4') for i in range(3)]
+        self.questions = [
+            Question.objects.create(subject='Math', level='P4', question_text=f'Question {i}', correct_answer='1')
+            for i in range(2)
+        ]
+
+    def answer(self, student, question, correct, answered=True):
+        return QuizSession.objects.create(
+            student=student, question=question, subject='Math', topic='Topic', question_text='Question',
+            correct_answer='1', explanation='', user_answer='1' if correct else '2', is_correct=correct,
+            answered_at=timezone.now() if answered else None,
+        )
+
+    def compute_while_answering(self):
+        """Stats for both questions, with answers landing right after the student scores are read"""
+        late = self.answer(self.students[2], self.questions[0], True, answered=False)
+        read_scores = stats._student_scores
+
+        def scores_then_answer(max_id):
+            scores = read_scores(max_id)
+            QuizSession.objects.filter(id=late.id).update(answered_at=timezone.now())
+            self.answer(self.students[2], self.questions[1], True)
+            return scores
+
+        with mock.patch.object(stats, '_student_scores', scores_then_answer):
+            return stats.compute_question_stats([question.id for question in self.questions])
+
+    def test_stats(self):
+        for student, correct in zip(self.students, (True, True, False)):
+            self.answer(student, self.questions[0], correct)
+            self.answer(student, self.questions[1], correct)
+        results = stats.compute_question_stats([self.questions[0].id])
+        self.assertEqual(results[self.questions[0].id]['stats_responses'], 3)
+        self.assertEqual(results[self.questions[0].id]['stats_p_value'], round(2 / 3, 4))
+        self.assertEqual(results[self.questions[0].id]['stats_distractors'], {'1': 2, '2': 1})
+        self.assertEqual(results[self.questions[0].id]['stats_discrimination'], 1.0)
+
+    def test_archiving_keeps_stats(self):
+        for student, correct in zip(self.students, (True, True, False)):
+            self.answer(student, self.questions[0], correct)
+            self.answer(student, self.questions[1], not correct)
+        QuizSession.objects.update(created_at=timezone.now() - timedelta(days=400))
+        before = stats.compute_question_stats([question.id for question in self.questions])
+        archive_sessions(older_than_days=30)
+        self.assertFalse(QuizSession.objects.exists())
+        self.assertEqual(stats.compute_question_stats([question.id for question in self.questions]), before)
+
+        Question.objects.update(stats_updated_at=None)
+        self.assertEqual(stats.refresh_question_stats(full=True), 2)
+        self.assertEqual(stats.stale_question_ids(), [])
+
+    def test_archiving_leaves_open_sessions(self):
+        answered = self.answer(self.students[0], self.questions[0], True)
+        session = self.answer(self.students[1], self.questions[0], True, answered=False)
+        QuizSession.objects.update(created_at=timezone.now() - timedelta(days=400))
+        self.assertEqual(archive_sessions(older_than_days=30), 1)
+        self.assertEqual(list(ArchivedQuizSession.objects.values_list('original_id', flat=True)), [answered.id])
+
+        response = self.client.post('/api/submit-answer/', {'session_id': session.id, 'user_answer': '1'},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()['is_correct'])
+
+    def test_answers_during_the_run(self):
+        self.answer(self.students[0], self.questions[0], True)
+        self.answer(self.students[1], self.questions[0], False)
+        results = self.compute_while_answering()
+        # The late answer counts without a rest score; the one after the run started waits
+        self.assertEqual(results[self.questions[0].id]['stats_responses'], 3)
+        self.assertEqual(results[self.questions[1].id]['stats_responses'], 0)
+
+    def test_first_answers_during_the_run(self):
+        results = self.compute_while_answering()
+        self.assertEqual(results[self.questions[0].id]['stats_responses'], 1)
+
+
+class QuestionSnapshotTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'questions.snap')
+        settings = override_settings(QUESTION_SNAPSHOT_PATH=self.path, QUESTION_SNAPSHOT_CHECK_INTERVAL=0)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.question = Question.objects.create(
+            subject='Math', level='P4', question_text='What is 1 + 1?', correct_answer='2',
+        )
+        snapshot.build_snapshot()
+
+    def test_serves_current_snapshot(self):
+        self.assertIsNotNone(snapshot.current_snapshot())
+        response = self.client.get('/api/questions/?subject=Math')
+        self.assertEqual([q['id'] for q in response.json()], [self.question.id])
+
+    def test_outdated_snapshot_falls_back(self):
+        # Without running the on-commit rebuild, as when it fails
+        self.question.is_hidden = True
+        self.question.save()
+        self.assertIsNone(snapshot.current_snapshot())
+        self.assertEqual(self.client.get('/api/questions/?subject=Math').json(), [])
+        self.assertEqual(self.client.get('/api/questions/random/?subject=Math').status_code, 404)
+
+        snapshot.build_snapshot()
+        self.assertIsNotNone(snapshot.current_snapshot())
+
+    def test_older_build_does_not_replace_a_newer_snapshot(self):
+        old = CatalogVersion.current()
+        self.question.is_hidden = True
+        self.question.save()
+        self.assertEqual(snapshot.build_snapshot(), 0)
+        newer = snapshot.snapshot_version(self.path)
+
+        # A slow rebuild that read the version before the edit
+        with mock.patch.object(CatalogVersion, 'current', return_value=old):
+            self.assertIsNone(snapshot.build_snapshot())
+        self.assertIsNone(snapshot.build_snapshot())
+        self.assertEqual(snapshot.snapshot_version(self.path), newer)
+        self.assertGreater(newer, old.version)
+
+    def test_edits_rebuild_in_the_background(self):
+        threads = []
+        with mock.patch.object(snapshot, 'build_snapshot', side_effect=lambda: threads.append(threading.current_thread())):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.question.save()
+            snapshot.wait_for_rebuilds()
+        self.assertEqual(len(threads), 1)
+        self.assertIsNot(threads[0], threading.current_thread())
+
+
+class QuestionGeneratorTests(TestCase):
+    def test_same_seed_same_question(self):
+        for generator in GENERATORS.values():
+            seeds = batch_seeds(2024, 50)
+            batch = generator.generate(seeds)
+            self.assertEqual(batch, generator.generate(seeds))
+            self.assertEqual(batch[7], generator.generate_one(int(seeds[7])))
+            self.assertGreater(len({q['question_text'] for q in batch}), 1)
+
+    def test_options(self):
+        for generator in GENERATORS.values():
+            for q in generator.generate(batch_seeds(7, 500)):
+                self.assertEqual(len(set(q['options'])), 4, q)
+                self.assertIn(q['correct_answer'], q['options'])
+                # Distinct in value too, e.g. no 1/2 next to 2/4
+                self.assertEqual(len({Fraction(option) for option in q['options']}), 4, q)
+
+    def test_answers(self):
+        operators = {'+': Fraction.__add__, '-': Fraction.__sub__, '×': Fraction.__mul__, '÷': Fraction.__truediv__}
+        for generator in GENERATORS.values():
+            for q in generator.generate(batch_seeds(11, 500)):
+                if q['question_text'].startswith('What is '):
+                    left, operator, right = q['question_text'][len('What is '):-1].split(' ')
+                    expected = operators[operator](Fraction(left), Fraction(right))
+                else:
+                    # Word problems add the two numbers in the story
+                    expected = sum(Fraction(word) for word in q['question_text'].split() if word.isdigit())
+                self.assertEqual(Fraction(q['correct_answer']), expected, q)
+
+    def test_generate_question_endpoint(self):
+        url = '/api/generate-question/?subject=Math&level=P4&topic=Fractions'
+        first = self.client.get(url).json()
+        self.assertEqual(first['generator'], 'math.p4.fractions.add.v1')
+        again = self.client.get(f"{url}&seed={first['seed']}").json()
+        self.assertEqual(again, first)
+        self.assertEqual(self.client.get(f'{url}&seed=abc').status_code, 400)
+        response = self.client.get('/api/generate-question/?subject=Math&level=P3&topic=Geometry')
+        self.assertEqual(response.status_code, 404)
+
+    def test_session_stores_seed(self):
+        parent = User.objects.create_user(username=PARENT_EMAIL, email=PARENT_EMAIL, password='x', is_parent=True)
+        student = StudentProfile.objects.create(parent=parent, name='Alex', level='P5')
+        body = {'subject': 'Math', 'level': 'P5', 'topic': 'Fractions'}
+        response = self.client.post(
+            '/api/start-session/', body, content_type='application/json',
+            HTTP_AUTHORIZATION=f'Token {token_for_user(parent)}',
+        ).json()
+
+        session = QuizSession.objects.get(id=response['session_id'])
+        self.assertEqual((session.question_text, session.explanation), ('', ''))
+        question = regenerate(session.generator, session.generator_seed)
+        self.assertEqual(question['question_text'], response['question_text'])
+        self.assertEqual(question['options'], response['options'])
+        self.assertEqual(question['correct_answer'], session.correct_answer)
+
+        result = self.client.post(
+            '/api/submit-answer/', {'session_id': session.id, 'user_answer': session.correct_answer},
+            content_type='application/json',
+        ).json()
+        self.assertTrue(result['is_correct'])
+        self.assertEqual(result['explanation'], question['explanation'])
+
+        self.client.defaults['HTTP_X_USER_DATA'] = json.dumps({'email': PARENT_EMAIL})
+        history = self.client.get(f'/api/progress/{student.id}/?history=full').json()['history']
+        self.assertEqual(history[0]['question_text'], question['question_text'])
+        self.assertNotIn('generator', history[0])
+
+    def test_generate_questions_command(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.jsonl', delete=False) as f:
+            pass
+        self.addCleanup(os.remove, f.name)
+        options = {'generator': 'math.p3.subtraction.v1', 'count': 20, 'seed': 5, 'stderr': io.StringIO()}
+        call_command('generate_questions', output=f.name, **options)
+        with open(f.name, encoding='utf-8') as lines:
+            rows = [json.loads(line) for line in lines]
+        self.assertEqual(len(rows), 20)
+        stdout = io.StringIO()
+        call_command('generate_questions', stdout=stdout, **options)
+        self.assertEqual([json.loads(line) for line in stdout.getvalue().splitlines()], rows)
+
+        call_command('import_questions', file=f.name, subject='Math', level='P3', topic='Subtraction', stdout=io.StringIO())
+        self.assertEqual(Question.objects.filter(topic__name='Subtraction').count(), 20)
+        self.assertIsNotNone(generator_for('Math', 'P3', 'Subtraction'))
+
+    def test_admin_shows_generated_questions(self):
+        question = GENERATORS['math.p3.addition.v1'].generate_one(5)
+        parent = User.objects.create_superuser(username=PARENT_EMAIL, email=PARENT_EMAIL, password='pw')
+        student = StudentProfile.objects.create(parent=parent, name='Alice', level='P3')
+        session = QuizSession.objects.create(
+            student=student, subject='Math', topic='Addition', question_text='', explanation='',
+            correct_answer=question['correct_answer'], generator=question['generator'], generator_seed=5,
+        )
+        self.client.force_login(parent)
+        self.assertContains(self.client.get('/admin/quiz/quizsession/'), question['question_text'])
+        response = self.client.get(f'/admin/quiz/quizsession/{session.id}/change/')
+        self.assertContains(response, question['question_text'])
+        self.assertContains(response, question['explanation'])
+
+
+class PublicCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.target = PurgeTarget()
+        threading.Thread(target=cls.target.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.target.shutdown()
+        cls.target.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.target.requests.clear()
+        self.target.status = 200
+        settings = override_settings(CACHE_PURGE_URL=self.target.url, CACHE_PURGE_TOKEN='secret')
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.fractions = Topic.objects.create(name='Fractions', subject='Math', level='P4')
+        self.decimals = Topic.objects.create(name='Decimals', subject='Math', level='P4')
+        self.question = Question.objects.create(
+            subject='Math', level='P4', topic=self.fractions, question_text='What is 1/2 + 1/4?',
+            options=['3/4', '2/6'], correct_answer='3/4',
+        )
+        self.target.requests.clear()
+
+    def surrogate_keys(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return set(response['Surrogate-Key'].split())
+
+    def test_public_lists_are_cacheable(self):
+        response = self.client.get(f'/api/questions/?subject=Math&level=P4&topic=0{self.fractions.id}')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=60, s-maxage=86400')
+        self.assertEqual(response['Surrogate-Key'], f'questions questions/Math/P4/{self.fractions.id}')
+
+        response = self.client.get('/api/topics/?subject=Math&level=P4')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=60, s-maxage=86400')
+        self.assertEqual(response['Surrogate-Key'], 'topics topics/Math/P4')
+
+        response = self.client.get('/api/questions/random/?subject=Math')
+        self.assertIn('no-store', response['Cache-Control'])
+        self.assertFalse(response.has_header('Surrogate-Key'))
+
+    def test_without_purging_shared_caches_expire_with_browsers(self):
+        with override_settings(CACHE_PURGE_URL=''):
+            response = self.client.get('/api/questions/')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=60, s-maxage=60')
+
+    def test_edit_purges_old_and_new_lists(self):
+        before = self.surrogate_keys(f'/api/questions/?topic={self.fractions.id}')
+        after = self.surrogate_keys(f'/api/questions/?level=P4&topic={self.decimals.id}')
+        untouched = self.surrogate_keys('/api/questions/?subject=Science')
+
+        self.question.topic = self.decimals
+        with self.captureOnCommitCallbacks(execute=True):
+            self.question.save()
+        wait_for_purges()
+
+        self.assertEqual(len(self.target.requests), 1)
+        self.assertEqual(self.target.requests[0]['token'], 'secret')
+        self.assertTrue(before - {'questions'} <= self.target.purged)
+        self.assertTrue(after - {'questions'} <= self.target.purged)
+        self.assertFalse(untouched - {'questions'} & self.target.purged)
+
+    def test_stats_update_does_not_purge(self):
+        self.question.stats_responses = 10
+        with self.captureOnCommitCallbacks(execute=True):
+            self.question.save(update_fields=['stats_responses'])
+        wait_for_purges()
+        self.assertEqual(self.target.requests, [])
+
+    def test_flag_purges(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(f'/api/questions/{self.question.id}/flag/')
+        wait_for_purges()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.target.purged, question_purge_keys('Math', 'P4', self.fractions.id))
+
+    def test_topic_change_purges_topic_list(self):
+        keys = self.surrogate_keys('/api/topics/?subject=Math&level=P4')
+        self.fractions.level = 'P5'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.fractions.save()
+        wait_for_purges()
+        self.assertEqual(self.target.purged, {'catalog', 'topics/Math/P4', 'topics/Math/P5'})
+        self.assertTrue(keys - {'topics'} <= self.target.purged)
+
+    def test_import_purges_once(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.jsonl', delete=False) as f:
+            for i in range(3):
+                f.write(json.dumps({'question': f'What is {i} + 2?', 'answer': str(i + 2)}) + '\n')
+        self.addCleanup(os.remove, f.name)
+
+        call_command('import_questions', file=f.name, subject='Science', level='P5', stdout=open(os.devnull, 'w'))
+
+        self.assertEqual(len(self.target.requests), 1)
+        self.assertIn('questions/Science/P5/any', self.target.purged)
+
+    def test_failed_purge_does_not_fail_the_write(self):
+        self.target.status = 500
+        with self.assertLogs('quiz.purge', 'WARNING'):
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(f'/api/questions/{self.question.id}/flag/')
+            wait_for_purges()
+        self.assertEqual(response.status_code, 200)
+
+    def test_write_does_not_wait_for_purge(self):
+        release = threading.Event()
+        self.addCleanup(release.set)
+        with mock.patch('quiz.purge.purge', side_effect=lambda keys: release.wait(5)) as purge:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(f'/api/questions/{self.question.id}/flag/')
+            self.assertEqual(response.status_code, 200)
+            release.set()
+            wait_for_purges()
+        purge.assert_called_once()
+
+
+class JoinCodeTests(TestCase):
+    def test_codes_are_unique_across_blocks_and_allocators(self):
+        # Two workers reserving small blocks from the same counter
+        first, second = JoinCodeAllocator(block_size=7), JoinCodeAllocator(block_size=7)
+        codes = [allocator.allocate() for _ in range(50) for allocator in (first, second)]
+        self.assertEqual(len(set(codes)), len(codes))
+        for code in codes:
+            self.assertEqual(len(code), CODE_LENGTH)
+            self.assertTrue(set(code) <= set(ALPHABET))
+        # Each allocator reserved eight blocks for its 50 codes
+        self.assertEqual(JoinCodeCounter.objects.get().next_value, 7 * 16)
+
+    def test_permutation_stays_in_the_code_space(self):
+        indices = [*range(1000), *range(CODE_SPACE - 1000, CODE_SPACE)]
+        values = [permute(index, secret='test') for index in indices]
+        self.assertEqual(len(set(values)), len(values))
+        self.assertTrue(all(0 <= value < CODE_SPACE for value in values))
+        with self.assertRaises(JoinCodesExhausted):
+            permute(CODE_SPACE, secret='test')
+
+    def test_last_block_is_cut_at_the_code_space(self):
+        JoinCodeCounter.objects.create(pk=1, next_value=CODE_SPACE - 2)
+        allocator = JoinCodeAllocator(block_size=5)
+        self.assertNotEqual(allocator.allocate(), allocator.allocate())
+        with self.assertRaises(JoinCodesExhausted):
+            allocator.allocate()
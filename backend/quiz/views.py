@@ -1,59 +1,110 @@
-from rest_framework import status, permissions
+from rest_framework import serializers, status, permissions
 from rest_framework.decorators import api_view, permission_classes, authentication_classes
 from rest_framework.response import Response
 from django.db.models import Count, Avg
 from django.utils import timezone
+from django.views.decorators.cache import never_cache
 from .models import StudentProfile, QuizSession, Topic, Question
+from accounts.authentication import UserDataAuthentication
+from accounts.identity import default_parent
+from ai_tutor_sg.routers import read_replica
+from .archive import session_history, topic_progress
+from .buckets import availability, count_available
+from .catalog import current_catalog
+from .purge import catalog_keys, public_cache, question_keys, topic_keys
+from .snapshot import current_snapshot
+from .generators import generator_for, new_seed, regenerate
+from .conditional import (
+    conditional, catalog_etag, catalog_last_modified, catalog_state, progress_etag, progress_last_modified
+)
 from .serializers import (
     QuizSessionSerializer, SubmitAnswerSerializer, TopicSerializer,
     QuestionResponseSerializer, ProgressSerializer, QuestionSerializer
 )
 import json
+import logging
 import random
+
+logger = logging.getLogger(__name__)
+
+
+def question_queryset(params):
+    """Visible bank questions filtered by the ``subject``, ``level`` and ``topic`` query params"""
+    qs = Question.objects.filter(is_hidden=False)
+    if params.get('subject'):
+        qs = qs.filter(subject=params['subject'])
+    if params.get('level'):
+        qs = qs.filter(level=params['level'])
+    if params.get('topic'):
+        qs = qs.filter(topic_id=params['topic'])
+    return qs
+
+
+def snapshot_filters(params):
+    """The ``question_queryset`` filters as arguments for ``QuestionSnapshot``"""
+    return params.get('subject'), params.get('level'), params.get('topic')
+
+
 # Question bank endpoints
+@read_replica
+@public_cache(question_keys)
 @api_view(['GET'])
 @authentication_classes([])
 @permission_classes([permissions.AllowAny])
 def list_questions(request):
-    subject = request.GET.get('subject')
-    level = request.GET.get('level')
-    topic_id = request.GET.get('topic')
-
-    qs = Question.objects.all()
-    if subject:
-        qs = qs.filter(subject=subject)
-    if level:
-        qs = qs.filter(level=level)
-    if topic_id:
-        qs = qs.filter(topic_id=topic_id)
+    snapshot = current_snapshot()
+    if snapshot is not None:
+        return Response(snapshot.filter(*snapshot_filters(request.GET), limit=200))
+    qs = question_queryset(request.GET)
 
     serializer = QuestionSerializer(qs[:200], many=True)
     return Response(serializer.data)
 
 
+# Every call draws again, so no cache may keep one draw; clients wanting
+# to cache the pool itself can sample from list_questions
+@never_cache
+@read_replica
 @api_view(['GET'])
 @authentication_classes([])
 @permission_classes([permissions.AllowAny])
 def random_question(request):
-    subject = request.GET.get('subject')
-    level = request.GET.get('level')
-    topic_id = request.GET.get('topic')
-
-    qs = Question.objects.all()
-    if subject:
-        qs = qs.filter(subject=subject)
-    if level:
-        qs = qs.filter(level=level)
-    if topic_id:
-        qs = qs.filter(topic_id=topic_id)
-
-    count = qs.count()
+    snapshot = current_snapshot()
+    if snapshot is not None:
+        question = snapshot.sample(random, *snapshot_filters(request.GET))
+        if question is None:
+            return Response({'error': 'No questions found'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(question)
+    count = count_available(request.GET)
     if count == 0:
         return Response({'error': 'No questions found'}, status=status.HTTP_404_NOT_FOUND)
-    question = qs.order_by('?').first()
+    question = sample_question(question_queryset(request.GET), count)
+    if question is None:
+        return Response({'error': 'No questions found'}, status=status.HTTP_404_NOT_FOUND)
     return Response(QuestionSerializer(question).data)
 
 
+def sample_question(qs, count):
+    """A random question from ``qs``, which the bucket counters say holds ``count``"""
+    # Skipping to a random offset along the primary key avoids sorting the
+    # whole match; counters that have drifted past the end fall back to that
+    question = qs.order_by('id')[random.randrange(count):].first()
+    return question if question is not None else qs.order_by('?').first()
+
+
+@read_replica
+@public_cache(question_keys)
+@api_view(['GET'])
+@authentication_classes([])
+@permission_classes([permissions.AllowAny])
+def question_availability(request):
+    """Visible questions for the ``subject``, ``level``, ``topic`` and ``difficulty`` filters.
+
+    Read from the bucket counters, so badges can poll it without counting questions.
+    """
+    return Response(availability(request.GET))
+
+
 @api_view(['POST'])
 @authentication_classes([])
 @permission_classes([permissions.AllowAny])
@@ -156,17 +207,24 @@ def generate_question(request):
             status=status.HTTP_400_BAD_REQUEST
         )
     
-    # Get questions from mock data
-    questions = MOCK_QUESTIONS.get(subject, {}).get(level, {}).get(topic, [])
-    
-    if not questions:
-        return Response(
-            {'error': f'No questions available for {subject} {level} {topic}'}, 
-            status=status.HTTP_404_NOT_FOUND
-        )
-    
-    # Select a random question
-    question = random.choice(questions)
+    generator = generator_for(subject, level, topic)
+    if generator is not None:
+        seed = request.GET.get('seed', '')
+        if seed and not (seed.isdigit() and int(seed) < 2 ** 63):
+            return Response({'error': 'Invalid seed'}, status=status.HTTP_400_BAD_REQUEST)
+        question = generator.generate_one(int(seed) if seed else new_seed())
+    else:
+        # Get questions from mock data
+        questions = MOCK_QUESTIONS.get(subject, {}).get(level, {}).get(topic, [])
+
+        if not questions:
+            return Response(
+                {'error': f'No questions available for {subject} {level} {topic}'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        # Select a random question
+        question = random.choice(questions)
     
     response_data = {
         'subject': subject,
@@ -177,6 +235,9 @@ def generate_question(request):
         'correct_answer': question['correct_answer'],
         'explanation': question['explanation']
     }
+    if generator is not None:
+        response_data['generator'] = question['generator']
+        response_data['seed'] = question['seed']
     
     return Response(response_data)
 
@@ -187,38 +248,42 @@ def submit_answer(request):
     """Submit and store student's answer"""
     serializer = SubmitAnswerSerializer(data=request.data)
     if serializer.is_valid():
-        session_id = serializer.validated_data['session_id']
+        # Validation already loaded the session and its student
+        session = serializer.validated_data['session_id']
         user_answer = serializer.validated_data['user_answer']
         
-        try:
-            session = QuizSession.objects.get(id=session_id)
-            session.user_answer = user_answer
-            session.is_correct = (user_answer == session.correct_answer)
-            session.save()
-            
-            # Update student XP and streak
-            student = session.student
-            if session.is_correct:
-                student.xp += 10
-                student.streak += 1
-            else:
-                student.streak = 0
-            student.save()
-            
-            return Response({
-                'is_correct': session.is_correct,
-                'correct_answer': session.correct_answer,
-                'explanation': session.explanation,
-                'xp_gained': 10 if session.is_correct else 0
-            })
-        except QuizSession.DoesNotExist:
-            return Response(
-                {'error': 'Session not found'}, 
-                status=status.HTTP_404_NOT_FOUND
-            )
+        session.user_answer = user_answer
+        session.is_correct = (user_answer == session.correct_answer)
+        session.answered_at = timezone.now()
+        session.save(update_fields=['user_answer', 'is_correct', 'answered_at'])
+        
+        # Update student XP and streak
+        student = session.student
+        if session.is_correct:
+            student.xp += 10
+            student.streak += 1
+        else:
+            student.streak = 0
+        student.progress_version += 1
+        student.save(update_fields=['xp', 'streak', 'progress_version', 'updated_at'])
+        
+        explanation = session.explanation
+        if session.generator and session.generator_seed is not None:
+            question = regenerate(session.generator, session.generator_seed)
+            explanation = question['explanation'] if question else explanation
+
+        return Response({
+            'is_correct': session.is_correct,
+            'correct_answer': session.correct_answer,
+            'explanation': explanation,
+            'xp_gained': 10 if session.is_correct else 0
+        })
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+@read_replica
+@public_cache(topic_keys)
+@conditional(etag_func=catalog_etag, last_modified_func=catalog_last_modified, private=False)
 @api_view(['GET'])
 @permission_classes([permissions.AllowAny])
 def get_topics(request):
@@ -232,84 +297,56 @@ def get_topics(request):
             status=status.HTTP_400_BAD_REQUEST
         )
     
-    # For MVP, return topics from mock data
-    topics = list(MOCK_QUESTIONS.get(subject, {}).get(level, {}).keys())
-    
-    return Response({'topics': topics})
+    _, names = current_catalog(catalog_state(request).version)
+    return Response({'topics': topic_names(names, subject, level)})
+
 
+def topic_names(names, subject, level):
+    """Active topic names from the catalog's ``names`` index"""
+    # Subjects and levels with no topics in the database yet keep the MVP mock topics
+    return names.get((subject, level)) or list(MOCK_QUESTIONS.get(subject, {}).get(level, {}).keys())
 
+
+@read_replica
+@public_cache(catalog_keys)
+@conditional(etag_func=catalog_etag, last_modified_func=catalog_last_modified, private=False)
+@api_view(['GET'])
+@authentication_classes([])
+@permission_classes([permissions.AllowAny])
+def get_catalog(request):
+    """Subject -> level -> topic tree with question counts per topic and difficulty"""
+    tree, _ = current_catalog(catalog_state(request).version)
+    return Response(tree)
+
+
+@read_replica
+@conditional(etag_func=progress_etag, last_modified_func=progress_last_modified)
 @api_view(['GET'])
-@authentication_classes([])  # Disable authentication
+@authentication_classes([UserDataAuthentication])
 @permission_classes([permissions.AllowAny])
 def get_progress(request, student_id):
     """Get progress analytics for a student"""
-    from accounts.models import User
-    
     try:
         student = StudentProfile.objects.get(id=student_id)
-        
-        # Get user data from frontend
-        user_data = request.META.get('HTTP_X_USER_DATA')
-        parent_user = None
-        
-        if user_data:
-            import json
-            try:
-                user_info = json.loads(user_data)
-                # Try to find parent user
-                parent_user = User.objects.filter(
-                    email=user_info.get('email', 'demo@example.com')
-                ).first()
-                print(f"Found parent user for progress: {parent_user.email if parent_user else 'None'}")
-            except Exception as e:
-                print(f"Error parsing user data in progress: {e}")
-        
-        # If no parent user found, try default
-        if not parent_user:
-            parent_user = User.objects.filter(email='demo@example.com').first()
-            print(f"Using default parent user for progress: {parent_user.email if parent_user else 'None'}")
+        parent_user = request.user if request.user.is_authenticated else default_parent()
         
         # Check if user has permission to view this student's progress
-        if not parent_user or student.parent != parent_user:
-            print(f"Permission denied: parent_user={parent_user}, student.parent={student.parent}")
+        if not parent_user or student.parent_id != parent_user.pk:
+            logger.warning(
+                "[PROGRESS] Permission denied: parent id=%s, student.parent_id=%s",
+                getattr(parent_user, 'pk', None), student.parent_id,
+            )
             return Response(
                 {'error': 'Permission denied'}, 
                 status=status.HTTP_403_FORBIDDEN
             )
         
-        # Get quiz sessions for this student
-        sessions = QuizSession.objects.filter(student=student)
-        
-        # Calculate progress by topic
-        progress_data = []
-        topics = sessions.values('topic').distinct()
-        
-        for topic_data in topics:
-            topic = topic_data['topic']
-            topic_sessions = sessions.filter(topic=topic)
-            total_questions = topic_sessions.count()
-            correct_answers = topic_sessions.filter(is_correct=True).count()
-            accuracy = (correct_answers / total_questions * 100) if total_questions > 0 else 0
-            last_attempt = topic_sessions.order_by('-created_at').first().created_at if topic_sessions.exists() else None
-            
-            progress_data.append({
-                'topic': topic,
-                'total_questions': total_questions,
-                'correct_answers': correct_answers,
-                'accuracy': round(accuracy, 2),
-                'last_attempt': last_attempt
-            })
-        
-        return Response({
-            'student': {
-                'id': student.id,
-                'name': student.name,
-                'level': student.level,
-                'xp': student.xp,
-                'streak': student.streak
-            },
-            'progress': progress_data
-        })
+        history = None
+        # Full session history is only merged from the archive when asked for
+        if request.GET.get('history') == 'full':
+            history = session_history(student, include_archived=True)
+        response_data = progress_payload(student, topic_progress(student), history)
+        return Response(response_data)
         
     except StudentProfile.DoesNotExist:
         return Response(
@@ -318,6 +355,34 @@ def get_progress(request, student_id):
         )
 
 
+def progress_payload(student, progress, history=None):
+    """The get_progress body from ``topic_progress`` totals and optional history"""
+    progress_data = []
+    for topic, (total_questions, correct_answers, last_attempt) in progress.items():
+        accuracy = (correct_answers / total_questions * 100) if total_questions > 0 else 0
+        progress_data.append({
+            'topic': topic,
+            'total_questions': total_questions,
+            'correct_answers': correct_answers,
+            'accuracy': round(accuracy, 2),
+            'last_attempt': last_attempt
+        })
+
+    response_data = {
+        'student': {
+            'id': student.id,
+            'name': student.name,
+            'level': student.level,
+            'xp': student.xp,
+            'streak': student.streak
+        },
+        'progress': progress_data
+    }
+    if history is not None:
+        response_data['history'] = history
+    return response_data
+
+
 @api_view(['POST'])
 @permission_classes([permissions.AllowAny])
 def start_quiz_session(request):
@@ -347,25 +412,62 @@ def start_quiz_session(request):
             status=status.HTTP_400_BAD_REQUEST
         )
     
-    # Generate question
-    questions = MOCK_QUESTIONS.get(subject, {}).get(level, {}).get(topic, [])
-    if not questions:
-        return Response(
-            {'error': f'No questions available for {subject} {level} {topic}'}, 
-            status=status.HTTP_404_NOT_FOUND
-        )
-    
-    question = random.choice(questions)
+    # Serve a question from the bank when one is requested, so answers
+    # can be attributed to it for question statistics
+    question_id = request.data.get('question_id')
+    bank_question = None
+    generator = generator_for(subject, level, topic)
+    if question_id:
+        try:
+            question_id = serializers.IntegerField(min_value=1).run_validation(question_id)
+        except serializers.ValidationError:
+            return Response(
+                {'error': 'question_id must be a positive integer'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        # Hidden questions are withdrawn from students, so they are not found either
+        bank_question = Question.objects.filter(id=question_id, is_hidden=False).first()
+        if not bank_question:
+            return Response(
+                {'error': 'Question not found'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        question = {
+            'question_text': bank_question.question_text,
+            'options': bank_question.options,
+            'correct_answer': bank_question.correct_answer,
+            'explanation': bank_question.explanation,
+        }
+    elif generator is not None:
+        question = generator.generate_one(new_seed())
+    else:
+        # Generate question
+        questions = MOCK_QUESTIONS.get(subject, {}).get(level, {}).get(topic, [])
+        if not questions:
+            return Response(
+                {'error': f'No questions available for {subject} {level} {topic}'}, 
+                status=status.HTTP_404_NOT_FOUND
+            )
+        
+        question = random.choice(questions)
     
-    # Create quiz session
+    # Create quiz session; generated questions are stored as their seed
+    # and regenerated on demand, so only the answer is kept as text
+    generated = 'generator' in question
     session = QuizSession.objects.create(
         student=student,
+        question=bank_question,
         subject=subject,
         topic=topic,
-        question_text=question['question_text'],
+        question_text='' if generated else question['question_text'],
         correct_answer=question['correct_answer'],
-        explanation=question['explanation']
+        explanation='' if generated else question['explanation'],
+        generator=question.get('generator', ''),
+        generator_seed=question.get('seed'),
     )
+    # The new session counts towards progress totals, so move the validators on
+    student.progress_version += 1
+    student.save(update_fields=['progress_version', 'updated_at'])
     
     return Response({
         'session_id': session.id,